@@ -0,0 +1,56 @@
+#time the robust line fitters of lie_down (trajalign/orientation.py) on the ensemble of the Sla1 trajectories of the
+#trajectory_average_example, lied down all at once (lie_down_ensemble) and one at a time (lie_down), and report how
+#much the angles of each fitter differ from those of RANSAC.
+#Usage: python lie_down.py [ number of repetitions (default is 3) ]
+
+from trajalign.average import load_directory
+from trajalign.orientation import lie_down , lie_down_ensemble , line_fitters
+import numpy as np
+import time
+import sys
+import os
+
+path = os.path.join( os.path.dirname( os.path.abspath( __file__ ) ) , '..' , 'example' , 'trajectory_average_example' , 'raw_trajectories' )
+
+trajectory_list = load_directory(
+		path = path ,
+		pattern = '.data' ,
+		comment_char = '%' ,
+		dt = 0.1045 ,
+		t_unit = 's' ,
+		coord_unit = 'pxl' ,
+		frames = 0 ,
+		coord = ( 1 , 2 ) ,
+		f = 3 ,
+		protein = 'Sla1-GFP' )
+
+repetitions = 3
+
+if len( sys.argv ) > 1 :
+
+	repetitions = int( sys.argv[ 1 ] )
+
+results = {}
+
+for fitter in line_fitters.keys() :
+
+	start = time.time()
+	for r in range( repetitions ) :
+		ensemble = lie_down_ensemble( trajectory_list , fitter )
+	ensemble_time = ( time.time() - start ) / repetitions
+
+	start = time.time()
+	for r in range( repetitions ) :
+		single = [ lie_down( t , fitter ) for t in trajectory_list ]
+	single_time = ( time.time() - start ) / repetitions
+
+	results[ fitter ] = { 'angles' : np.array( [ ld[ 'angle' ] for ld in ensemble ] ) , 'ensemble' : ensemble_time , 'single' : single_time }
+
+print( '________________' )
+print( str( len( trajectory_list ) ) + ' Sla1 trajectories, ' + str( repetitions ) + ' repetitions' )
+print( 'fitter\t\tensemble (s)\tone by one (s)\tmedian | angle - RANSAC angle | (rad)' )
+
+for fitter in results.keys() :
+
+	difference = np.abs( np.angle( np.exp( 1j * ( results[ fitter ][ 'angles' ] - results[ 'ransac' ][ 'angles' ] ) ) ) )
+	print( fitter + '\t' * ( 2 - len( fitter ) // 8 ) + str( round( results[ fitter ][ 'ensemble' ] , 4 ) ) + '\t\t' + str( round( results[ fitter ][ 'single' ] , 4 ) ) + '\t\t' + str( np.median( difference ) ) )
@@ -0,0 +1,71 @@
+#compare the progressive averaging (strategy = 'progressive') with the averaging of all the pairs of trajectories
+#(strategy = 'all_pairs', with the exhaustive lag scan) on the Sla1 trajectories of the trajectory_average_example.
+#Usage: python progressive_average.py [ number of trajectories (default is all) ]
+
+from trajalign.average import load_directory
+from trajalign.average import average_trajectories
+from trajalign.average import align_pair
+import numpy as np
+import tempfile
+import time
+import sys
+import os
+
+path = os.path.join( os.path.dirname( os.path.abspath( __file__ ) ) , '..' , 'example' , 'trajectory_average_example' , 'raw_trajectories' )
+
+trajectory_list = load_directory(
+		path = path ,
+		pattern = '.data' ,
+		comment_char = '%' ,
+		dt = 0.1045 ,
+		t_unit = 's' ,
+		coord_unit = 'pxl' ,
+		frames = 0 ,
+		coord = ( 1 , 2 ) ,
+		f = 3 ,
+		protein = 'Sla1-GFP' )
+
+if len( sys.argv ) > 1 :
+
+	trajectory_list = trajectory_list[ : int( sys.argv[ 1 ] ) ]
+
+l = len( trajectory_list )
+results = {}
+
+#average_trajectories writes its output in the working directory
+cwd = os.getcwd()
+
+with tempfile.TemporaryDirectory() as directory :
+
+	os.chdir( directory )
+
+	for strategy in [ 'all_pairs' , 'progressive' ] :
+
+		output_file = strategy
+
+		start = time.time()
+		average , worst_average , aligned_trajectories = average_trajectories( trajectory_list , output_file = output_file , max_frame = 500 , cache = False , strategy = strategy )
+		elapsed = time.time() - start
+
+		with open( os.path.join( output_file , 'alignment_precision.txt' ) , 'r' ) as f :
+
+			precision = min( [ float( line ) for line in f if line.strip() ] )
+
+		results[ strategy ] = { 'average' : average , 'time' : elapsed , 'precision' : precision }
+
+	os.chdir( cwd )
+
+#the distance between the two averages, once aligned together. The averages need frames to be aligned.
+for strategy in results.keys() :
+
+	average = results[ strategy ][ 'average' ]
+	average.input_values( 'frames' , np.rint( average.t() / float( average.annotations()[ 'delta_t' ] ) ).astype( 'int64' ) )
+
+distance = np.sqrt( align_pair( results[ 'all_pairs' ][ 'average' ] , results[ 'progressive' ][ 'average' ] )[ 'score' ] )
+
+print( '________________' )
+print( str( l ) + ' Sla1 trajectories' )
+print( 'strategy\talignments\ttime (s)\talignment precision' )
+print( 'all_pairs\t' + str( l * ( l - 1 ) // 2 ) + '\t\t' + str( round( results[ 'all_pairs' ][ 'time' ] , 2 ) ) + '\t\t' + str( results[ 'all_pairs' ][ 'precision' ] ) )
+print( 'progressive\t' + str( l - 1 ) + '\t\t' + str( round( results[ 'progressive' ][ 'time' ] , 2 ) ) + '\t\t' + str( results[ 'progressive' ][ 'precision' ] ) )
+print( 'weighted rms distance between the two averages, once aligned: ' + str( distance ) )
@@ -0,0 +1,202 @@
+#scaling report of average_trajectories and align on synthetic endocytic trajectories (see synthetic.py), over a grid of
+#ensemble sizes N (number of trajectories) and trajectory lengths L (frames per trajectory). Each point of the grid is run
+#in a new process, which records the wall time of the run and of its stages (see StageTimer in trajalign.log) and the
+#increase of its peak resident memory (see peak_memory in trajalign.log). The empirical complexity exponents a and b of
+#time ~ N^a L^b (and of memory) are fitted by least squares on the logarithms, and the time ratio they predict when N
+#grows 4 times is reported. The table is written, with the exponents, in a JSON file that can be compared with the report
+#of another release with --compare.
+#Usage: python scaling.py [ --N 10 20 40 ] [ --L 50 100 200 ] [ --lag-scan exhaustive ] [ --workers 1 ]
+#[ --output scaling.json ] [ --compare scaling_of_another_release.json ]
+
+from trajalign.average import load_directory , average_trajectories , header
+from trajalign.align import align
+from trajalign.log import peak_memory
+from synthetic import profiles , endocytic_events , endocytic_trajectories , write_trajectories , write_average
+import numpy as np
+import subprocess
+import argparse
+import tempfile
+import json
+import time
+import sys
+import os
+
+dt = 0.1045
+#the profiles last 16 s (see the durations in suite.py) and are stretched to the length of the trajectories, so that the
+#trajectories of all the lengths have the same shape
+profile_duration = 16.0
+max_lag = 200
+
+def stretched( profile , L ) :
+
+	s = L * dt / profile_duration
+
+	return( { p : v * s if p != 'inward' else v for p , v in profiles[ profile ].items() } )
+
+def run_point( function , N , L , lag_scan , workers ) :
+
+	#run function ( 'average_trajectories' or 'align' ) on N trajectories of L frames, in the working directory
+
+	duration = ( - 0.75 * L * dt , 0.25 * L * dt )
+	options = dict( comment_char = '%' , frames = 0 , coord = ( 1 , 2 ) , f = 3 , dt = dt , t_unit = 's' , coord_unit = 'pxl' )
+	events = endocytic_events( N , seed = 1 , dt = dt , duration = duration , truncation = 0 , max_lag = max_lag )
+
+	if function == 'average_trajectories' :
+
+		write_trajectories( endocytic_trajectories( events , stretched( 'coat' , L ) , seed = 2 , gaps = 0 ) , 'coat' )
+		trajectory_list = load_directory( 'coat' , '.data' , **options )
+
+		before = peak_memory()
+		start = time.perf_counter()
+		average_trajectories( trajectory_list , output_file = 'average' , max_frame = max_lag + L + 1 , cache = False , lag_scan = lag_scan , workers = workers , keep = 'best' , verbose = 0 , timings_file = 'timings.jsonl' )
+		wall = time.perf_counter() - start
+
+	else :
+
+		write_trajectories( endocytic_trajectories( events , stretched( 'actin' , L ) , seed = 2 , gaps = 0 ) , 'two_colour' , '.actin.data' )
+		write_trajectories( endocytic_trajectories( events , stretched( 'coat' , L ) , seed = 3 , gaps = 0 ) , 'two_colour' , '.coat.data' )
+		write_average( 'actin_average.txt' , stretched( 'actin' , L ) , dt = dt , duration = duration , angle = 0.4 )
+		write_average( 'coat_average.txt' , stretched( 'coat' , L ) , dt = dt , duration = duration )
+		#the trajectories of the two channels are paired by their file names
+		ch1 = sorted( load_directory( 'two_colour' , '.actin.data$' , **options ) , key = lambda t : t.annotations()[ 'file' ] )
+		ch2 = sorted( load_directory( 'two_colour' , '.coat.data$' , **options ) , key = lambda t : t.annotations()[ 'file' ] )
+
+		before = peak_memory()
+		start = time.perf_counter()
+		align( 'actin_average.txt' , 'coat_average.txt' , ch1 , ch2 , unify_start_end_in_alignment = False , verbose = 0 , timings_file = 'timings.jsonl' )
+		wall = time.perf_counter() - start
+
+	after = peak_memory()
+
+	with open( 'timings.jsonl' , 'r' ) as f :
+
+		stages = { s[ 'stage' ] : s[ 'wall_s' ] for s in [ json.loads( line ) for line in f ] if 'wall_s' in s.keys() }
+
+	#the peak memory of the workers is that of the largest worker, and only if the run has workers
+	memory = None
+	if before[ 0 ] is not None :
+		memory = max( after[ 0 ] - before[ 0 ] , after[ 1 ] if workers > 1 else 0 )
+
+	return( { 'function' : function , 'N' : N , 'L' : L , 'wall_s' : wall , 'stages' : stages , 'peak_memory_mb' : memory } )
+
+def fit_exponents( points , key ) :
+
+	"""
+	fit_exponents( points , key ): fits log( value ) = c + a log( N ) + b log( L ), where value is the key of the points
+	(e.g. 'wall_s'), and returns { 'N' : a , 'L' : b }. The exponent of a variable with a single value in the grid is None.
+	"""
+
+	points = [ p for p in points if ( p[ key ] is not None ) and ( p[ key ] > 0 ) ]
+	variables = [ v for v in ( 'N' , 'L' ) if len( set( [ p[ v ] for p in points ] ) ) > 1 ]
+
+	if ( len( variables ) == 0 ) or ( len( points ) <= len( variables ) ) :
+		return( { 'N' : None , 'L' : None } )
+
+	A = np.array( [ [ 1.0 ] + [ np.log( p[ v ] ) for v in variables ] for p in points ] )
+	y = np.log( [ p[ key ] for p in points ] )
+	coefficients = np.linalg.lstsq( A , y , rcond = None )[ 0 ]
+
+	output = { 'N' : None , 'L' : None }
+	for k in range( len( variables ) ) :
+		output[ variables[ k ] ] = float( coefficients[ k + 1 ] )
+
+	return( output )
+
+def exponent( x ) :
+
+	return( '-' if x is None else str( round( x , 2 ) ) )
+
+if __name__ == '__main__' :
+
+	parser = argparse.ArgumentParser( description = 'Scaling report of average_trajectories and align over a grid of ensemble sizes N and trajectory lengths L' )
+	parser.add_argument( '--N' , type = int , nargs = '+' , default = [ 10 , 20 , 40 ] , help = 'numbers of trajectories (default is 10 20 40)' )
+	parser.add_argument( '--L' , type = int , nargs = '+' , default = [ 50 , 100 , 200 ] , help = 'frames per trajectory (default is 50 100 200)' )
+	parser.add_argument( '--lag-scan' , default = 'exhaustive' , help = 'lag_scan of average_trajectories (default is exhaustive)' )
+	parser.add_argument( '--workers' , type = int , default = 1 , help = 'workers of average_trajectories (default is 1)' )
+	parser.add_argument( '--functions' , nargs = '+' , default = [ 'average_trajectories' , 'align' ] , help = 'functions to run (default is average_trajectories align)' )
+	parser.add_argument( '--output' , default = 'scaling.json' , help = 'JSON file of the report (default is scaling.json)' )
+	parser.add_argument( '--compare' , default = None , help = 'JSON report of another release, whose times are compared with these' )
+	parser.add_argument( '--point' , nargs = 3 , default = None , help = argparse.SUPPRESS )
+	args = parser.parse_args()
+
+	if args.point is not None :
+
+		#a point of the grid, run by a new process
+		print( json.dumps( run_point( args.point[ 0 ] , int( args.point[ 1 ] ) , int( args.point[ 2 ] ) , args.lag_scan , args.workers ) ) )
+		sys.exit( 0 )
+
+	points = []
+
+	for function in args.functions :
+
+		for N in args.N :
+
+			for L in args.L :
+
+				with tempfile.TemporaryDirectory() as directory :
+
+					#the benchmarks directory must be in the path of the new process, to import synthetic
+					environment = dict( os.environ , PYTHONPATH = os.pathsep.join( [ os.path.dirname( os.path.abspath( __file__ ) ) ] + sys.path ) )
+					output = subprocess.run( [ sys.executable , os.path.abspath( __file__ ) , '--point' , function , str( N ) , str( L ) , '--lag-scan' , args.lag_scan , '--workers' , str( args.workers ) ] , cwd = directory , env = environment , capture_output = True , text = True , check = True )
+
+				points.append( json.loads( output.stdout.strip().splitlines()[ -1 ] ) )
+				print( function + ' N = ' + str( N ) + ' L = ' + str( L ) + ': ' + str( round( points[ -1 ][ 'wall_s' ] , 2 ) ) + ' s' , flush = True )
+
+	#the exponents of the total time, of the time of each stage and of the memory of each function
+	exponents = {}
+
+	for function in args.functions :
+
+		function_points = [ p for p in points if p[ 'function' ] == function ]
+		exponents[ function ] = { 'wall_s' : fit_exponents( function_points , 'wall_s' ) , 'peak_memory_mb' : fit_exponents( function_points , 'peak_memory_mb' ) }
+
+		for stage in function_points[ 0 ][ 'stages' ].keys() :
+
+			stage_points = [ dict( p , stage_s = p[ 'stages' ].get( stage ) ) for p in function_points ]
+			exponents[ function ][ stage ] = fit_exponents( stage_points , 'stage_s' )
+
+	report = { 'trajalign_version' : header( printit = False ) , 'grid' : { 'N' : args.N , 'L' : args.L , 'lag_scan' : args.lag_scan , 'workers' : args.workers } , 'points' : points , 'exponents' : exponents }
+
+	with open( args.output , 'w' ) as f :
+		json.dump( report , f , indent = 1 )
+
+	other = None
+	if args.compare is not None :
+
+		with open( args.compare , 'r' ) as f :
+			other = json.load( f )
+
+		other_points = { ( p[ 'function' ] , p[ 'N' ] , p[ 'L' ] ) : p for p in other[ 'points' ] }
+
+	print( '________________' )
+	print( 'trajalign ' + str( report[ 'trajalign_version' ] ) + ', lag_scan = ' + args.lag_scan + ', workers = ' + str( args.workers ) )
+
+	if other is not None :
+		print( 'compared with trajalign ' + str( other.get( 'trajalign_version' ) ) + ', lag_scan = ' + other[ 'grid' ][ 'lag_scan' ] + ', workers = ' + str( other[ 'grid' ][ 'workers' ] ) )
+
+	print( 'function\t\tN\tL\ttime (s)\tpeak memory (MB)' + ( '\ttime / compared time' if other is not None else '' ) )
+
+	for p in points :
+
+		row = p[ 'function' ] + '\t' * ( 3 - len( p[ 'function' ] ) // 8 ) + str( p[ 'N' ] ) + '\t' + str( p[ 'L' ] ) + '\t' + str( round( p[ 'wall_s' ] , 3 ) ) + '\t\t' + ( '-' if p[ 'peak_memory_mb' ] is None else str( round( p[ 'peak_memory_mb' ] , 1 ) ) )
+
+		if other is not None :
+			key = ( p[ 'function' ] , p[ 'N' ] , p[ 'L' ] )
+			row += '\t\t\t' + ( str( round( p[ 'wall_s' ] / other_points[ key ][ 'wall_s' ] , 2 ) ) if key in other_points.keys() else '-' )
+
+		print( row )
+
+	print( '________________' )
+	print( 'empirical exponents of time ~ N^a L^b' )
+	print( 'function\t\tquantity\ta (N)\tb (L)\ttime ratio for 4 x N' )
+
+	for function in exponents.keys() :
+
+		for quantity in exponents[ function ].keys() :
+
+			a = exponents[ function ][ quantity ][ 'N' ]
+			b = exponents[ function ][ quantity ][ 'L' ]
+			ratio = '-' if ( a is None ) or ( quantity == 'peak_memory_mb' ) else str( round( 4 ** a , 1 ) )
+			print( function + '\t' * ( 3 - len( function ) // 8 ) + quantity + '\t' * ( 2 - len( quantity ) // 8 ) + exponent( a ) + '\t' + exponent( b ) + '\t' + ratio )
+
+	print( 'The report was written in ' + args.output )
@@ -0,0 +1,288 @@
+#benchmark suite of trajalign on synthetic endocytic trajectories (see synthetic.py). It times Traj.load, Traj.fill, MSD,
+#compute_transformations, compute_average (the 'average' stage of average_trajectories, see StageTimer in trajalign.log),
+#lie_down, align and Traj.save, checks their results against the golden outputs in golden.json and the alignments against
+#the ground truth of the generator, and compares the times with those of a baseline saved by an earlier run. The time of
+#each benchmark is the minimum over its repetitions (at least repeat, and as many as fit in min-time seconds). The suite
+#fails (exit status 1) if a result differs from the golden outputs, if an alignment is far from the ground truth or if a
+#benchmark is slower than max-slowdown times its baseline.
+#Usage: python suite.py [ --repeat 3 ] [ --min-time 0.5 ] [ --baseline baseline.json ] [ --save-baseline baseline.json ]
+#[ --max-slowdown 1.3 ] [ --update-golden ]
+#The baseline times depend on the machine: save them with --save-baseline before a change, and compare them with
+#--baseline after it. --update-golden rewrites golden.json, when a change of the results is intended.
+
+from trajalign.traj import Traj
+from trajalign.average import load_directory , MSD , compute_transformations , save_transformations , average_trajectories
+from trajalign.orientation import lie_down
+from trajalign.align import align
+from trajalign.log import set_verbosity
+from synthetic import endocytic_events , endocytic_trajectories , write_trajectories , write_average
+import copy as cp
+import numpy as np
+import argparse
+import shutil
+import tempfile
+import json
+import time
+import sys
+import os
+
+parser = argparse.ArgumentParser( description = 'Benchmark suite of trajalign on synthetic endocytic trajectories' )
+parser.add_argument( '--repeat' , type = int , default = 3 , help = 'repetitions of each benchmark (default is 3)' )
+parser.add_argument( '--min-time' , type = float , default = 0.5 , help = 'seconds for which the fast benchmarks are repeated (default is 0.5)' )
+parser.add_argument( '--baseline' , default = None , help = 'JSON file of the baseline times to compare with' )
+parser.add_argument( '--save-baseline' , default = None , help = 'JSON file where the times are saved as a baseline' )
+parser.add_argument( '--max-slowdown' , type = float , default = 1.3 , help = 'largest ratio between a time and its baseline (default is 1.3)' )
+parser.add_argument( '--update-golden' , action = 'store_true' , help = 'rewrite the golden outputs' )
+args = parser.parse_args()
+
+#only the warnings of trajalign are output
+set_verbosity( 0 )
+
+golden_file = os.path.join( os.path.dirname( os.path.abspath( __file__ ) ) , 'golden.json' )
+
+#the ensemble: n trajectories of an endocytic coat protein, and two-colour trajectories of the coat protein and of an
+#actin-associated protein, whose averages are aligned by align
+n = 10
+dt = 0.1045
+duration = ( -12.0 , 4.0 )
+#the two-colour events are longer, so that the truncations cut the actin-associated trajectories before its arrival
+two_colour_duration = ( -16.0 , 8.0 )
+load_options = dict( comment_char = '%' , frames = 0 , coord = ( 1 , 2 ) , f = 3 )
+directory_options = dict( load_options , dt = dt , t_unit = 's' , coord_unit = 'pxl' )
+#the target average of align is rotated by target_angle and delayed by target_delay seconds from the reference
+target_angle = 0.4
+target_delay = 1.2
+
+def by_file( trajectories ) :
+
+	#load_directory lists the files in the order of the file system
+	return( sorted( trajectories , key = lambda t : t.annotations()[ 'file' ] ) )
+
+def wrap( angle ) :
+
+	return( np.angle( np.exp( 1j * np.array( angle ) ) ) )
+
+def benchmark( function , setup = None ) :
+
+	#the minimum time of function( *setup() ) over the repetitions, and the output of the last repetition. The fast
+	#benchmarks are repeated until they ran for min_time seconds (and at most 1000 times), so that their minimum is stable.
+	times = []
+
+	while ( len( times ) < args.repeat ) or ( ( sum( times ) < args.min_time ) and ( len( times ) < 1000 ) ) :
+
+		inputs = setup() if setup is not None else ()
+		start = time.perf_counter()
+		output = function( *inputs )
+		times.append( time.perf_counter() - start )
+
+	return( min( times ) , output )
+
+cwd = os.getcwd()
+directory = tempfile.mkdtemp()
+os.chdir( directory )
+
+events = endocytic_events( n , seed = 1 , dt = dt , duration = duration )
+files = write_trajectories( endocytic_trajectories( events , 'coat' , seed = 2 ) , 'coat' )
+
+two_colour_events = endocytic_events( n , seed = 3 , dt = dt , duration = two_colour_duration )
+write_trajectories( endocytic_trajectories( two_colour_events , 'actin' , seed = 4 ) , 'two_colour' , '.actin.data' )
+write_trajectories( endocytic_trajectories( two_colour_events , 'coat' , seed = 5 ) , 'two_colour' , '.coat.data' )
+write_average( 'actin_average.txt' , 'actin' , dt = dt , duration = two_colour_duration , angle = target_angle , delay = target_delay )
+write_average( 'coat_average.txt' , 'coat' , dt = dt , duration = two_colour_duration )
+
+times = {}
+results = {}
+truth = {}
+
+#Traj.load
+def load() :
+
+	output = []
+
+	for f in files :
+
+		t = Traj( file = f )
+		t.load( os.path.join( 'coat' , f ) , **load_options )
+		t.time( dt , 's' )
+		output.append( t )
+
+	return( output )
+
+times[ 'Traj.load' ] , loaded = benchmark( load )
+results[ 'Traj.load' ] = { 'points' : sum( [ len( t ) for t in loaded ] ) , 'f' : float( sum( [ np.sum( t.f() ) for t in loaded ] ) ) }
+
+#Traj.fill
+def fill( trajectories ) :
+
+	for t in trajectories :
+		t.fill()
+
+	return( trajectories )
+
+times[ 'Traj.fill' ] , filled = benchmark( fill , lambda : ( cp.deepcopy( loaded ) , ) )
+results[ 'Traj.fill' ] = { 'points' : sum( [ len( t ) for t in filled ] ) , 'gaps' : int( sum( [ np.sum( np.isnan( t.f() ) ) for t in filled ] ) ) }
+
+#MSD, of the first 64 time points of each pair of consecutive trajectories
+windows = [ t.extract( slice( 0 , 64 ) ) for t in filled ]
+
+def msd() :
+
+	return( [ MSD( windows[ i ] , windows[ i + 1 ] ) for i in range( n - 1 ) ] )
+
+times[ 'MSD' ] , alignments = benchmark( msd )
+results[ 'MSD' ] = { 'angle' : [ float( a[ 'angle' ] ) for a in alignments ] , 'score' : [ float( a[ 'score' ] ) for a in alignments ] }
+
+#compute_transformations
+def transformations() :
+
+	#fimax_filter is that of average_trajectories, which checks it when it reads the transformations
+	return( compute_transformations( filled , False , [ -3/35 , 12/35 , 17/35 , 12/35 , -3/35 ] , lag_scan = 'exhaustive' ) )
+
+times[ 'compute_transformations' ] , T = benchmark( transformations )
+i , j = np.tril_indices( n , -1 )
+results[ 'compute_transformations' ] = { 'angles' : T[ 'angles' ][ i , j ].tolist() , 'lags' : T[ 'lags' ][ i , j ].tolist() , 'scores' : T[ 'scores' ][ i , j ].tolist() }
+
+#the angles and lags that align the trajectory j to i are the differences of their ground truth
+angle_error = np.abs( wrap( T[ 'angles' ][ i , j ] - np.array( [ events[ a ][ 'angle' ] - events[ b ][ 'angle' ] for a , b in zip( i , j ) ] ) ) )
+lag_error = np.abs( T[ 'lags' ][ i , j ] - np.array( [ events[ a ][ 'lag' ] - events[ b ][ 'lag' ] for a , b in zip( i , j ) ] ) )
+truth[ 'compute_transformations' ] = np.mean( ( angle_error < 0.1 ) & ( lag_error <= 3 ) ) >= 0.8
+
+#compute_average, timed by average_trajectories, which reads the transformations from the file instead of aligning the pairs
+save_transformations( T , 'transformations.json' )
+
+def average() :
+
+	output = average_trajectories( filled , output_file = 'average' , max_frame = 500 , cache = False , transformations_file = 'transformations.json' , verbose = 0 , timings_file = os.path.join( 'average' , 'timings.jsonl' ) )
+
+	with open( os.path.join( 'average' , 'timings.jsonl' ) , 'r' ) as f :
+
+		stages = { s[ 'stage' ] : s for s in [ json.loads( line ) for line in f ] }
+
+	return( stages[ 'average' ][ 'wall_s' ] , output )
+
+average_times = [ average() for r in range( args.repeat ) ]
+times[ 'compute_average' ] = min( [ a[ 0 ] for a in average_times ] )
+best_average = average_times[ -1 ][ 1 ][ 0 ]
+
+with open( os.path.join( 'average' , 'alignment_precision.txt' ) , 'r' ) as f :
+
+	precision = [ float( line ) for line in f if line.strip() ]
+
+results[ 'compute_average' ] = { 'points' : len( best_average ) , 'coord' : np.nanmean( best_average.coord() , axis = 1 ).tolist() , 'f' : float( np.nanmean( best_average.f() ) ) , 'precision' : precision }
+
+#lie_down
+times[ 'lie_down' ] , lied_down = benchmark( lambda : lie_down( best_average ) )
+results[ 'lie_down' ] = { 'angle' : float( lied_down[ 'angle' ] ) , 'translation' : [ float( x ) for x in lied_down[ 'translation' ] ] }
+
+#align
+ch1 = by_file( load_directory( 'two_colour' , '.actin.data$' , **directory_options ) )
+ch2 = by_file( load_directory( 'two_colour' , '.coat.data$' , **directory_options ) )
+
+def align_averages() :
+
+	align( 'actin_average.txt' , 'coat_average.txt' , ch1 , ch2 , unify_start_end_in_alignment = False , verbose = 0 )
+
+	aligned = Traj()
+	aligned.load( 'actin_average_aligned.txt' )
+
+	return( aligned.annotations() )
+
+times[ 'align' ] , aligned = benchmark( align_averages )
+alignment = {
+		'angle' : float( aligned[ 'alignment_angle' ].split()[ 0 ] ) ,
+		'translation' : [ float( x ) for x in aligned[ 'alignment_translation' ].split( ']' )[ 0 ].strip( '[' ).split( ',' ) ] ,
+		'lag' : float( aligned[ 'alignment_lag' ].split()[ 0 ] )
+		}
+results[ 'align' ] = alignment
+
+#align rotates the target average back by target_angle and delays it back by target_delay
+truth[ 'align' ] = ( abs( wrap( alignment[ 'angle' ] + target_angle ) ) < 0.05 ) & ( abs( alignment[ 'lag' ] + target_delay ) < 2 * dt )
+
+#Traj.save
+def save() :
+
+	for t in filled :
+		t.save( os.path.join( 'saved' , t.annotations()[ 'file' ] ) )
+
+	return( sum( [ os.path.getsize( os.path.join( 'saved' , t.annotations()[ 'file' ] + '.txt' ) ) for t in filled ] ) )
+
+os.makedirs( 'saved' )
+times[ 'Traj.save' ] , saved = benchmark( save )
+results[ 'Traj.save' ] = { 'bytes' : saved }
+
+os.chdir( cwd )
+shutil.rmtree( directory )
+
+#compare the results with the golden outputs, the alignments with the ground truth and the times with the baseline
+def same( a , b ) :
+
+	if isinstance( a , dict ) :
+		return( ( a.keys() == b.keys() ) and all( [ same( a[ k ] , b[ k ] ) for k in a.keys() ] ) )
+
+	return( np.shape( a ) == np.shape( b ) and np.allclose( a , b , rtol = 1e-6 , atol = 1e-9 , equal_nan = True ) )
+
+if args.update_golden or not os.path.exists( golden_file ) :
+
+	with open( golden_file , 'w' ) as f :
+		json.dump( results , f , indent = 1 )
+
+	print( 'The golden outputs were written in ' + golden_file )
+
+with open( golden_file , 'r' ) as f :
+	golden = json.load( f )
+
+baseline = None
+if args.baseline is not None :
+
+	with open( args.baseline , 'r' ) as f :
+		baseline = json.load( f )
+
+failures = []
+
+print( '________________' )
+print( str( n ) + ' synthetic trajectories, at least ' + str( args.repeat ) + ' repetitions' )
+print( 'benchmark\t\t\ttime (s)\tbaseline (s)\tgolden\ttruth' )
+
+for name in times.keys() :
+
+	row = name + '\t' * ( 4 - len( name ) // 8 ) + str( round( times[ name ] , 4 ) ) + '\t\t'
+
+	if ( baseline is not None ) and ( name in baseline.keys() ) :
+
+		row += str( round( baseline[ name ] , 4 ) ) + '\t\t'
+
+		#a small margin, so that the timer resolution and noise of the fastest benchmarks do not fail the suite
+		if times[ name ] > args.max_slowdown * baseline[ name ] + 1e-3 :
+			failures.append( name + ' is ' + str( round( times[ name ] / baseline[ name ] , 2 ) ) + ' times slower than its baseline' )
+
+	else :
+
+		row += '-\t\t'
+
+	if ( name in golden.keys() ) and same( results[ name ] , golden[ name ] ) :
+		row += 'ok\t'
+	else :
+		row += 'FAIL\t'
+		failures.append( name + ' differs from its golden output' )
+
+	if name in truth.keys() :
+		row += 'ok' if truth[ name ] else 'FAIL'
+		if not truth[ name ] :
+			failures.append( name + ' is far from the ground truth' )
+	else :
+		row += '-'
+
+	print( row )
+
+if args.save_baseline is not None :
+
+	with open( args.save_baseline , 'w' ) as f :
+		json.dump( times , f , indent = 1 )
+
+	print( 'The times were saved as a baseline in ' + args.save_baseline )
+
+for failure in failures :
+
+	print( 'FAIL: ' + failure )
+
+sys.exit( 1 if failures else 0 )
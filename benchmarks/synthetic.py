@@ -0,0 +1,159 @@
+#seeded generator of synthetic endocytic trajectories, used by the benchmarks. Each event follows the same profile in its
+#own frame of reference: the spot moves inward along the positive x by 'inward' (a sigmoid centred at t_inward), while its
+#fluorescence intensity rises and decays (the product of two sigmoids). Each trajectory of the ensemble is the profile
+#sampled every dt, truncated at random at its start and end, rotated by a random angle, translated by a random vector,
+#started at a random frame of the movie and with localisation and intensity noise. Random frames are missing, so that
+#the trajectories have gaps (which Traj.fill fills with NaN). The angles, translations and lags are returned as the
+#ground truth of the alignments.
+
+from trajalign.traj import Traj
+import numpy as np
+import os
+
+profiles = {
+		#an endocytic coat protein (Sla1-like): it arrives early and moves a little before disassembling
+		'coat' : { 'inward' : 0.6 , 't_inward' : 0.0 , 'tau_inward' : 0.8 , 't_rise' : -12.0 , 'tau_rise' : 2.0 , 't_decay' : 1.5 , 'tau_decay' : 0.6 } ,
+		#an actin-associated protein (Abp1-like): it arrives late, moves inward with the vesicle and disassembles
+		'actin' : { 'inward' : 2.0 , 't_inward' : 1.5 , 'tau_inward' : 0.8 , 't_rise' : -2.0 , 'tau_rise' : 0.8 , 't_decay' : 4.0 , 'tau_decay' : 1.0 }
+		}
+
+def endocytic_profile( t , inward , t_inward , tau_inward , t_rise , tau_rise , t_decay , tau_decay ) :
+
+	"""
+	endocytic_profile( t , inward , t_inward , tau_inward , t_rise , tau_rise , t_decay , tau_decay ): the coordinates x, y
+	and the fluorescence intensity f, normalised to a maximum of about 1, of an endocytic event at the times t (in s).
+	"""
+
+	x = inward / ( 1 + np.exp( - ( t - t_inward ) / tau_inward ) )
+	y = np.zeros( len( t ) )
+	f = 1 / ( 1 + np.exp( - ( t - t_rise ) / tau_rise ) ) / ( 1 + np.exp( ( t - t_decay ) / tau_decay ) )
+
+	return( x , y , f )
+
+def rotation( angle ) :
+
+	return( np.array( [ [ np.cos( angle ) , - np.sin( angle ) ] , [ np.sin( angle ) , np.cos( angle ) ] ] ) )
+
+def endocytic_events( n , seed = 0 , dt = 0.1045 , duration = ( -16.0 , 8.0 ) , truncation = 0.2 , max_lag = 200 , field = 100.0 ) :
+
+	"""
+	endocytic_events( n , seed = 0 , dt = 0.1045 , duration = ( -16.0 , 8.0 ) , truncation = 0.2 , max_lag = 200 , field = 100.0 ):
+	draws the ground truth of n events: the event times (in s) sampled every dt within duration and truncated at random by up to
+	'truncation' of their length at their start and end, the angle and translation (within a square of side field) that move each
+	event from its own frame of reference to the movie, and the lag (in frames) of the start of duration in the movie, which
+	is before the first time point of the truncated events. The frames of each event are the lag plus the indexes of its times
+	within duration. Returns a list of dictionaries { 't' , 'frames' , 'angle' , 'translation' , 'lag' }.
+	"""
+
+	rng = np.random.default_rng( seed )
+	t = np.arange( duration[ 0 ] , duration[ 1 ] , dt )
+	max_cut = int( truncation * len( t ) )
+
+	events = []
+
+	for k in range( n ) :
+
+		start , end = rng.integers( 0 , max_cut + 1 , size = 2 )
+		angle = rng.uniform( - np.pi , np.pi )
+		translation = rng.uniform( 0 , field , size = 2 )
+		lag = int( rng.integers( 0 , max_lag ) )
+
+		events.append( {
+			't' : t[ start : len( t ) - end ] ,
+			'frames' : lag + np.arange( start , len( t ) - end ) ,
+			'angle' : angle ,
+			'translation' : translation ,
+			'lag' : lag
+			} )
+
+	return( events )
+
+def endocytic_trajectories( events , profile = 'coat' , seed = 0 , delay = 0.0 , noise = 0.03 , f_noise = 0.03 , gaps = 0.03 ) :
+
+	"""
+	endocytic_trajectories( events , profile = 'coat' , seed = 0 , delay = 0.0 , noise = 0.03 , f_noise = 0.03 , gaps = 0.03 ):
+	samples the profile (a key of profiles, or a dictionary of the parameters of endocytic_profile) for each of the events
+	(see endocytic_events), delayed by delay seconds. The coordinates have a localisation noise of standard deviation noise
+	divided by the square root of the intensity, the intensities are scaled by a random brightness and have noise of standard
+	deviation f_noise (negative intensities are set to 0), and a fraction gaps of the time points, other than the first and the last, is missing. Returns a list of
+	dictionaries { 'frames' , 'x' , 'y' , 'f' }.
+	"""
+
+	if isinstance( profile , str ) :
+		profile = profiles[ profile ]
+
+	rng = np.random.default_rng( seed )
+
+	trajectories = []
+
+	for e in events :
+
+		x , y , f = endocytic_profile( e[ 't' ] - delay , **profile )
+		coord = rotation( e[ 'angle' ] ) @ np.array( [ x , y ] ) + e[ 'translation' ][ : , None ]
+		coord = coord + rng.normal( 0 , 1 , size = coord.shape ) * noise / np.sqrt( np.maximum( f , 0.05 ) )
+		f = np.maximum( rng.lognormal( 0 , 0.2 ) * f + rng.normal( 0 , f_noise , size = len( f ) ) , 0 )
+
+		kept = np.ones( len( f ) , dtype = 'bool' )
+		kept[ 1 : -1 ] = rng.uniform( size = len( f ) - 2 ) >= gaps
+
+		trajectories.append( {
+			'frames' : e[ 'frames' ][ kept ] ,
+			'x' : coord[ 0 ][ kept ] ,
+			'y' : coord[ 1 ][ kept ] ,
+			'f' : f[ kept ]
+			} )
+
+	return( trajectories )
+
+def write_trajectories( trajectories , path , pattern = '.data' ) :
+
+	"""
+	write_trajectories( trajectories , path , pattern = '.data' ): writes the trajectories in the directory path, one file per
+	trajectory with the columns frames, x, y and f, as in example/trajectory_average_example/raw_trajectories. They are loaded with
+	load_directory( path , pattern , comment_char = '%' , frames = 0 , coord = ( 1 , 2 ) , f = 3 , ... ). Returns the file names.
+	"""
+
+	if not os.path.exists( path ) :
+		os.makedirs( path )
+
+	files = []
+
+	for k in range( len( trajectories ) ) :
+
+		files.append( str( k + 1 ).zfill( 3 ) + pattern )
+
+		with open( os.path.join( path , files[ -1 ] ) , 'w' ) as f :
+
+			f.write( '%% Trajectory ' + str( k + 1 ) + '\n' )
+
+			for i in range( len( trajectories[ k ][ 'f' ] ) ) :
+
+				f.write( str( trajectories[ k ][ 'frames' ][ i ] ) + ' ' + repr( trajectories[ k ][ 'x' ][ i ] ) + ' ' + repr( trajectories[ k ][ 'y' ][ i ] ) + ' ' + repr( trajectories[ k ][ 'f' ][ i ] ) + '\n' )
+
+	return( files )
+
+def write_average( file_name , profile = 'coat' , dt = 0.1045 , duration = ( -16.0 , 8.0 ) , angle = 0.0 , translation = ( 0.0 , 0.0 ) , delay = 0.0 , n = 20 ) :
+
+	"""
+	write_average( file_name , profile = 'coat' , dt = 0.1045 , duration = ( -16.0 , 8.0 ) , angle = 0.0 , translation = ( 0.0 , 0.0 ) , delay = 0.0 , n = 20 ):
+	writes, as average_trajectories would, the noiseless average of n trajectories of profile, rotated by angle, translated by
+	translation and delayed by delay seconds, with the annotations that align needs.
+	"""
+
+	if isinstance( profile , str ) :
+		profile = profiles[ profile ]
+
+	t = np.arange( duration[ 0 ] , duration[ 1 ] , dt )
+	x , y , f = endocytic_profile( t - delay , **profile )
+	coord = rotation( angle ) @ np.array( [ x , y ] ) + np.array( translation )[ : , None ]
+
+	average = Traj( experiment = 'synthetic' , file = os.path.basename( file_name ) , t_unit = 's' , delta_t = dt , coord_unit = 'pxl' , intensity_normalisation = 'None' ,
+			mean_starts = duration[ 0 ] , std_starts = 1.0 , n_starts = n , mean_ends = duration[ 1 ] , std_ends = 1.0 , n_ends = n , unify_start_end = False )
+	average.input_values( 't' , t )
+	average.input_values( 'coord' , coord )
+	average.input_values( 'f' , f )
+	average.input_values( 'coord_err' , np.full( coord.shape , 0.01 ) )
+	average.input_values( 'f_err' , np.full( len( f ) , 0.01 ) )
+	average.save( file_name )
+
+	return( average )
@@ -0,0 +1,44 @@
+#fixtures of the tests of trajalign: small ensembles of the synthetic endocytic trajectories of the benchmarks (see
+#benchmarks/synthetic.py), written to files and loaded with load_directory, as the trajectories of an experiment.
+#Run the tests from the root of the repository with: python -m pytest tests
+
+import os
+import sys
+import pytest
+
+sys.path.insert( 0 , os.path.join( os.path.dirname( os.path.dirname( os.path.abspath( __file__ ) ) ) , 'benchmarks' ) )
+
+from synthetic import endocytic_events , endocytic_trajectories , write_trajectories
+from trajalign.average import load_directory
+from trajalign.log import set_verbosity
+
+directory_options = dict( comment_char = '%' , frames = 0 , coord = ( 1 , 2 ) , f = 3 , dt = 0.1045 , t_unit = 's' , coord_unit = 'pxl' )
+
+def by_file( trajectories ) :
+
+	#load_directory lists the files in the order of the file system
+	return( sorted( trajectories , key = lambda t : t.annotations()[ 'file' ] ) )
+
+@pytest.fixture( autouse = True )
+def quiet() :
+
+	#only the warnings of trajalign are output
+	set_verbosity( 0 )
+
+@pytest.fixture( scope = 'session' )
+def trajectory_directory( tmp_path_factory ) :
+
+	path = str( tmp_path_factory.mktemp( 'trajectories' ) )
+	events = endocytic_events( 7 , seed = 1 , duration = ( -6.0 , 2.0 ) , truncation = 0.1 , max_lag = 20 )
+	write_trajectories( endocytic_trajectories( events , 'coat' , seed = 2 , gaps = 0 ) , path )
+
+	return( path )
+
+@pytest.fixture
+def trajectories( trajectory_directory ) :
+
+	"""
+	trajectories: 7 synthetic trajectories of about 75 time points, loaded again for each test and sorted by file name.
+	"""
+
+	return( by_file( load_directory( trajectory_directory , '.data' , **directory_options ) ) )
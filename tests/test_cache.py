@@ -0,0 +1,90 @@
+#tests of the on-disk cache of the pairwise alignments (see trajalign.cache)
+
+import os
+import time
+import numpy as np
+from trajalign.cache import AlignmentCache , traj_hash , default_cache_directory
+from trajalign.average import compute_transformations , average_trajectories
+from trajalign.counters import work
+
+fimax_filter = [ -3/35 , 12/35 , 17/35 , 12/35 , -3/35 ]
+options = { 'fimax' : False , 'fimax_filter' : fimax_filter , 'lag_scan' : 'exhaustive' }
+
+def test_hash_depends_on_the_content_only( trajectories ) :
+
+	t = trajectories[ 0 ]
+	h = traj_hash( t )
+
+	t.annotations( 'file' , 'another_file.data' )
+	assert traj_hash( t ) == h
+
+	t.translate( [ 1e-9 , 0 ] )
+	assert traj_hash( t ) != h
+
+def test_key_depends_on_the_pair_and_the_options( trajectories , tmp_path ) :
+
+	cache = AlignmentCache( str( tmp_path ) )
+	t1 , t2 = trajectories[ : 2 ]
+
+	assert cache.key( t1 , t2 , options ) == cache.key( t1 , t2 , dict( options ) )
+	assert cache.key( t1 , t2 , options ) != cache.key( t2 , t1 , options )
+	assert cache.key( t1 , t2 , options ) != cache.key( t1 , t2 , dict( options , fimax = True ) )
+
+def test_put_and_get( tmp_path ) :
+
+	cache = AlignmentCache( str( tmp_path ) )
+	alignment = { 'lag' : -3 , 'angle' : np.float64( 0.1 ) , 'rc' : np.array( [ 1 / 3 , 2.5 ] ) , 'lc' : np.array( [ - 1 / 7 , 0.0 ] ) , 'score' : np.float64( np.pi ) }
+
+	assert cache.get( 'missing' ) is None
+	cache.put( 'pair' , alignment )
+	read = cache.get( 'pair' )
+
+	#the floats are read back identical
+	for a in alignment.keys() :
+
+		np.testing.assert_array_equal( read[ a ] , alignment[ a ] )
+
+	assert ( cache.hits , cache.misses ) == ( 1 , 1 )
+
+def test_least_recently_used_alignments_are_evicted( tmp_path ) :
+
+	alignment = { 'lag' : 0 , 'angle' : 0.0 , 'rc' : [ 0.0 , 0.0 ] , 'lc' : [ 0.0 , 0.0 ] , 'score' : 0.0 }
+	cache = AlignmentCache( str( tmp_path ) )
+	cache.put( 'first' , alignment )
+	size = cache.size
+	#the cache can store two alignments
+	cache.max_size = 2 * size
+
+	cache.put( 'second' , alignment )
+	past = time.time() - 100
+	os.utime( os.path.join( str( tmp_path ) , 'second.json' ) , ( past , past ) )
+	#reading 'first' makes it the most recently used alignment
+	assert cache.get( 'first' ) is not None
+	cache.put( 'third' , alignment )
+
+	assert sorted( os.listdir( str( tmp_path ) ) ) == [ 'first.json' , 'third.json' ]
+	assert cache.size == 2 * size
+
+def test_cached_alignments_are_not_recomputed( trajectories , tmp_path ) :
+
+	cache = AlignmentCache( str( tmp_path ) )
+	first = compute_transformations( trajectories[ : 4 ] , False , fimax_filter , cache = cache )
+
+	start = work.copy()
+	second = compute_transformations( trajectories[ : 4 ] , False , fimax_filter , cache = cache )
+	done = work - start
+
+	assert ( done[ 'cache_hits' ] , done[ 'cache_misses' ] , done[ 'msd_evaluations' ] ) == ( 6 , 0 , 0 )
+
+	for m in [ 'angles' , 'rcs' , 'lcs' , 'lags' , 'scores' ] :
+
+		np.testing.assert_array_equal( first[ m ] , second[ m ] , err_msg = m )
+
+def test_average_trajectories_uses_no_cache_by_default( trajectories , tmp_path , monkeypatch ) :
+
+	monkeypatch.setenv( 'XDG_CACHE_HOME' , str( tmp_path / 'cache' ) )
+	monkeypatch.chdir( tmp_path )
+
+	average_trajectories( trajectories[ : 3 ] , output_file = 'average' , max_frame = 200 , keep = 'best' )
+
+	assert not os.path.exists( default_cache_directory() )
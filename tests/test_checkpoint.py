@@ -0,0 +1,105 @@
+#tests of the checkpoints of the pairwise alignments and of their resume (see trajalign.checkpoint)
+
+import numpy as np
+import pytest
+from trajalign.checkpoint import Checkpoint , fingerprint
+from trajalign.storage import load_transformations
+from trajalign.average import compute_transformations , alignment_fingerprint , transformation_options
+from trajalign.counters import work
+
+fimax_filter = [ -3/35 , 12/35 , 17/35 , 12/35 , -3/35 ]
+matrices = [ 'angles' , 'rcs' , 'lcs' , 'lags' , 'pairs' , 'scores' ]
+
+def key( trajectories , lag_scan = 'exhaustive' ) :
+
+	#the fingerprint of compute_transformations with pairing = 'all'
+	return( alignment_fingerprint( trajectories , transformation_options( False , fimax_filter , lag_scan , [ 8 , 8 ] , 'all' , 10 ) ) )
+
+def assert_matrices_equal( a , b ) :
+
+	for m in matrices :
+
+		np.testing.assert_array_equal( a[ m ] , b[ m ] , err_msg = m )
+
+def test_fingerprint( trajectories ) :
+
+	h = fingerprint( trajectories , { 'a' : 1 , 'b' : [ 2 ] } )
+
+	assert fingerprint( trajectories , { 'b' : [ 2 ] , 'a' : 1 } ) == h
+	assert fingerprint( trajectories , { 'a' : 2 , 'b' : [ 2 ] } ) != h
+	assert fingerprint( trajectories[ : : -1 ] , { 'a' : 1 , 'b' : [ 2 ] } ) != h
+
+def test_save_and_load( trajectories , tmp_path ) :
+
+	transformations = compute_transformations( trajectories[ : 3 ] , False , fimax_filter )
+	checkpoint = Checkpoint( str( tmp_path / 'run' / 'checkpoint.npz' ) , interval = 3600 )
+
+	assert checkpoint.load( 'abc' ) is None
+	assert not checkpoint.due()
+
+	checkpoint.save( transformations , 'abc' )
+
+	assert checkpoint.saves == 1
+	assert [ f.name for f in ( tmp_path / 'run' ).iterdir() ] == [ 'checkpoint.npz' ]
+	assert_matrices_equal( checkpoint.load( 'abc' ) , transformations )
+	#a checkpoint is also a file of transformations
+	assert_matrices_equal( load_transformations( checkpoint.file_name ) , transformations )
+
+	with pytest.raises( AttributeError ) :
+
+		checkpoint.load( 'another fingerprint' )
+
+def test_due( tmp_path ) :
+
+	assert Checkpoint( str( tmp_path / 'checkpoint.npz' ) , interval = 0 ).due()
+
+	with pytest.raises( AttributeError ) :
+
+		Checkpoint( str( tmp_path / 'checkpoint.npz' ) , interval = -1 )
+
+def test_resume_aligns_only_the_missing_pairs( trajectories , tmp_path ) :
+
+	trajectories = trajectories[ : 5 ]
+	file_name = str( tmp_path / 'checkpoint.npz' )
+
+	start = work.copy()
+	full = compute_transformations( trajectories , False , fimax_filter , checkpoint = Checkpoint( file_name , interval = 0 ) )
+	full_work = work - start
+
+	#the checkpoint of a run interrupted after it aligned the pairs of the first 3 trajectories
+	checkpoint = Checkpoint( file_name )
+	partial = checkpoint.load( key( trajectories ) )
+	assert_matrices_equal( partial , full )
+
+	for m in matrices :
+
+		partial[ m ][ 3 : , : ] = 0
+		partial[ m ][ : , 3 : ] = 0
+
+	checkpoint.save( partial , key( trajectories ) )
+
+	start = work.copy()
+	resumed = compute_transformations( trajectories , False , fimax_filter , resume = Checkpoint( file_name ) )
+	resumed_work = work - start
+
+	assert_matrices_equal( resumed , full )
+	assert 0 < resumed_work[ 'msd_evaluations' ] < full_work[ 'msd_evaluations' ]
+
+def test_resume_refuses_other_trajectories_or_options( trajectories , tmp_path ) :
+
+	file_name = str( tmp_path / 'checkpoint.npz' )
+	compute_transformations( trajectories[ : 3 ] , False , fimax_filter , checkpoint = Checkpoint( file_name ) )
+
+	with pytest.raises( AttributeError ) :
+
+		compute_transformations( trajectories[ 1 : 4 ] , False , fimax_filter , resume = Checkpoint( file_name ) )
+
+	with pytest.raises( AttributeError ) :
+
+		compute_transformations( trajectories[ : 3 ] , False , fimax_filter , lag_scan = 'fft' , resume = Checkpoint( file_name ) )
+
+def test_resume_without_checkpoint_aligns_all_the_pairs( trajectories , tmp_path ) :
+
+	resumed = compute_transformations( trajectories[ : 3 ] , False , fimax_filter , resume = Checkpoint( str( tmp_path / 'missing.npz' ) ) )
+
+	assert_matrices_equal( resumed , compute_transformations( trajectories[ : 3 ] , False , fimax_filter ) )
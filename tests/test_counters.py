@@ -0,0 +1,83 @@
+#tests of the counters of the work done by trajalign (see trajalign.counters): the counters must count the work that is
+#actually done, whether it is done by this process or by the workers of a process pool
+
+import copy as cp
+import numpy as np
+import pytest
+from trajalign.counters import WorkCounters , counter_names , work
+from trajalign.average import MSD_batch , compute_transformations , average_trajectories
+
+fimax_filter = [ -3/35 , 12/35 , 17/35 , 12/35 , -3/35 ]
+
+def test_work_counters( ) :
+
+	a = WorkCounters( msd_evaluations = 3 )
+	a.add( 'lags_scanned' , 5 )
+	a.add( 'lags_scanned' )
+	b = a.copy()
+	b.update( { 'msd_evaluations' : 2 , 'cache_hits' : 1 } )
+	b.update( WorkCounters( pairs_skipped = 4 ) )
+
+	assert a.as_dict() == dict( dict.fromkeys( counter_names , 0 ) , msd_evaluations = 3 , lags_scanned = 6 )
+	assert ( b - a ).as_dict() == dict( dict.fromkeys( counter_names , 0 ) , msd_evaluations = 2 , cache_hits = 1 , pairs_skipped = 4 )
+	assert b.summary().startswith( 'msd_evaluations 5, lags_scanned 6, ' )
+
+	b.reset()
+
+	assert b.as_dict() == dict.fromkeys( counter_names , 0 )
+
+	with pytest.raises( AttributeError ) :
+
+		a.add( 'seconds' )
+
+def test_msd_evaluations_and_copies( trajectories ) :
+
+	start = work.copy()
+
+	rng = np.random.default_rng( 0 )
+	MSD_batch( rng.normal( size = ( 6 , 2 , 20 ) ) , rng.uniform( size = ( 6 , 20 ) ) , rng.normal( size = ( 6 , 2 , 20 ) ) , rng.uniform( size = ( 6 , 20 ) ) )
+	cp.deepcopy( trajectories[ 0 ] )
+	trajectories[ 0 ].extract( slice( 5 , 20 ) )
+
+	done = work - start
+
+	assert done[ 'msd_evaluations' ] == 6
+	assert done[ 'traj_deepcopies' ] == 1
+	assert done[ 'extract_calls' ] == 1
+
+def test_work_of_the_workers_is_counted( trajectories ) :
+
+	#the workers of the process pool return their counters to this process
+	done = []
+
+	for workers in [ 1 , 2 ] :
+
+		start = work.copy()
+		compute_transformations( trajectories , False , fimax_filter , workers = workers )
+		done.append( work - start )
+
+	assert done[ 0 ][ 'msd_evaluations' ] > 0
+	assert done[ 0 ].as_dict() == done[ 1 ].as_dict()
+
+def test_pairs_skipped( trajectories ) :
+
+	l = len( trajectories )
+
+	start = work.copy()
+	T = compute_transformations( trajectories , False , fimax_filter , pairing = 'knn' , neighbours = 2 )
+	done = work - start
+
+	assert done[ 'pairs_skipped' ] == l * ( l - 1 ) // 2 - int( np.sum( np.tril( T[ 'pairs' ] , -1 ) ) )
+	assert done[ 'pairs_skipped' ] > 0
+
+def test_statistics_of_average_trajectories( trajectories , tmp_path , monkeypatch ) :
+
+	monkeypatch.chdir( tmp_path )
+
+	start = work.copy()
+	statistics = average_trajectories( trajectories , output_file = 'average' , max_frame = 200 , keep = 'best' )[ 2 ][ 'statistics' ]
+
+	#the statistics of the run are the work done by the run
+	assert statistics.as_dict() == ( work - start ).as_dict()
+	assert statistics[ 'msd_evaluations' ] > 0
+	assert statistics[ 'lags_scanned' ] > 0
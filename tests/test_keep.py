@@ -0,0 +1,78 @@
+#tests of the outputs that average_trajectories keeps and returns (see keep in average_trajectories): the averages that are
+#returned must not depend on keep, only which of them are kept
+
+import numpy as np
+import pytest
+from trajalign.average import average_trajectories
+
+def attributes( t ) :
+
+	return( { a : getattr( t , '_' + a ) for a in t.attributes() } )
+
+def assert_same_traj( a , b ) :
+
+	a , b = attributes( a ) , attributes( b )
+
+	assert a.keys() == b.keys()
+
+	for k in a.keys() :
+
+		np.testing.assert_array_equal( a[ k ] , b[ k ] , err_msg = k )
+
+def average( trajectories , **options ) :
+
+	return( average_trajectories( trajectories , output_file = 'average' , max_frame = 200 , **options ) )
+
+@pytest.mark.parametrize( 'reference_selection' , [ 'full' , 'fast' ] )
+def test_keep_best( trajectories , tmp_path , monkeypatch , reference_selection ) :
+
+	monkeypatch.chdir( tmp_path )
+
+	best , worst , output = average( trajectories , reference_selection = reference_selection )
+	lean_best , lean_worst , lean_output = average( trajectories , reference_selection = reference_selection , keep = 'best' )
+
+	assert worst is not None
+	assert len( output[ 'worst_score' ] ) == len( trajectories )
+
+	assert lean_worst is None
+	assert lean_output[ 'worst_score' ] is None
+	assert 'all_averages' not in lean_output
+
+	assert_same_traj( lean_best , best )
+
+	for a , b in zip( lean_output[ 'best_score' ] , output[ 'best_score' ] ) :
+
+		assert_same_traj( a , b )
+
+def test_keep_all( trajectories , tmp_path , monkeypatch ) :
+
+	monkeypatch.chdir( tmp_path )
+
+	best , worst , output = average( trajectories )
+	all_best , all_worst , all_output = average( trajectories , keep = 'all' )
+
+	assert_same_traj( all_best , best )
+	assert_same_traj( all_worst , worst )
+
+	#an average and a list of aligned trajectories for each reference
+	averages = all_output[ 'all_averages' ]
+	scores = list( all_output[ 'all_scores' ] )
+
+	assert len( averages ) == len( scores ) == len( trajectories )
+	assert all( len( s ) == len( trajectories ) for s in scores )
+
+	best_reference = [ k for k in range( len( averages ) ) if averages[ k ] is all_best ]
+
+	assert len( best_reference ) == 1
+
+	for a , b in zip( scores[ best_reference[ 0 ] ] , output[ 'best_score' ] ) :
+
+		assert_same_traj( a , b )
+
+def test_unknown_keep_is_refused( trajectories , tmp_path , monkeypatch ) :
+
+	monkeypatch.chdir( tmp_path )
+
+	with pytest.raises( AttributeError ) :
+
+		average( trajectories , keep = 'worst' )
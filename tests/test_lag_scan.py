@@ -0,0 +1,91 @@
+#tests of the scans of the lags of the pairs of trajectories (see lag_scan and workers in average_trajectories): the faster
+#scans, and the scans distributed over processes, must give the same alignments, and hence the same average, as the
+#exhaustive scan of a single process
+
+import numpy as np
+from trajalign.average import compute_transformations , average_trajectories , align_pair
+
+fimax_filter = [ -3/35 , 12/35 , 17/35 , 12/35 , -3/35 ]
+matrices = [ 'angles' , 'rcs' , 'lcs' , 'lags' , 'pairs' , 'scores' ]
+
+def assert_same_alignments( a , b ) :
+
+	for m in matrices :
+
+		np.testing.assert_array_equal( a[ m ] , b[ m ] , err_msg = m )
+
+def average( trajectories , **options ) :
+
+	#the best average of the trajectories, written in the current directory
+	best = average_trajectories( trajectories , output_file = 'average' , max_frame = 200 , keep = 'best' , **options )[ 0 ]
+
+	return( { a : getattr( best , '_' + a ) for a in best.attributes() } )
+
+def assert_same_average( a , b ) :
+
+	assert a.keys() == b.keys()
+
+	for k in a.keys() :
+
+		np.testing.assert_array_equal( a[ k ] , b[ k ] , err_msg = k )
+
+def test_fft_scan( trajectories ) :
+
+	assert_same_alignments(
+			compute_transformations( trajectories , False , fimax_filter , lag_scan = 'fft' ) ,
+			compute_transformations( trajectories , False , fimax_filter )
+			)
+
+def test_fft_average( trajectories , tmp_path , monkeypatch ) :
+
+	monkeypatch.chdir( tmp_path )
+
+	assert_same_average( average( trajectories , lag_scan = 'fft' ) , average( trajectories ) )
+
+def test_workers( trajectories ) :
+
+	#the pairs aligned by a pool of processes are aligned as by a single process
+	assert_same_alignments(
+			compute_transformations( trajectories , False , fimax_filter , workers = 2 ) ,
+			compute_transformations( trajectories , False , fimax_filter )
+			)
+
+def test_workers_average( trajectories , tmp_path , monkeypatch ) :
+
+	monkeypatch.chdir( tmp_path )
+
+	assert_same_average( average( trajectories , workers = 2 ) , average( trajectories ) )
+
+def test_multiresolution_scan( trajectories ) :
+
+	#the scan does skip lags of the trajectories
+	assert align_pair( trajectories[ 1 ] , trajectories[ 0 ] , 'multiresolution' , [ 1 , 1 ] )[ 'pruned_lags' ] > 0
+
+	#with few survivors, the lags missed by the decimated scans are certified by their lower bounds (see certified_lags)
+	for survivors in [ [ 8 , 8 ] , [ 1 , 1 ] ] :
+
+		assert_same_alignments(
+				compute_transformations( trajectories , False , fimax_filter , lag_scan = 'multiresolution' , survivors = survivors ) ,
+				compute_transformations( trajectories , False , fimax_filter )
+				)
+
+def test_multiresolution_average( trajectories , tmp_path , monkeypatch ) :
+
+	monkeypatch.chdir( tmp_path )
+
+	assert_same_average( average( trajectories , lag_scan = 'multiresolution' ) , average( trajectories ) )
+
+def test_branch_and_bound_scan( trajectories ) :
+
+	assert align_pair( trajectories[ 1 ] , trajectories[ 0 ] , 'branch_and_bound' )[ 'pruned_lags' ] > 0
+
+	assert_same_alignments(
+			compute_transformations( trajectories , False , fimax_filter , lag_scan = 'branch_and_bound' ) ,
+			compute_transformations( trajectories , False , fimax_filter )
+			)
+
+def test_branch_and_bound_average( trajectories , tmp_path , monkeypatch ) :
+
+	monkeypatch.chdir( tmp_path )
+
+	assert_same_average( average( trajectories , lag_scan = 'branch_and_bound' ) , average( trajectories ) )
@@ -0,0 +1,132 @@
+#tests of the messages and of the stage timings of trajalign (see trajalign.log)
+
+import os
+import json
+import logging
+import pytest
+import numpy as np
+from synthetic import endocytic_events , endocytic_trajectories , write_trajectories , write_average
+from trajalign.log import logger , set_verbosity , restores_verbosity , StageTimer
+from trajalign.average import load_directory , average_trajectories
+from trajalign.align import align
+from trajalign.pairing import pairing_report
+
+directory_options = dict( comment_char = '%' , frames = 0 , coord = ( 1 , 2 ) , f = 3 , dt = 0.1045 , t_unit = 's' , coord_unit = 'pxl' )
+
+def test_verbose_applies_to_the_call_only( ) :
+
+	set_verbosity( 1 )
+
+	@restores_verbosity
+	def run( verbose ) :
+
+		set_verbosity( verbose )
+		assert logger.level == logging.DEBUG
+		raise ValueError( 'interrupted' )
+
+	with pytest.raises( ValueError ) :
+
+		run( 2 )
+
+	assert logger.level == logging.INFO
+
+	#average_trajectories raises with an empty list of trajectories
+	with pytest.raises( Exception ) :
+
+		average_trajectories( [] , verbose = 2 )
+
+	assert logger.level == logging.INFO
+
+def test_messages_follow_the_standard_output( capsys ) :
+
+	#the standard output is replaced by pytest after trajalign is imported
+	logger.warning( 'Warning: a message' )
+
+	assert capsys.readouterr().out == 'Warning: a message\n'
+
+	#a ring of 6 trajectories, each aligned to its 2 neighbours only
+	pairs = np.zeros( ( 6 , 6 ) , dtype = bool )
+
+	for i in range( 6 ) :
+
+		pairs[ i , ( i + 1 ) % 6 ] = pairs[ ( i + 1 ) % 6 , i ] = True
+
+	report = pairing_report( pairs )
+
+	assert report[ 'mean_degree' ] == 2
+	assert 'Consider increasing neighbours' in capsys.readouterr().out
+
+	#the progress messages are not output with verbose = 0
+	pairing_report( np.ones( ( 6 , 6 ) , dtype = bool ) )
+
+	assert capsys.readouterr().out == ''
+
+def test_stages( tmp_path ) :
+
+	timer = StageTimer( run = 'test' )
+	timer.stage( 'first' )
+	timer.stage( 'second' )
+	timer.stage( 'first' )
+	timer.stop()
+
+	stages = timer.stages()
+
+	assert [ ( s[ 'stage' ] , s[ 'calls' ] ) for s in stages ] == [ ( 'first' , 2 ) , ( 'second' , 1 ) ]
+
+	for s in stages :
+
+		#the peak memory is that of the process, and the stages can only raise it
+		assert s[ 'process_peak_memory_mb' ] > 0
+		assert s[ 'peak_memory_increase_mb' ] >= 0
+
+	timer.save( str( tmp_path / 'timings.jsonl' ) )
+
+	with open( str( tmp_path / 'timings.jsonl' ) , 'r' ) as f :
+
+		lines = [ json.loads( line ) for line in f ]
+
+	assert [ ( l[ 'run' ] , l[ 'stage' ] ) for l in lines ] == [ ( 'test' , 'first' ) , ( 'test' , 'second' ) ]
+
+def test_align_writes_the_timings_only_if_asked( tmp_path , monkeypatch ) :
+
+	monkeypatch.chdir( tmp_path )
+	duration = ( -16.0 , 8.0 )
+	events = endocytic_events( 4 , seed = 3 , duration = duration )
+	write_trajectories( endocytic_trajectories( events , 'actin' , seed = 4 ) , 'two_colour' , '.actin.data' )
+	write_trajectories( endocytic_trajectories( events , 'coat' , seed = 5 ) , 'two_colour' , '.coat.data' )
+	write_average( 'actin_average.txt' , 'actin' , duration = duration )
+	write_average( 'coat_average.txt' , 'coat' , duration = duration )
+	#the trajectories of the two channels are paired by their file names
+	ch1 = sorted( load_directory( 'two_colour' , '.actin.data$' , **directory_options ) , key = lambda t : t.annotations()[ 'file' ] )
+	ch2 = sorted( load_directory( 'two_colour' , '.coat.data$' , **directory_options ) , key = lambda t : t.annotations()[ 'file' ] )
+
+	files = set( os.listdir( '.' ) )
+	align( 'actin_average.txt' , 'coat_average.txt' , ch1 , ch2 , unify_start_end_in_alignment = False , verbose = 0 )
+
+	assert [ f for f in set( os.listdir( '.' ) ) - files if 'timings' in f ] == []
+
+	statistics = align( 'actin_average.txt' , 'coat_average.txt' , ch1 , ch2 , unify_start_end_in_alignment = False , verbose = 0 , timings_file = 'timings.jsonl' )
+
+	with open( 'timings.jsonl' , 'r' ) as f :
+
+		lines = [ json.loads( line ) for line in f ]
+
+	assert [ l[ 'stage' ] for l in lines ] == [ 'load' , 'spline' , 'cc' , 'MSD' , 'reduce' , 'save' , 'work' ]
+	assert lines[ -1 ][ 'msd_evaluations' ] == statistics[ 'msd_evaluations' ]
+
+def test_average_writes_the_timings_only_if_asked( trajectories , tmp_path , monkeypatch ) :
+
+	monkeypatch.chdir( tmp_path )
+
+	average_trajectories( trajectories , output_file = 'average' , max_frame = 200 , keep = 'best' , verbose = 0 )
+
+	assert [ f for f in os.listdir( 'average' ) if 'timings' in f ] == []
+
+	output = average_trajectories( trajectories , output_file = 'average' , max_frame = 200 , keep = 'best' , verbose = 0 , timings_file = 'timings.jsonl' )
+
+	with open( 'timings.jsonl' , 'r' ) as f :
+
+		lines = [ json.loads( line ) for line in f ]
+
+	assert [ l[ 'stage' ] for l in lines ][ -1 ] == 'work'
+	assert lines[ -1 ][ 'msd_evaluations' ] == output[ 2 ][ 'statistics' ][ 'msd_evaluations' ]
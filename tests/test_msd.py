@@ -0,0 +1,39 @@
+#tests of the batched alignments of many pairs of trajectories at once (see MSD_batch and MSD_pairs in trajalign.average)
+#against the alignment of each pair with MSD
+
+import numpy as np
+import pytest
+from trajalign.average import MSD , MSD_pairs
+
+def pairs_of( trajectories ) :
+
+	#pairs of windows of the trajectories, whose lengths span more than one bucket of MSD_pairs
+	pairs = []
+
+	for k in range( 1 , len( trajectories ) ) :
+
+		l = min( len( trajectories[ k - 1 ] ) , len( trajectories[ k ] ) ) - 5 * k
+
+		pairs.append( ( trajectories[ k - 1 ].extract( slice( 0 , l ) ) , trajectories[ k ].extract( slice( 5 , 5 + l ) ) ) )
+
+	return( pairs )
+
+def test_pairs_are_aligned_as_by_MSD( trajectories ) :
+
+	pairs = pairs_of( trajectories )
+
+	assert len( set( [ len( t1 ) // 16 for t1 , t2 in pairs ] ) ) > 1
+
+	for ( t1 , t2 ) , a in zip( pairs , MSD_pairs( pairs , bucket = 16 ) ) :
+
+		b = MSD( t1 , t2 )
+
+		for k in [ 'angle' , 'rc' , 'lc' , 'score' ] :
+
+			np.testing.assert_allclose( a[ k ] , b[ k ] , rtol = 1e-12 , atol = 1e-12 , err_msg = k )
+
+def test_pairs_of_different_lengths_are_refused( trajectories ) :
+
+	with pytest.raises( IndexError ) :
+
+		MSD_pairs( [ ( trajectories[ 0 ] , trajectories[ 0 ].extract( slice( 0 , 10 ) ) ) ] )
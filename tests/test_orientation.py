@@ -0,0 +1,78 @@
+#tests of the line fitters and of lie_down, which lies the average trajectories down along the x axis (see
+#trajalign.orientation)
+
+import numpy as np
+import pytest
+from trajalign.traj import Traj
+from trajalign.orientation import line_fitters , lie_down , lie_down_ensemble
+
+def line( angle , n = 60 , noise = 0.05 , seed = 0 ) :
+
+	#a trajectory that moves along a straight line with the given angle, and that accelerates as the endocytic patches
+	#do, so that its larger displacements from its median position are towards its end
+	rng = np.random.default_rng( seed )
+	s = 10 * np.linspace( 0 , 1 , n ) ** 2
+	coord = np.array( [ [ np.cos( angle ) , - np.sin( angle ) ] , [ np.sin( angle ) , np.cos( angle ) ] ] ) @ np.array( [ s , rng.normal( 0 , noise , n ) ] ) + np.array( [ [ 3.0 ] , [ - 2.0 ] ] )
+
+	t = Traj( file = 'line' )
+	t.input_values( 't' , np.arange( n ) * 0.1 )
+	t.input_values( 'coord' , coord )
+	t.input_values( 'f' , 1 + np.sin( np.pi * s / 10 ) )
+
+	return( t )
+
+@pytest.mark.parametrize( 'fitter' , line_fitters.keys() )
+def test_line_fitters( fitter ) :
+
+	rng = np.random.default_rng( 1 )
+	x = np.linspace( - 5 , 5 , 80 )
+	y = 0.3 * x + rng.normal( 0 , 0.02 , len( x ) )
+	f = np.ones( len( x ) )
+
+	assert abs( line_fitters[ fitter ]( x , y , f ) - np.arctan( 0.3 ) ) < 0.01
+
+@pytest.mark.parametrize( 'fitter' , [ 'ransac' , 'theil_sen' ] )
+def test_robust_line_fitters( fitter ) :
+
+	#a tenth of the points are far from the line
+	rng = np.random.default_rng( 2 )
+	x = np.linspace( - 5 , 5 , 80 )
+	y = 0.3 * x + rng.normal( 0 , 0.02 , len( x ) )
+	y[ : : 10 ] = y[ : : 10 ] + 5
+	f = np.ones( len( x ) )
+
+	assert abs( line_fitters[ fitter ]( x , y , f ) - np.arctan( 0.3 ) ) < 0.02
+
+@pytest.mark.parametrize( 'fitter' , line_fitters.keys() )
+def test_lie_down( fitter ) :
+
+	for angle in [ 0.4 , 2.5 , - 1.2 ] :
+
+		t = line( angle )
+		transformation = lie_down( t , fitter )
+		t.translate( transformation[ 'translation' ] )
+		t.rotate( transformation[ 'angle' ] )
+
+		#the trajectory lies along the x axis and moves towards the positive x
+		assert np.max( np.abs( t.coord()[ 1 ] ) ) < 0.3
+		assert t.coord()[ 0 , -1 ] > t.coord()[ 0 , 0 ]
+
+def test_the_ensemble_lies_down_each_trajectory( ) :
+
+	#trajectories of different lengths, which are padded in the ensemble
+	trajectories = [ line( angle , n = n , seed = n ) for angle , n in [ ( 0.4 , 60 ) , ( 2.5 , 45 ) , ( - 1.2 , 70 ) ] ]
+
+	for fitter in line_fitters.keys() :
+
+		for e , t in zip( lie_down_ensemble( trajectories , fitter ) , trajectories ) :
+
+			l = lie_down( t , fitter )
+
+			np.testing.assert_allclose( e[ 'translation' ] , l[ 'translation' ] , rtol = 1e-12 )
+			np.testing.assert_allclose( e[ 'angle' ] , l[ 'angle' ] , rtol = 1e-12 )
+
+def test_unknown_fitters_are_refused( ) :
+
+	with pytest.raises( AttributeError ) :
+
+		lie_down( line( 0 ) , 'least_squares' )
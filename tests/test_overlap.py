@@ -0,0 +1,38 @@
+#tests of the overlap of the frames of two trajectories (see frame_overlap in trajalign.traj) against the scan of the
+#frames of one trajectory in those of the other, and of the trajectories extracted with the overlap
+
+import numpy as np
+import pytest
+from trajalign.traj import frame_overlap
+
+def scanned_overlap( frames1 , frames2 , lag ) :
+
+	return( [ i for i in range( len( frames1 ) ) if frames1[ i ] in frames2 + lag ] , [ i for i in range( len( frames2 ) ) if frames2[ i ] + lag in frames1 ] )
+
+@pytest.mark.parametrize( 'lag' , [ -40 , -12 , -3 , 0 , 5 , 17 , 40 ] )
+def test_frame_overlap( lag ) :
+
+	consecutive1 = np.arange( 10 , 30 )
+	consecutive2 = np.arange( 4 , 12 )
+	gaps = np.array( [ 3 , 4 , 6 , 7 , 8 , 11 , 15 ] )
+
+	for frames1 , frames2 in [ ( consecutive1 , consecutive2 ) , ( consecutive2 , consecutive1 ) , ( consecutive1 , gaps ) , ( gaps , consecutive1 ) ] :
+
+		sel1 , sel2 = frame_overlap( frames1 , frames2 , lag )
+		expected1 , expected2 = scanned_overlap( frames1 , frames2 , lag )
+
+		assert np.arange( len( frames1 ) )[ sel1 ].tolist() == expected1
+		assert np.arange( len( frames2 ) )[ sel2 ].tolist() == expected2
+
+def test_extracted_slice( trajectories ) :
+
+	t = trajectories[ 0 ]
+	sliced = t.extract( slice( 5 , 20 ) )
+	indexed = t.extract( list( range( 5 , 20 ) ) )
+
+	assert sliced.annotations()[ 'range' ] == 'range(5, 20)'
+	assert sliced.attributes() == indexed.attributes()
+
+	for a in sliced.attributes() :
+
+		np.testing.assert_array_equal( getattr( sliced , '_' + a ) , getattr( indexed , '_' + a ) , err_msg = a )
@@ -0,0 +1,62 @@
+#tests of the sparse k-nearest-neighbour pairing of the trajectories (see trajalign.pairing)
+
+import os
+import pytest
+import numpy as np
+from trajalign.pairing import candidate_pairs , components
+from trajalign.average import average_trajectories , align_pair
+
+def test_all_the_neighbours_are_all_the_pairs( trajectories ) :
+
+	l = len( trajectories )
+
+	assert candidate_pairs( trajectories , neighbours = l - 1 ) == [ ( i , j ) for i in range( l ) for j in range( i ) ]
+
+def test_few_neighbours_connect_all_the_trajectories( trajectories ) :
+
+	l = len( trajectories )
+	pairs = candidate_pairs( trajectories , neighbours = 1 )
+
+	assert all( [ j < i for i , j in pairs ] )
+	assert len( pairs ) < l * ( l - 1 ) // 2
+	assert components( pairs , l )[ 0 ] == 1
+
+def test_components( ) :
+
+	n , component = components( [ ( 1 , 0 ) , ( 3 , 2 ) ] , 5 )
+
+	assert n == 3
+	assert component[ 0 ] == component[ 1 ]
+	assert component[ 2 ] == component[ 3 ]
+	assert len( set( component ) ) == 3
+
+def test_neighbours_must_be_positive( trajectories ) :
+
+	with pytest.raises( AttributeError ) :
+
+		candidate_pairs( trajectories , neighbours = 0 )
+
+def precision( output_file ) :
+
+	#the best alignment precision, written by average_trajectories
+	with open( os.path.join( output_file , 'alignment_precision.txt' ) , 'r' ) as f :
+
+		return( min( [ float( line ) for line in f if line.strip() ] ) )
+
+def with_frames( average ) :
+
+	#the frames of an average, so that it can be aligned with align_pair
+	average.input_values( 'frames' , np.rint( average.t() / float( average.annotations()[ 'delta_t' ] ) ).astype( 'int64' ) )
+
+	return( average )
+
+def test_knn_average( trajectories , tmp_path , monkeypatch ) :
+
+	monkeypatch.chdir( tmp_path )
+	average = with_frames( average_trajectories( trajectories , output_file = 'all' , max_frame = 200 , keep = 'best' )[ 0 ] )
+	knn = with_frames( average_trajectories( trajectories , output_file = 'knn' , max_frame = 200 , keep = 'best' , pairing = 'knn' , neighbours = 3 )[ 0 ] )
+
+	#the averages can have other references, hence they are compared once aligned: the root mean square displacement
+	#between them is within the alignment precision of the average of all the pairs
+	assert np.sqrt( align_pair( average , knn )[ 'score' ] ) < precision( 'all' )
+	assert precision( 'knn' ) < 1.1 * precision( 'all' )
@@ -0,0 +1,94 @@
+#tests of the profiles of the stages of load_directory, average_trajectories and align (see StageTimer.save_profiles in
+#trajalign.log)
+
+import os
+import pstats
+import pytest
+from synthetic import endocytic_events , endocytic_trajectories , write_trajectories , write_average
+from trajalign.log import StageTimer
+from trajalign.average import load_directory , average_trajectories
+from trajalign.align import align
+
+directory_options = dict( comment_char = '%' , frames = 0 , coord = ( 1 , 2 ) , f = 3 , dt = 0.1045 , t_unit = 's' , coord_unit = 'pxl' )
+
+def profiled_function( ) :
+
+	return( sum( [ k ** 2 for k in range( 10000 ) ] ) )
+
+def profiles( directory ) :
+
+	return( sorted( [ f for f in os.listdir( directory ) if f.endswith( '.prof' ) ] ) )
+
+def test_stages_are_profiled( tmp_path ) :
+
+	timer = StageTimer( profile = True )
+	timer.stage( 'first' )
+	profiled_function()
+	timer.stage( 'second' )
+	timer.stop()
+
+	summary = timer.save_profiles( str( tmp_path / 'profile' ) )
+
+	assert profiles( str( tmp_path / 'profile' ) ) == [ 'first.prof' , 'second.prof' ]
+
+	#the function is profiled within its stage only
+	functions = [ f[ 2 ] for f in pstats.Stats( str( tmp_path / 'profile' / 'first.prof' ) ).stats.keys() ]
+	assert 'profiled_function' in functions
+	functions = [ f[ 2 ] for f in pstats.Stats( str( tmp_path / 'profile' / 'second.prof' ) ).stats.keys() ]
+	assert 'profiled_function' not in functions
+
+	with open( summary , 'r' ) as f :
+
+		assert 'profiled_function' in f.read()
+
+def test_stages_not_profiled_are_not_saved( tmp_path ) :
+
+	timer = StageTimer()
+	timer.stage( 'first' )
+	timer.stop()
+
+	with pytest.raises( AttributeError ) :
+
+		timer.save_profiles( str( tmp_path / 'profile' ) )
+
+def test_average_trajectories_profile( trajectory_directory , tmp_path , monkeypatch ) :
+
+	monkeypatch.chdir( tmp_path )
+
+	trajectories = load_directory( trajectory_directory , '.data' , profile = True , **directory_options )
+
+	assert profiles( 'load_directory_profile' ) == [ 'fill.prof' , 'load.prof' , 'normalisation.prof' ]
+
+	average_trajectories( trajectories , output_file = 'average' , max_frame = 200 , keep = 'best' )
+
+	assert not os.path.exists( os.path.join( 'average' , 'profile' ) )
+
+	average_trajectories( trajectories , output_file = 'average' , max_frame = 200 , keep = 'best' , profile = True )
+
+	assert profiles( os.path.join( 'average' , 'profile' ) ) == [ 'average.prof' , 'lie_down.prof' , 'pairwise.prof' , 'reduce.prof' , 'save.prof' ]
+	assert os.path.exists( os.path.join( 'average' , 'profile' , 'profile_summary.txt' ) )
+
+	#the profiles are saved in the directory that is given
+	average_trajectories( trajectories , output_file = 'average' , max_frame = 200 , keep = 'best' , profile = 'average_profile' )
+
+	assert len( profiles( 'average_profile' ) ) == 5
+
+	with pytest.raises( AttributeError ) :
+
+		average_trajectories( trajectories , output_file = 'average' , max_frame = 200 , profile = 1 )
+
+def test_align_profile( tmp_path , monkeypatch ) :
+
+	monkeypatch.chdir( tmp_path )
+	duration = ( -16.0 , 8.0 )
+	events = endocytic_events( 4 , seed = 3 , duration = duration )
+	write_trajectories( endocytic_trajectories( events , 'actin' , seed = 4 ) , 'two_colour' , '.actin.data' )
+	write_trajectories( endocytic_trajectories( events , 'coat' , seed = 5 ) , 'two_colour' , '.coat.data' )
+	write_average( 'actin_average.txt' , 'actin' , duration = duration )
+	write_average( 'coat_average.txt' , 'coat' , duration = duration )
+	ch1 = sorted( load_directory( 'two_colour' , '.actin.data$' , **directory_options ) , key = lambda t : t.annotations()[ 'file' ] )
+	ch2 = sorted( load_directory( 'two_colour' , '.coat.data$' , **directory_options ) , key = lambda t : t.annotations()[ 'file' ] )
+
+	align( 'actin_average.txt' , 'coat_average.txt' , ch1 , ch2 , unify_start_end_in_alignment = False , verbose = 0 , profile = True )
+
+	assert profiles( 'actin_average_aligned_profile' ) == [ 'MSD.prof' , 'cc.prof' , 'load.prof' , 'reduce.prof' , 'save.prof' , 'spline.prof' ]
@@ -0,0 +1,31 @@
+#tests of the selection of the reference trajectory of the average (see reference_selection in average_trajectories): 'fast'
+#must select the same reference, and compute the same average, as 'full'
+
+import os
+import numpy as np
+from trajalign.average import average_trajectories
+
+def precision( output_file ) :
+
+	#the alignment precisions of the references, written by average_trajectories
+	with open( os.path.join( output_file , 'alignment_precision.txt' ) , 'r' ) as f :
+
+		return( np.array( [ float( line ) for line in f if line.strip() ] ) )
+
+def test_fast_selects_the_reference_of_full( trajectories , tmp_path , monkeypatch ) :
+
+	monkeypatch.chdir( tmp_path )
+	full = average_trajectories( trajectories , output_file = 'full' , max_frame = 200 )
+	fast = average_trajectories( trajectories , output_file = 'fast' , max_frame = 200 , reference_selection = 'fast' )
+
+	for a , b in [ ( full[ 0 ] , fast[ 0 ] ) , ( full[ 1 ] , fast[ 1 ] ) ] :
+
+		assert a.annotations()[ 'reference_file' ] == b.annotations()[ 'reference_file' ]
+		assert a.attributes() == b.attributes()
+
+		for s in a.attributes() :
+
+			np.testing.assert_allclose( getattr( a , '_' + s ) , getattr( b , '_' + s ) , rtol = 1e-10 , atol = 1e-12 , err_msg = s )
+
+	#the estimated precisions differ from those of the averages only in the last digits
+	np.testing.assert_allclose( precision( 'fast' ) , precision( 'full' ) , rtol = 1e-6 )
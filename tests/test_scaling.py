@@ -0,0 +1,60 @@
+#tests of the scaling report of the benchmarks (see benchmarks/scaling.py): the fit of the complexity exponents and the
+#points of the grid, run in the current process or by the report itself
+
+import os
+import sys
+import json
+import subprocess
+import numpy as np
+import pytest
+from scaling import fit_exponents , run_point
+
+def test_fit_exponents( ) :
+
+	points = [ { 'N' : N , 'L' : L , 'wall_s' : 0.01 * N ** 2 * L ** 1.5 } for N in [ 5 , 10 , 20 ] for L in [ 30 , 60 ] ]
+	exponents = fit_exponents( points , 'wall_s' )
+
+	assert exponents[ 'N' ] == pytest.approx( 2 )
+	assert exponents[ 'L' ] == pytest.approx( 1.5 )
+
+	#the exponent of a variable with a single value, and the points without a value, are not fitted
+	points = [ dict( p , peak_memory_mb = None if p[ 'N' ] == 5 else p[ 'wall_s' ] ) for p in points if p[ 'L' ] == 30 ]
+	exponents = fit_exponents( points , 'peak_memory_mb' )
+
+	assert exponents[ 'N' ] == pytest.approx( 2 )
+	assert exponents[ 'L' ] is None
+	assert fit_exponents( points[ : 1 ] , 'wall_s' ) == { 'N' : None , 'L' : None }
+
+@pytest.mark.parametrize( 'function , stages' , [
+		( 'average_trajectories' , [ 'pairwise' , 'reduce' , 'average' , 'lie_down' , 'save' ] ) ,
+		( 'align' , [ 'load' , 'spline' , 'cc' , 'MSD' , 'reduce' , 'save' ] )
+		] )
+def test_run_point( tmp_path , monkeypatch , function , stages ) :
+
+	monkeypatch.chdir( tmp_path )
+
+	point = run_point( function , 4 , 40 , 'exhaustive' , 1 )
+
+	assert ( point[ 'function' ] , point[ 'N' ] , point[ 'L' ] ) == ( function , 4 , 40 )
+	assert point[ 'wall_s' ] > 0
+	assert list( point[ 'stages' ].keys() ) == stages
+
+def test_report( tmp_path ) :
+
+	benchmarks = os.path.join( os.path.dirname( os.path.dirname( os.path.abspath( __file__ ) ) ) , 'benchmarks' )
+	environment = dict( os.environ , PYTHONPATH = os.pathsep.join( [ benchmarks ] + sys.path ) )
+	command = [ sys.executable , os.path.join( benchmarks , 'scaling.py' ) , '--N' , '3' , '4' , '--L' , '30' , '--functions' , 'align' ]
+
+	subprocess.run( command , cwd = str( tmp_path ) , env = environment , capture_output = True , text = True , check = True )
+
+	#a second report is compared with the first
+	output = subprocess.run( command + [ '--output' , 'other.json' , '--compare' , 'scaling.json' ] , cwd = str( tmp_path ) , env = environment , capture_output = True , text = True , check = True )
+
+	with open( str( tmp_path / 'scaling.json' ) , 'r' ) as f :
+
+		report = json.load( f )
+
+	assert [ ( p[ 'N' ] , p[ 'L' ] ) for p in report[ 'points' ] ] == [ ( 3 , 30 ) , ( 4 , 30 ) ]
+	assert report[ 'exponents' ][ 'align' ][ 'wall_s' ][ 'L' ] is None
+	assert np.isfinite( report[ 'exponents' ][ 'align' ][ 'wall_s' ][ 'N' ] )
+	assert 'time / compared time' in output.stdout
@@ -0,0 +1,217 @@
+#tests of the file-based queue of shards of pairs of trajectories (see trajalign.shards) and of the sharded alignment of
+#the pairs (see sharded_transformations and run_shards in trajalign.average)
+
+import os
+import sys
+import time
+import socket
+import subprocess
+import numpy as np
+import pytest
+from trajalign.shards import ShardQueue , owner
+from trajalign.cache import traj_hash
+from trajalign.counters import WorkCounters
+from trajalign.average import compute_transformations , sharded_transformations , run_shards
+
+fimax_filter = [ -3/35 , 12/35 , 17/35 , 12/35 , -3/35 ]
+
+def alignment( k ) :
+
+	return( { 'lag' : k , 'angle' : 0.1 * k , 'rc' : np.array( [ k , 1.0 ] ) , 'lc' : np.array( [ 0.0 , - k ] ) , 'score' : 1.0 + k , 'pruned_lags' : 0 } )
+
+@pytest.fixture
+def queue( trajectories , tmp_path ) :
+
+	#a queue of the 6 pairs of 4 trajectories, in 3 shards of 2 pairs
+	q = ShardQueue( str( tmp_path / 'shards' ) , stale_after = 60 )
+	q.create( trajectories[ : 4 ] , [ ( i , j ) for i in range( 4 ) for j in range( i ) ] , { 'lag_scan' : 'exhaustive' } , shard_size = 2 )
+
+	return( q )
+
+def lock( queue , shard , text , age = 0 ) :
+
+	#writes the lock of the shard with the owner text, refreshed age seconds ago
+	file_name = queue.path( 'locks' , shard + '.lock' )
+
+	with open( file_name , 'w' ) as f :
+
+		f.write( text )
+
+	os.utime( file_name , ( time.time() - age , time.time() - age ) )
+
+	return( file_name )
+
+def dead_pid( ) :
+
+	p = subprocess.Popen( [ sys.executable , '-c' , 'pass' ] )
+	p.wait()
+
+	return( p.pid )
+
+def test_create( trajectories , queue ) :
+
+	assert queue.exists()
+	assert queue.shards() == [ '00000' , '00001' , '00002' ]
+	assert queue.pending() == queue.shards()
+	assert queue.manifest() == { 'lag_scan' : 'exhaustive' , 'shards' : 3 , 'trajectories' : 4 }
+	#the trajectories are written as they are
+	assert [ traj_hash( t ) for t in queue.trajectories() ] == [ traj_hash( t ) for t in trajectories[ : 4 ] ]
+	assert [ t.annotations()[ 'file' ] for t in queue.trajectories() ] == [ t.annotations()[ 'file' ] for t in trajectories[ : 4 ] ]
+
+def test_options_are_validated( trajectories , tmp_path ) :
+
+	with pytest.raises( AttributeError ) :
+
+		ShardQueue( str( tmp_path ) , stale_after = 0 )
+
+	with pytest.raises( AttributeError ) :
+
+		ShardQueue( str( tmp_path ) ).create( trajectories , [ ( 1 , 0 ) ] , {} , shard_size = 0 )
+
+def test_claim_and_complete( queue ) :
+
+	assert queue.claim() == ( '00000' , [ ( 1 , 0 ) , ( 2 , 0 ) ] )
+	assert queue.claim() == ( '00001' , [ ( 2 , 1 ) , ( 3 , 0 ) ] )
+
+	with open( queue.path( 'locks' , '00000.lock' ) , 'r' ) as f :
+
+		assert f.read() == queue.token
+
+	assert queue.token.startswith( owner() + ':' )
+
+	queue.complete( '00000' , { ( 1 , 0 ) : alignment( 1 ) , ( 2 , 0 ) : alignment( 2 ) } , WorkCounters( msd_evaluations = 5 ) )
+
+	assert queue.pending() == [ '00001' , '00002' ]
+	assert not os.path.exists( queue.path( 'locks' , '00000.lock' ) )
+	assert queue.claim() == ( '00002' , [ ( 3 , 1 ) , ( 3 , 2 ) ] )
+	#the shard 00001 is locked by this live process
+	assert queue.claim() is None
+
+	queue.complete( '00001' , { ( 2 , 1 ) : alignment( 3 ) , ( 3 , 0 ) : alignment( 4 ) } , WorkCounters( msd_evaluations = 7 ) )
+	queue.complete( '00002' , { ( 3 , 1 ) : alignment( 5 ) , ( 3 , 2 ) : alignment( 6 ) } , WorkCounters() )
+
+	assert queue.pending() == []
+	assert os.listdir( queue.path( 'locks' ) ) == []
+
+	alignments , counts = queue.results()
+
+	assert sorted( alignments.keys() ) == [ ( 1 , 0 ) , ( 2 , 0 ) , ( 2 , 1 ) , ( 3 , 0 ) , ( 3 , 1 ) , ( 3 , 2 ) ]
+
+	for k , pair in enumerate( [ ( 1 , 0 ) , ( 2 , 0 ) , ( 2 , 1 ) , ( 3 , 0 ) , ( 3 , 1 ) , ( 3 , 2 ) ] ) :
+
+		for a , value in alignment( k + 1 ).items() :
+
+			np.testing.assert_array_equal( alignments[ pair ][ a ] , value , err_msg = a )
+
+	assert counts[ 'msd_evaluations' ] == 12
+
+def test_stale_locks_are_reclaimed( queue ) :
+
+	#the worker of the lock of 00000 died on this host, and the worker of the lock of 00001 did not refresh it
+	lock( queue , '00000' , socket.gethostname() + ':' + str( dead_pid() ) + ':token' )
+	lock( queue , '00001' , 'another_host:1' , age = 120 )
+	#the worker of the lock of 00002 runs on another host, and refreshed its lock
+	lock( queue , '00002' , 'another_host:2' )
+
+	assert queue.claim()[ 0 ] == '00000'
+	assert queue.claim()[ 0 ] == '00001'
+	assert queue.claim() is None
+
+	with open( queue.path( 'locks' , '00002.lock' ) , 'r' ) as f :
+
+		assert f.read() == 'another_host:2'
+
+	#only the locks are left, and none of the stale locks renamed by reclaim
+	assert sorted( os.listdir( queue.path( 'locks' ) ) ) == [ '00000.lock' , '00001.lock' , '00002.lock' ]
+
+def test_reclaim_keeps_a_lock_that_changed( queue ) :
+
+	file_name = lock( queue , '00000' , 'another_host:1' , age = 120 )
+	state = queue.lock_state( file_name )
+	assert queue.stale( state )
+
+	#between the state and the reclaim, another worker reclaims the lock and claims the shard
+	lock( queue , '00000' , 'another_host:2' )
+
+	assert not queue.reclaim( file_name , state )
+	assert os.listdir( queue.path( 'locks' ) ) == [ '00000.lock' ]
+
+	with open( file_name , 'r' ) as f :
+
+		assert f.read() == 'another_host:2'
+
+	#the worker of the lock refreshes it, which is not stale anymore
+	lock( queue , '00000' , 'another_host:2' , age = 120 )
+	state = queue.lock_state( file_name )
+	os.utime( file_name )
+
+	assert not queue.reclaim( file_name , state )
+	assert not queue.stale( queue.lock_state( file_name ) )
+
+def test_sharded_transformations( trajectories , tmp_path ) :
+
+	trajectories = trajectories[ : 5 ]
+	directory = str( tmp_path / 'shards' )
+	transformations = compute_transformations( trajectories , False , fimax_filter )
+	sharded = sharded_transformations( trajectories , directory , False , fimax_filter , shard_size = 3 , poll = 0.1 )
+
+	for m in [ 'angles' , 'rcs' , 'lcs' , 'lags' , 'pairs' , 'scores' ] :
+
+		np.testing.assert_array_equal( sharded[ m ] , transformations[ m ] , err_msg = m )
+
+	assert sharded[ 'files' ] == transformations[ 'files' ]
+	#the queue is completed, and run_shards has nothing left to do
+	assert run_shards( directory ) == 0
+
+	#a queue of other trajectories is refused
+	with pytest.raises( AttributeError ) :
+
+		sharded_transformations( trajectories[ : 4 ] , directory , False , fimax_filter )
+
+def test_only_the_owner_releases_and_refreshes_a_lock( queue ) :
+
+	#another queue of the same process, e.g. a worker of another thread
+	other = ShardQueue( queue.directory , stale_after = 60 )
+
+	assert queue.claim()[ 0 ] == '00000'
+
+	file_name = lock( queue , '00000' , queue.token , age = 30 )
+	other.release( '00000' )
+
+	assert not other.heartbeat( '00000' )
+	assert queue.lock_state( file_name )[ 1 ] < time.time() - 20
+
+	#the lock became stale and was reclaimed by the other queue, which claimed the shard
+	os.utime( file_name , ( time.time() - 120 , time.time() - 120 ) )
+
+	assert other.claim()[ 0 ] == '00000'
+	assert not queue.heartbeat( '00000' )
+
+	queue.release( '00000' )
+
+	with open( file_name , 'r' ) as f :
+
+		assert f.read() == other.token
+
+	assert other.heartbeat( '00000' )
+
+	other.release( '00000' )
+
+	assert os.listdir( queue.path( 'locks' ) ) == []
+
+def test_heartbeats( queue ) :
+
+	assert queue.claim()[ 0 ] == '00000'
+	file_name = lock( queue , '00000' , queue.token , age = 30 )
+
+	#the lock is refreshed while the shard is aligned, and not after
+	with queue.heartbeats( '00000' , interval = 0.05 ) :
+
+		time.sleep( 0.3 )
+
+		assert queue.lock_state( file_name )[ 1 ] > time.time() - 1
+
+	os.utime( file_name , ( time.time() - 30 , time.time() - 30 ) )
+	time.sleep( 0.2 )
+
+	assert queue.lock_state( file_name )[ 1 ] < time.time() - 20
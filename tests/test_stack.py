@@ -0,0 +1,75 @@
+#tests of the dense ensemble of trajectories TrajStack (see trajalign.stack) and of the lazy transformed trajectories
+#TrajView (see trajalign.view) that are written in it
+
+import numpy as np
+import pytest
+from trajalign.stack import TrajStack
+from trajalign.view import TrajView
+from trajalign.traj import Traj
+
+def assert_traj_equal( a , b ) :
+
+	assert a.attributes() == b.attributes()
+
+	for s in a.attributes() :
+
+		np.testing.assert_allclose( getattr( a , '_' + s ) , getattr( b , '_' + s ) , rtol = 1e-12 , atol = 1e-12 , err_msg = s )
+
+def test_round_trip( trajectories ) :
+
+	stack = TrajStack( trajectories )
+
+	assert len( stack ) == len( trajectories )
+	np.testing.assert_array_equal( np.sum( stack.mask() , axis = 1 ) , [ len( t ) for t in trajectories ] )
+
+	for t , s in zip( trajectories , stack.trajs() ) :
+
+		assert_traj_equal( t , s )
+		assert s.annotations() == t.annotations()
+
+	#the time grid is shared by all the trajectories
+	for j in range( len( stack ) ) :
+
+		np.testing.assert_allclose( stack.t( j ) , stack.grid()[ stack.mask()[ j ] ] )
+
+def test_trajectories_with_other_attributes_are_refused( trajectories ) :
+
+	t = Traj( **trajectories[ 1 ].annotations() )
+	t.input_values( 't' , trajectories[ 1 ].t() )
+	t.input_values( 'coord' , trajectories[ 1 ].coord() )
+
+	with pytest.raises( AttributeError ) :
+
+		TrajStack( [ trajectories[ 0 ] , t ] )
+
+def test_views_are_written_as_their_materialised_trajectories( trajectories ) :
+
+	rng = np.random.default_rng( 0 )
+	views = []
+
+	for t in trajectories :
+
+		t.input_values( 'coord_err' , rng.uniform( 0.01 , 0.1 , size = t.coord().shape ) )
+		v = TrajView( t )
+		v.translate( - np.nanmean( t.coord() , axis = 1 ) )
+		v.rotate( rng.uniform( - np.pi , np.pi ) )
+		v.translate( rng.normal( size = 2 ) )
+		v.lag( int( rng.integers( - 10 , 10 ) ) )
+		views.append( v )
+
+	#a view is cropped and another one is padded beyond its end
+	views[ 0 ].start( views[ 0 ].start() + 5 * views[ 0 ].delta_t() )
+	views[ 1 ].end( views[ 1 ].end() + 4 * views[ 1 ].delta_t() )
+
+	copies = [ t.t().copy() for t in trajectories ]
+	stack = TrajStack( views )
+	materialised = TrajStack( [ v.traj() for v in views ] )
+
+	np.testing.assert_array_equal( np.sum( stack.mask() , axis = 1 )[ : 2 ] , [ len( trajectories[ 0 ] ) - 5 , len( trajectories[ 1 ] ) + 4 ] )
+	np.testing.assert_array_equal( stack.mask() , materialised.mask() )
+	np.testing.assert_allclose( stack.data() , materialised.data() , rtol = 1e-12 , atol = 1e-12 )
+
+	#the trajectories of the views are not modified
+	for t , c in zip( trajectories , copies ) :
+
+		np.testing.assert_array_equal( t.t() , c )
@@ -0,0 +1,97 @@
+#tests of the strategies of average_trajectories that do not align all the pairs of trajectories: 'progressive', along a
+#guide tree (see progressive_transformations), and 'iterative', to the evolving average (see align_to_average)
+
+import os
+import copy as cp
+import numpy as np
+from trajalign.average import average_trajectories , progressive_transformations , partial_average , merge_partial_averages , align_to_average
+
+def copies( t , n , seed = 0 ) :
+
+	#n copies of the trajectory t, rotated, translated and lagged at random
+	rng = np.random.default_rng( seed )
+	output = []
+	truth = { 'angles' : [] , 'lags' : [] }
+
+	for k in range( n ) :
+
+		c = cp.deepcopy( t )
+		angle = rng.uniform( - 3 , 3 )
+		lag = int( rng.integers( - 10 , 10 ) )
+		c.rotate( angle )
+		c.translate( rng.normal( 0 , 5 , 2 ) )
+		c.input_values( 'frames' , c.frames() + lag )
+		c.annotations( 'file' , 'copy_' + str( k ) )
+		output.append( c )
+		truth[ 'angles' ].append( angle )
+		truth[ 'lags' ].append( lag )
+
+	return( output , { k : np.array( v ) for k , v in truth.items() } )
+
+def assert_transformations_of_copies( synchronized , trajectories , truth ) :
+
+	#the angles and lags are those of the copies, up to a common rotation and lag
+	np.testing.assert_allclose( np.angle( np.exp( 1j * ( synchronized[ 'angles' ] - synchronized[ 'angles' ][ 0 ] - truth[ 'angles' ] + truth[ 'angles' ][ 0 ] ) ) ) , 0 , atol = 1e-10 )
+	np.testing.assert_array_equal( synchronized[ 'lags' ] - synchronized[ 'lags' ][ 0 ] , truth[ 'lags' ] - truth[ 'lags' ][ 0 ] )
+
+	#each copy aligned to the first one, as in compute_average, is the first one
+	for j in range( len( trajectories ) ) :
+
+		aligned = cp.deepcopy( trajectories[ j ] )
+		aligned.translate( - synchronized[ 'centres' ][ j ] )
+		aligned.rotate( synchronized[ 'angles' ][ 0 ] - synchronized[ 'angles' ][ j ] )
+		aligned.translate( synchronized[ 'centres' ][ 0 ] )
+
+		np.testing.assert_allclose( aligned.coord() , trajectories[ 0 ].coord() , atol = 1e-8 )
+
+def precision( output_file ) :
+
+	with open( os.path.join( output_file , 'alignment_precision.txt' ) , 'r' ) as f :
+
+		return( min( [ float( line ) for line in f if line.strip() ] ) )
+
+def test_merge_partial_averages( trajectories ) :
+
+	a = partial_average( trajectories[ 0 ] )
+	b = partial_average( trajectories[ 0 ] )
+	b.input_values( 'frames' , b.frames() + 3 )
+	merged = merge_partial_averages( merge_partial_averages( a , a ) , b )
+
+	np.testing.assert_array_equal( merged.frames() , np.arange( a.frames()[ 0 ] , a.frames()[ -1 ] + 4 ) )
+	np.testing.assert_array_equal( merged.n() , np.concatenate( [ [ 2 ] * 3 , [ 3 ] * ( len( a ) - 3 ) , [ 1 ] * 3 ] ) )
+	#the merged coordinates are the mean of those of the three trajectories in each frame
+	np.testing.assert_allclose( merged.coord()[ : , 3 : len( a ) ] , ( 2 * a.coord()[ : , 3 : ] + b.coord()[ : , : -3 ] ) / 3 )
+
+def test_progressive_transformations_of_copies( trajectories ) :
+
+	trajectory_list , truth = copies( trajectories[ 2 ] , 5 )
+	synchronized = progressive_transformations( trajectory_list , False , [ 1 ] )
+
+	assert synchronized[ 'alignments' ] == 4
+	assert_transformations_of_copies( synchronized , trajectory_list , truth )
+
+def test_progressive_average( trajectories , tmp_path , monkeypatch ) :
+
+	monkeypatch.chdir( tmp_path )
+	average_trajectories( trajectories , output_file = 'all_pairs' , max_frame = 200 , keep = 'best' )
+	average_trajectories( trajectories , output_file = 'progressive' , max_frame = 200 , keep = 'best' , strategy = 'progressive' )
+
+	assert precision( 'progressive' ) < 1.1 * precision( 'all_pairs' )
+
+def test_align_to_average_of_copies( trajectories ) :
+
+	#the first copy is the average, with its frames as times
+	trajectory_list , truth = copies( trajectories[ 2 ] , 5 , seed = 1 )
+	average = cp.deepcopy( trajectory_list[ 0 ] )
+	average.input_values( 't' , average.frames() * float( average.annotations()[ 'delta_t' ] ) )
+
+	assert_transformations_of_copies( align_to_average( average , trajectory_list , False , [ 1 ] ) , trajectory_list , truth )
+
+def test_iterative_average( trajectories , tmp_path , monkeypatch ) :
+
+	#the iterations start from the progressive average, and align the trajectories at least as precisely
+	monkeypatch.chdir( tmp_path )
+	average_trajectories( trajectories , output_file = 'progressive' , max_frame = 200 , keep = 'best' , strategy = 'progressive' )
+	average_trajectories( trajectories , output_file = 'iterative' , max_frame = 200 , keep = 'best' , strategy = 'iterative' )
+
+	assert precision( 'iterative' ) <= precision( 'progressive' )
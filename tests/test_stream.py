@@ -0,0 +1,103 @@
+#tests of the streaming statistics of trajectory_average (see trajalign.stream) against numpy
+
+import numpy as np
+import pytest
+from trajalign.stream import RunningStatistics , QuantileSketch , weighted_median
+from trajalign.average import nanMAD
+
+def samples( n , shape = ( 2 , 30 ) , nan_fraction = 0.2 , seed = 0 ) :
+
+	#n arrays of values with shape, and nan values at random
+	rng = np.random.default_rng( seed )
+	x = rng.normal( 3.0 , 2.0 , size = ( n , ) + shape )
+
+	if nan_fraction > 0 :
+
+		x[ rng.uniform( size = x.shape ) < nan_fraction ] = np.nan
+		#an element without values
+		x[ : , 0 , 0 ] = np.nan
+
+	return( x )
+
+def test_running_statistics( ) :
+
+	x = samples( 200 )
+	statistics = RunningStatistics( x.shape[ 1 : ] )
+
+	for a in x :
+
+		statistics.update( a )
+
+	with np.errstate( invalid = 'ignore' , divide = 'ignore' ) , pytest.warns( RuntimeWarning ) :
+
+		mean , std = np.nanmean( x , axis = 0 ) , np.nanstd( x , axis = 0 )
+
+	np.testing.assert_array_equal( statistics.count() , np.sum( ~ np.isnan( x ) , axis = 0 ) )
+	np.testing.assert_allclose( statistics.mean() , mean , rtol = 1e-12 )
+	np.testing.assert_allclose( statistics.std() , std , rtol = 1e-10 )
+
+def test_running_statistics_extend( ) :
+
+	x = samples( 50 )
+	statistics = RunningStatistics( x.shape[ 1 : ] )
+
+	for a in x[ : 25 ] :
+
+		statistics.update( a )
+
+	#the later arrays are longer by 2 elements at the beginning and 3 at the end
+	statistics.extend( 2 , 3 )
+	longer = np.pad( x , [ ( 0 , 0 ) , ( 0 , 0 ) , ( 2 , 3 ) ] , constant_values = np.nan )
+	longer[ 25 : , : , : 2 ] = 1.0
+
+	for a in longer[ 25 : ] :
+
+		statistics.update( a )
+
+	with np.errstate( invalid = 'ignore' , divide = 'ignore' ) , pytest.warns( RuntimeWarning ) :
+
+		mean = np.nanmean( longer , axis = 0 )
+
+	np.testing.assert_allclose( statistics.mean() , mean , rtol = 1e-12 )
+
+def test_quantile_sketch_is_exact_below_k( ) :
+
+	x = samples( 100 )
+	sketch = QuantileSketch( x.shape[ 1 : ] , k = 128 )
+
+	for a in x :
+
+		sketch.update( a )
+
+	with pytest.warns( RuntimeWarning ) :
+
+		median , mad = np.nanmedian( x , axis = 0 ) , nanMAD( x , axis = 0 )
+
+	np.testing.assert_array_equal( sketch.count() , np.sum( ~ np.isnan( x ) , axis = 0 ) )
+	np.testing.assert_allclose( sketch.median() , median , rtol = 1e-12 )
+	np.testing.assert_allclose( sketch.mad() , mad , rtol = 1e-12 )
+
+def test_quantile_sketch_rank_error( ) :
+
+	n , k = 5000 , 64
+	x = samples( n , shape = ( 1 , 40 ) , nan_fraction = 0 )
+	sketch = QuantileSketch( x.shape[ 1 : ] , k = k )
+
+	for a in x :
+
+		sketch.update( a )
+
+	assert np.all( sketch.count() == n )
+
+	#the rank of the approximate median is within the error bound log2( n / k ) / k of the count
+	rank = np.sum( x < sketch.median()[ None ] , axis = 0 ) / n
+	assert np.all( np.absolute( rank - 0.5 ) <= np.log2( n / k ) / k )
+
+def test_weighted_median( ) :
+
+	values = np.array( [ [ 1.0 ] , [ 2.0 ] , [ 3.0 ] , [ 10.0 ] , [ np.nan ] ] )
+
+	#each value counts as many times as its weight
+	assert weighted_median( values , np.array( [ [ 1 ] , [ 1 ] , [ 1 ] , [ 1 ] , [ 0 ] ] ) )[ 0 ] == 2.5
+	assert weighted_median( values , np.array( [ [ 1 ] , [ 1 ] , [ 4 ] , [ 1 ] , [ 0 ] ] ) )[ 0 ] == 3.0
+	assert np.isnan( weighted_median( values , np.zeros( ( 5 , 1 ) , dtype = 'int64' ) )[ 0 ] )
@@ -0,0 +1,115 @@
+#tests of the global synchronization of the pairwise transformations (see trajalign.synchronization)
+
+import os
+import numpy as np
+import pytest
+from trajalign.synchronization import synchronize_transformations , pair_weights , pair_overlaps
+from trajalign.average import load_directory , average_trajectories
+
+directory_options = dict( comment_char = '%' , frames = 0 , coord = ( 1 , 2 ) , f = 3 , dt = 0.1045 , t_unit = 's' , coord_unit = 'pxl' )
+example_directory = os.path.join( os.path.dirname( os.path.dirname( os.path.abspath( __file__ ) ) ) , 'example' , 'trajectory_average_example' , 'raw_trajectories' )
+
+def rotation( angle ) :
+
+	return( np.array( [ [ np.cos( angle ) , - np.sin( angle ) ] , [ np.sin( angle ) , np.cos( angle ) ] ] ) )
+
+def consistent_transformations( l , pairs , seed = 0 ) :
+
+	"""
+	consistent_transformations( l , pairs , seed = 0 ): the transformations of the pairs ( i , j ), j < i, of l trajectories
+	with angles phi, lags and translations s drawn at random (those of the first trajectory are 0), and the ground truth.
+	"""
+
+	rng = np.random.default_rng( seed )
+	phi = np.concatenate( [ [ 0 ] , rng.uniform( - np.pi , np.pi , l - 1 ) ] )
+	lags = np.concatenate( [ [ 0 ] , rng.integers( - 30 , 30 , l - 1 ) ] )
+	s = np.concatenate( [ [ [ 0 , 0 ] ] , rng.normal( 0 , 5 , ( l - 1 , 2 ) ) ] )
+
+	transformations = {
+			'angles' : np.subtract.outer( phi , phi ),
+			'lags' : np.subtract.outer( lags , lags ),
+			'rcs' : np.zeros( ( l , l , 2 ) ),
+			'lcs' : np.zeros( ( l , l , 2 ) ),
+			'pairs' : np.zeros( ( l , l ) , dtype = 'bool' ),
+			'scores' : np.zeros( ( l , l ) )
+			}
+
+	for i , j in pairs :
+
+		#the centre of mass of the reference i, drawn at random, and that of j, such that the two centres coincide once
+		#the trajectories are rotated by - phi and translated by s
+		c = rng.normal( 0 , 3 , 2 )
+		transformations[ 'rcs' ][ i , j ] = c
+		transformations[ 'lcs' ][ i , j ] = rotation( phi[ j ] ) @ ( s[ i ] - s[ j ] + rotation( - phi[ i ] ) @ c )
+		transformations[ 'pairs' ][ i , j ] = transformations[ 'pairs' ][ j , i ] = True
+		transformations[ 'scores' ][ i , j ] = transformations[ 'scores' ][ j , i ] = rng.uniform( 0.5 , 2 )
+
+	centres = - np.array( [ rotation( phi[ j ] ) @ s[ j ] for j in range( l ) ] )
+
+	return( transformations , { 'angles' : phi , 'lags' : lags , 'centres' : centres } )
+
+@pytest.mark.parametrize( 'weighted' , [ True , False ] )
+def test_consistent_transformations_are_recovered( weighted ) :
+
+	l = 12
+	rng = np.random.default_rng( 1 )
+	#a chain that connects all the trajectories, and some other pairs
+	pairs = set( [ ( i , i - 1 ) for i in range( 1 , l ) ] + [ ( i , j ) for i in range( l ) for j in range( i ) if rng.uniform() < 0.2 ] )
+	transformations , truth = consistent_transformations( l , sorted( pairs ) )
+
+	synchronized = synchronize_transformations( transformations , weighted = weighted )
+
+	np.testing.assert_allclose( np.angle( np.exp( 1j * ( synchronized[ 'angles' ] - truth[ 'angles' ] ) ) ) , 0 , atol = 1e-8 )
+	np.testing.assert_allclose( synchronized[ 'lags' ] , truth[ 'lags' ] , atol = 1e-8 )
+	np.testing.assert_allclose( synchronized[ 'centres' ] , truth[ 'centres' ] , atol = 1e-8 )
+
+def test_disconnected_pairs_are_refused( ) :
+
+	transformations , truth = consistent_transformations( 4 , [ ( 1 , 0 ) , ( 3 , 2 ) ] )
+
+	with pytest.raises( AttributeError ) :
+
+		synchronize_transformations( transformations )
+
+def test_pair_weights( ) :
+
+	transformations , truth = consistent_transformations( 3 , [ ( 1 , 0 ) , ( 2 , 0 ) , ( 2 , 1 ) ] )
+	transformations[ 'scores' ][ 1 , 0 ] = transformations[ 'scores' ][ 0 , 1 ] = 1e-6
+	overlaps = np.array( [ [ 0 , 5 , 50 ] , [ 5 , 0 , 50 ] , [ 50 , 50 , 0 ] ] )
+
+	weights = pair_weights( transformations , overlaps = overlaps )
+
+	#the pair with a tiny score, which overlaps over few time points, does not take most of the weight
+	assert weights[ 1 , 0 ] < weights[ 2 , 0 ]
+	np.testing.assert_array_equal( weights , weights.T )
+	np.testing.assert_array_equal( pair_weights( transformations , weighted = False ) , transformations[ 'pairs' ] )
+
+def test_pair_overlaps( trajectories ) :
+
+	transformations = { 'pairs' : ~ np.eye( 3 , dtype = 'bool' ) , 'lags' : np.array( [ [ 0 , 5 , -10 ] , [ -5 , 0 , -15 ] , [ 10 , 15 , 0 ] ] ) }
+	overlaps = pair_overlaps( trajectories[ : 3 ] , transformations )
+
+	np.testing.assert_array_equal( overlaps , overlaps.T )
+	assert overlaps[ 1 , 0 ] == len( set( trajectories[ 0 ].frames() ) & set( trajectories[ 1 ].frames() + 5 ) )
+
+def test_weighted_synchronization_of_the_example( tmp_path , monkeypatch ) :
+
+	#the weighted synchronization of the trajectories of the example of trajalign is not less precise than the mean of
+	#all the pairs, with all the pairs and with few neighbours
+	trajectories = sorted( load_directory( example_directory , '.data' , **directory_options ) , key = lambda t : t.annotations()[ 'file' ] )[ : 12 ]
+	monkeypatch.chdir( tmp_path )
+
+	for options in [ dict( pairing = 'all' ) , dict( pairing = 'knn' , neighbours = 3 ) ] :
+
+		precision = {}
+
+		for solver in [ 'mean' , 'weighted_synchronization' ] :
+
+			#the transformations are computed once, and read from the file by the second solver
+			average_trajectories( trajectories , output_file = solver , max_frame = 500 , keep = 'best' , reference_selection = 'fast' , lag_scan = 'branch_and_bound' , solver = solver , transformations_file = options[ 'pairing' ] + '.npz' , **options )
+
+			with open( os.path.join( solver , 'alignment_precision.txt' ) , 'r' ) as f :
+
+				precision[ solver ] = min( [ float( line ) for line in f if line.strip() ] )
+
+		assert precision[ 'weighted_synchronization' ] <= precision[ 'mean' ]
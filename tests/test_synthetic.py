@@ -0,0 +1,95 @@
+#tests of the generator of synthetic endocytic trajectories of the benchmarks (see benchmarks/synthetic.py): the trajectories
+#must depend on the seed only, follow their ground truth and be loaded by load_directory as they were drawn
+
+import numpy as np
+from synthetic import profiles , endocytic_profile , rotation , endocytic_events , endocytic_trajectories , write_trajectories , write_average
+from trajalign.average import load_directory
+from trajalign.traj import Traj
+
+directory_options = dict( comment_char = '%' , frames = 0 , coord = ( 1 , 2 ) , f = 3 , dt = 0.1045 , t_unit = 's' , coord_unit = 'pxl' )
+
+def assert_same_trajectories( a , b ) :
+
+	assert len( a ) == len( b )
+
+	for x , y in zip( a , b ) :
+
+		assert x.keys() == y.keys()
+
+		for k in x.keys() :
+
+			np.testing.assert_array_equal( x[ k ] , y[ k ] , err_msg = k )
+
+def test_same_seed_same_trajectories( ) :
+
+	a = endocytic_trajectories( endocytic_events( 5 , seed = 1 ) , seed = 2 )
+	b = endocytic_trajectories( endocytic_events( 5 , seed = 1 ) , seed = 2 )
+	c = endocytic_trajectories( endocytic_events( 5 , seed = 1 ) , seed = 3 )
+
+	assert_same_trajectories( a , b )
+	assert not np.array_equal( a[ 0 ][ 'x' ] , c[ 0 ][ 'x' ] )
+
+def test_events( ) :
+
+	dt , duration , truncation , max_lag = 0.1045 , ( -16.0 , 8.0 ) , 0.2 , 50
+	t = np.arange( duration[ 0 ] , duration[ 1 ] , dt )
+	events = endocytic_events( 20 , seed = 4 , dt = dt , duration = duration , truncation = truncation , max_lag = max_lag )
+
+	for e in events :
+
+		#the events are truncated by up to truncation of their length at each end, and their frames follow the lag
+		assert len( e[ 't' ] ) >= len( t ) - 2 * int( truncation * len( t ) )
+		assert 0 <= e[ 'lag' ] < max_lag
+		np.testing.assert_array_equal( e[ 'frames' ] - e[ 'lag' ] , np.round( ( e[ 't' ] - duration[ 0 ] ) / dt ).astype( int ) )
+
+	assert len( set( [ len( e[ 't' ] ) for e in events ] ) ) > 1
+
+def test_noiseless_trajectories_follow_the_ground_truth( ) :
+
+	events = endocytic_events( 4 , seed = 5 )
+	trajectories = endocytic_trajectories( events , 'actin' , seed = 6 , noise = 0 , f_noise = 0 , gaps = 0 )
+
+	for e , t in zip( events , trajectories ) :
+
+		x , y , f = endocytic_profile( e[ 't' ] , **profiles[ 'actin' ] )
+
+		#the event is moved to the movie by its rotation and translation, and its intensity is scaled by its brightness
+		np.testing.assert_allclose( rotation( - e[ 'angle' ] ) @ ( np.array( [ t[ 'x' ] , t[ 'y' ] ] ) - e[ 'translation' ][ : , None ] ) , [ x , y ] , atol = 1e-10 )
+		np.testing.assert_allclose( t[ 'f' ] / f , t[ 'f' ][ 0 ] / f[ 0 ] , rtol = 1e-10 )
+		np.testing.assert_array_equal( t[ 'frames' ] , e[ 'frames' ] )
+
+def test_gaps_keep_the_first_and_last_time_points( ) :
+
+	events = endocytic_events( 10 , seed = 7 )
+
+	for e , t in zip( events , endocytic_trajectories( events , seed = 8 , gaps = 0.5 ) ) :
+
+		assert len( t[ 'frames' ] ) < len( e[ 'frames' ] )
+		assert ( t[ 'frames' ][ 0 ] , t[ 'frames' ][ -1 ] ) == ( e[ 'frames' ][ 0 ] , e[ 'frames' ][ -1 ] )
+
+def test_written_trajectories_are_loaded_as_drawn( tmp_path ) :
+
+	trajectories = endocytic_trajectories( endocytic_events( 3 , seed = 9 ) , seed = 10 )
+	files = write_trajectories( trajectories , str( tmp_path / 'trajectories' ) )
+	loaded = sorted( load_directory( str( tmp_path / 'trajectories' ) , '.data' , **directory_options ) , key = lambda t : t.annotations()[ 'file' ] )
+
+	assert [ t.annotations()[ 'file' ] for t in loaded ] == files
+
+	for t , l in zip( trajectories , loaded ) :
+
+		#the gaps are filled by load_directory
+		kept = np.isin( l.frames() , t[ 'frames' ] )
+
+		np.testing.assert_array_equal( l.frames() , np.arange( t[ 'frames' ][ 0 ] , t[ 'frames' ][ -1 ] + 1 ) )
+		np.testing.assert_array_equal( l.coord()[ : , kept ] , [ t[ 'x' ] , t[ 'y' ] ] )
+		np.testing.assert_array_equal( l.f()[ kept ] , t[ 'f' ] )
+
+def test_written_average( tmp_path ) :
+
+	average = write_average( str( tmp_path / 'average.txt' ) , 'coat' , angle = 0.5 , translation = ( 1.0 , 2.0 ) )
+	loaded = Traj()
+	loaded.load( str( tmp_path / 'average.txt' ) )
+
+	np.testing.assert_allclose( loaded.t() , average.t() )
+	np.testing.assert_allclose( loaded.coord() , average.coord() )
+	assert loaded.annotations()[ 'delta_t' ] == str( average.annotations()[ 'delta_t' ] )
@@ -0,0 +1,88 @@
+#tests of the transformations computed by compute_transformations: their file (save_transformations and
+#load_transformations) and their incremental update (update_transformations)
+
+import numpy as np
+import pytest
+from trajalign.average import compute_transformations , update_transformations , save_transformations , load_transformations , trajectory_identity , average_trajectories
+from trajalign.counters import work
+
+fimax_filter = [ -3/35 , 12/35 , 17/35 , 12/35 , -3/35 ]
+matrices = [ 'angles' , 'rcs' , 'lcs' , 'lags' , 'pairs' , 'scores' ]
+
+def assert_transformations_equal( a , b ) :
+
+	for m in matrices :
+
+		np.testing.assert_array_equal( a[ m ] , b[ m ] , err_msg = m )
+
+	assert a[ 'files' ] == b[ 'files' ]
+	assert a[ 'options' ] == b[ 'options' ]
+
+def test_save_and_load( trajectories , tmp_path ) :
+
+	transformations = compute_transformations( trajectories[ : 4 ] , False , fimax_filter )
+	file_name = str( tmp_path / 'transformations.npz' )
+	save_transformations( transformations , file_name )
+
+	assert_transformations_equal( load_transformations( file_name ) , transformations )
+	#only the file is left, and not its temporary copy
+	assert [ f.name for f in tmp_path.iterdir() ] == [ 'transformations.npz' ]
+
+def test_options_are_stored( trajectories ) :
+
+	transformations = compute_transformations( trajectories[ : 3 ] , False , fimax_filter , lag_scan = 'multiresolution' , survivors = [ 4 , 4 ] )
+
+	assert transformations[ 'options' ] == { 'fimax' : False , 'fimax_filter' : fimax_filter , 'lag_scan' : 'multiresolution' , 'survivors' : [ 4 , 4 ] , 'pairing' : 'all' , 'neighbours' : None }
+
+def test_update_with_other_options_is_refused( trajectories ) :
+
+	old = compute_transformations( trajectories[ : 4 ] , False , fimax_filter )
+
+	for options in [ dict( lag_scan = 'fft' ) , dict( pairing = 'knn' , neighbours = 2 ) ] :
+
+		with pytest.raises( AttributeError ) :
+
+			update_transformations( old , trajectories , **options )
+
+def test_transformations_file_with_other_options_is_refused( trajectories , tmp_path , monkeypatch ) :
+
+	monkeypatch.chdir( tmp_path )
+	average_trajectories( trajectories[ : 3 ] , output_file = 'average' , max_frame = 200 , keep = 'best' , transformations_file = 'transformations.npz' )
+
+	assert load_transformations( 'transformations.npz' )[ 'options' ][ 'reference_selection' ] == 'full'
+
+	for options in [ dict( fimax = True ) , dict( lag_scan = 'multiresolution' ) , dict( reference_selection = 'fast' ) ] :
+
+		with pytest.raises( AttributeError ) :
+
+			average_trajectories( trajectories , output_file = 'average' , max_frame = 200 , keep = 'best' , transformations_file = 'transformations.npz' , **options )
+
+def test_update_aligns_only_the_new_pairs( trajectories ) :
+
+	old = compute_transformations( trajectories[ : 5 ] , False , fimax_filter )
+
+	#the trajectory 1 is removed and the trajectories 5 and 6 are added
+	new_list = [ trajectories[ k ] for k in [ 6 , 0 , 2 , 3 , 4 , 5 ] ]
+	start = work.copy()
+	ordered , updated = update_transformations( old , new_list )
+	done = work - start
+
+	#the trajectories that were aligned come first, in their order, followed by the new ones
+	assert [ trajectory_identity( t ) for t in ordered ] == [ trajectory_identity( trajectories[ k ] ) for k in [ 0 , 2 , 3 , 4 , 6 , 5 ] ]
+	assert updated[ 'files' ] == [ trajectory_identity( t ) for t in ordered ]
+	#the 6 pairs of the 4 kept trajectories are not aligned again
+	assert done[ 'pairs_skipped' ] == 6
+
+	assert_transformations_equal( updated , compute_transformations( ordered , False , fimax_filter ) )
+
+def test_update_with_the_same_trajectories_aligns_nothing( trajectories ) :
+
+	old = compute_transformations( trajectories[ : 4 ] , False , fimax_filter )
+
+	start = work.copy()
+	ordered , updated = update_transformations( old , trajectories[ : 4 ] )
+	done = work - start
+
+	assert done[ 'msd_evaluations' ] == 0
+	assert done[ 'pairs_skipped' ] == 6
+	assert_transformations_equal( updated , old )
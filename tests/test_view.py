@@ -0,0 +1,103 @@
+#tests of the lazy transformed trajectories TrajView (see trajalign.view): the trajectory of a view must be that of a copy
+#of the original trajectory transformed eagerly with the methods of Traj, and the original trajectory is never modified
+
+import copy as cp
+import numpy as np
+import pytest
+from trajalign.view import TrajView
+
+def assert_traj_equal( a , b ) :
+
+	assert a.attributes() == b.attributes()
+
+	for s in a.attributes() :
+
+		np.testing.assert_allclose( getattr( a , '_' + s ) , getattr( b , '_' + s ) , rtol = 1e-12 , atol = 1e-12 , err_msg = s )
+
+def with_errors( t , seed = 0 ) :
+
+	rng = np.random.default_rng( seed )
+	t.input_values( 'coord_err' , rng.uniform( 0.01 , 0.1 , size = t.coord().shape ) )
+
+	return( t )
+
+def test_view_is_the_transformed_copy( trajectories ) :
+
+	for k , t in enumerate( trajectories ) :
+
+		t = with_errors( t , seed = k )
+		original = cp.deepcopy( t )
+		centre = np.nanmean( t.coord() , axis = 1 )
+
+		v = TrajView( t )
+		v.translate( - centre )
+		v.rotate( 0.7 )
+		v.translate( ( 1.5 , - 2.0 ) )
+		v.rotate( - 0.2 )
+		v.lag( k - 3 )
+
+		c = cp.deepcopy( t )
+		c.translate( - centre )
+		c.rotate( 0.7 )
+		c.translate( ( 1.5 , - 2.0 ) )
+		c.rotate( - 0.2 )
+		c.lag( k - 3 )
+
+		#the start and end are read without materialising the view
+		assert v.start() == pytest.approx( c.start() , rel = 1e-12 )
+		assert v.end() == pytest.approx( c.end() , rel = 1e-12 )
+		assert len( v ) == len( c )
+
+		for copy in [ False , True ] :
+
+			assert_traj_equal( v.traj( copy = copy ) , c )
+
+		assert_traj_equal( t , original )
+		assert t.annotations() == original.annotations()
+
+def test_view_with_start_end_and_errors( trajectories ) :
+
+	t = with_errors( trajectories[ 2 ] )
+	original = cp.deepcopy( t )
+	delta_t = float( t.annotations()[ 'delta_t' ] )
+
+	v = TrajView( t )
+	v.translate( ( 0.3 , 0.1 ) , v_err = ( 0.01 , 0.02 ) )
+	v.rotate( 0.4 , angle_err = 0.05 )
+	v.start( t.start() + 3 * delta_t )
+	v.end( t.end() + 2 * delta_t )
+	v.lag( 4 )
+
+	c = cp.deepcopy( t )
+	c.translate( ( 0.3 , 0.1 ) , v_err = ( 0.01 , 0.02 ) )
+	c.rotate( 0.4 , angle_err = 0.05 )
+	c.start( t.start() + 3 * delta_t )
+	c.end( t.end() + 2 * delta_t )
+	c.lag( 4 )
+
+	assert len( v ) == len( c )
+	assert_traj_equal( v.traj() , c )
+	assert_traj_equal( t , original )
+
+def test_annotations_of_the_view( trajectories ) :
+
+	t = trajectories[ 0 ]
+	annotations = dict( t.annotations() )
+
+	v = TrajView( t )
+	v.annotations( 'comment' , 'aligned' )
+
+	assert v.traj().annotations()[ 'comment' ] == 'aligned'
+	assert t.annotations() == annotations
+
+def test_reset( trajectories ) :
+
+	t = trajectories[ 0 ]
+
+	v = TrajView( t )
+	v.translate( ( 1.0 , 1.0 ) )
+	v.rotate( 0.3 )
+	v.lag( 2 )
+	v.reset()
+
+	assert_traj_equal( v.traj() , t )
@@ -9,16 +9,21 @@
 # Year: 2017
 
 from trajalign.traj import Traj
+from trajalign.traj import time_overlap
 from trajalign.average import load_directory
 from trajalign.average import MSD
+from trajalign.average import MSD_pairs
 from trajalign.average import nanMAD 
 from trajalign.average import header
 from trajalign.average import unified_start , unified_end
+from trajalign.log import logger , set_verbosity , restores_verbosity , StageTimer
+from trajalign.counters import work
 from scipy.interpolate import UnivariateSpline #need to install py35-scikit-learn
 import numpy as np
 import copy as cp
 
-def align( path_target , path_reference , ch1 , ch2 , fimax1 = False , fimax2 = False , fimax_filter = [ -3/35 , 12/35 , 17/35 , 12/35 , -3/35 ] , unify_start_end_in_alignment = True , unify_start_end_in_output = False ):
+@restores_verbosity
+def align( path_target , path_reference , ch1 , ch2 , fimax1 = False , fimax2 = False , fimax_filter = [ -3/35 , 12/35 , 17/35 , 12/35 , -3/35 ] , unify_start_end_in_alignment = True , unify_start_end_in_output = False , verbose = 1 , timings_file = None , profile = False ):
 
 	"""
 	align( path_target , path_reference , ch1 , ch2 , ):
@@ -34,6 +39,16 @@ def align( path_target , path_reference , ch1 , ch2 , fimax1 = False , fimax2 =
 	setting fimax1 and fimax2 to True, respectively. If fimax1 and/or fimax2 are true, then fimax_filer
 	is used to compute where the peak of fluorescence intensity is. If no filter is desired, set 
 	fimax_filer = [ 1 ].
+	verbose chooses which messages are output (see set_verbosity in trajalign.log) during this call: 0 only the 
+	warnings, 1 (default) the progress, and 2 also the debug messages. The wall time and CPU time of each stage (load, 
+	spline, cc, MSD, reduce and save), and the peak memory of the process (see StageTimer in trajalign.log), are 
+	summarised in the annotation 'stage_timings' of the aligned trajectory and, if timings_file is given, written in 
+	it as JSON lines (default is None, no file is written). align returns the work done (MSD evaluations, deep copies 
+	of trajectories, extract calls, ..., see trajalign.counters), which is also written in timings_file and logged 
+	with verbose = 2.
+	profile chooses whether each stage is profiled with cProfile (see StageTimer.save_profiles in trajalign.log): 
+	False (default), True (the profile of each stage and a summary of the functions that took the longest time are 
+	saved in the directory named as the aligned trajectory file, ending with _profile) or the directory where they are saved.
 	"""
 
 	def spline( t1 , t2 ) :
@@ -140,15 +155,16 @@ def align( path_target , path_reference , ch1 , ch2 , fimax1 = False , fimax2 =
 		output = []
 		while t2.end() <= t1.end() :
 
-			#because of rounding errors I cannot use:
-			#f1 = [ t1.f( i ) for i in range( len( t1 ) ) if ( t1.t( i ) >= t2.start() ) & ( t1.t( i ) <= t2.end() ) ] 
-			#but the following, where instead of greater than... I use >< delta_t / 2
-			f1 = [ t1.f( i ) for i in range( len( t1 ) ) if ( t1.t( i ) - t2.start() > - delta_t / 2 ) & ( t1.t( i ) - t2.end() < delta_t / 2 ) ] 
+			#because of rounding errors I cannot select the times of t1 between t2.start() and t2.end(),
+			#but the times of t1 and t2 that are within delta_t / 2 (see time_overlap)
+			sel_t1 , sel_t2 = time_overlap( t1.t() , t2.t() , float( delta_t ) )
+			f1 = t1.f()[ sel_t1 ]
 			
 			if len( f1 ) != len( t2 ) : raise IndexError( "There is a problem with the selection of t1 fluorescence intensities and t2 length in the cross-correlation function cc. The lengths do not match.")
 
+			f12 = f1 * t2.f()
 			output.append( 
-					sum( [ f1[ i ] * t2.f( i ) for i in range( len( t2 ) ) if ( f1[ i ] == f1[ i ] ) & ( t2.f( i ) == t2.f( i ) ) ] )
+					sum( f12[ ( f1 == f1 ) & ( t2.f() == t2.f() ) ].tolist() )
 					)
 			
 			t2.lag( 1 )
@@ -190,8 +206,17 @@ def align( path_target , path_reference , ch1 , ch2 , fimax1 = False , fimax2 =
 	
 	#-------------------------END-OF-DEFINITIONS--------------------------------
 
+	if not isinstance( profile , ( bool , str ) ) :
+		raise AttributeError( 'align: profile must be True, False or the directory where the profiles are saved' )
+
+	set_verbosity( verbose )
+	timer = StageTimer( profile = profile , function = 'align' , target = path_target , reference = path_reference , trajectories = len( ch1 ) )
+	start_work = work.copy()
+
 	header() 
 
+	timer.stage( 'load' )
+
 	target_trajectory = Traj()
 	target_trajectory.load( path_target )
 
@@ -209,7 +234,7 @@ def align( path_target , path_reference , ch1 , ch2 , fimax1 = False , fimax2 =
 	
 	if ( fimax1 ) :
 
-		print( 'fimax1 = True ; the software uses only the information of the target trajectory up to its peak of fluorescence intensity.' )
+		logger.info( 'fimax1 = True ; the software uses only the information of the target trajectory up to its peak of fluorescence intensity.' )
 		
 		t1 = target_trajectory.fimax( fimax_filter )
 	
@@ -219,7 +244,7 @@ def align( path_target , path_reference , ch1 , ch2 , fimax1 = False , fimax2 =
 
 	if ( fimax2 ) :
 		
-		print( 'fimax2 = True ; the software uses only the information of the reference trajectory up to its peak of fluorescence intensity.' )
+		logger.info( 'fimax2 = True ; the software uses only the information of the reference trajectory up to its peak of fluorescence intensity.' )
 		
 		t2 = reference_trajectory.fimax( fimax_filter )
 	
@@ -227,7 +252,7 @@ def align( path_target , path_reference , ch1 , ch2 , fimax1 = False , fimax2 =
 
 		t2 = cp.deepcopy( reference_trajectory )
 
-	print( "unify_start_end_in_output : " + str( unify_start_end_in_output ) )
+	logger.info( "unify_start_end_in_output : " + str( unify_start_end_in_output ) )
 	
 	if unify_start_end_in_alignment :
 
@@ -238,11 +263,11 @@ def align( path_target , path_reference , ch1 , ch2 , fimax1 = False , fimax2 =
 			t1.start( unified_start( t1 ) )
 			t1.end( unified_end( t1 ) )
 
-			print( '\nunify_start_end_in_alignment = True ; the target average trajectory new start and end are ' + str( unify_start( t1 ) ) + ' ' + t1.annotations()[ 't_unit' ] + ' and ' + str( unify_end( t1 ) ) + ' ' + t1.annotations()[ 't_unit' ] + '.\n' )
+			logger.info( '\nunify_start_end_in_alignment = True ; the target average trajectory new start and end are ' + str( unify_start( t1 ) ) + ' ' + t1.annotations()[ 't_unit' ] + ' and ' + str( unify_end( t1 ) ) + ' ' + t1.annotations()[ 't_unit' ] + '.\n' )
 
 		else :
 
-			print( '\nunify_start_end_in_alignment = ' + str( unify_start_end_in_alignment ) + '. The target average trajectory had already unified start and end values.\n' )
+			logger.info( '\nunify_start_end_in_alignment = ' + str( unify_start_end_in_alignment ) + '. The target average trajectory had already unified start and end values.\n' )
 	
 		
 		if t2.annotations()[ 'unify_start_end' ] is 'False' :
@@ -250,29 +275,29 @@ def align( path_target , path_reference , ch1 , ch2 , fimax1 = False , fimax2 =
 			t2.start( unified_start( t2 ) )
 			t2.end( unified_end( t2 ) )
 
-			print( 'unify_start_end_in_alignment = True ; the reference average trajectory new start and end are ' + str( unify_start( t2 ) ) + ' ' + t2.annotations()[ 't_unit' ] + ' and ' + str( unify_end( t2 ) ) + ' ' + t2.annotations()[ 't_unit' ] + '.\n' )
+			logger.info( 'unify_start_end_in_alignment = True ; the reference average trajectory new start and end are ' + str( unify_start( t2 ) ) + ' ' + t2.annotations()[ 't_unit' ] + ' and ' + str( unify_end( t2 ) ) + ' ' + t2.annotations()[ 't_unit' ] + '.\n' )
 		
 		else :
 
-			print( 'unify_start_end_in_alignment = ' + str( unify_start_end_in_alignment ) + '. The reference average trajectory had already unified start and end values.\n' )
+			logger.info( 'unify_start_end_in_alignment = ' + str( unify_start_end_in_alignment ) + '. The reference average trajectory had already unified start and end values.\n' )
 	
 	else :	
 	
 		if t1.annotations()[ 'unify_start_end' ] is 'True' :
 
-			print( '\nunify_start_end_in_alignment = False but the target average trajectory was computed with unify_start_end = True. I cannot perform this operation. unify_start_end_in_alignment set to True for the target trajectory.\n' )
+			logger.info( '\nunify_start_end_in_alignment = False but the target average trajectory was computed with unify_start_end = True. I cannot perform this operation. unify_start_end_in_alignment set to True for the target trajectory.\n' )
 		
 		else :
 
-			print( '\nunify_start_end_in_alignment = ' + str( unify_start_end_in_alignment ) + '\n' )
+			logger.info( '\nunify_start_end_in_alignment = ' + str( unify_start_end_in_alignment ) + '\n' )
 	
 		if t2.annotations()[ 'unify_start_end' ] is 'True' :
 
-			print( 'unify_start_end_in_alignment = False but the reference average trajectory was computed with unify_start_end = True. I cannot perform this operation. unify_start_end_in_alignment set to True for the reference trajectory\n' )
+			logger.info( 'unify_start_end_in_alignment = False but the reference average trajectory was computed with unify_start_end = True. I cannot perform this operation. unify_start_end_in_alignment set to True for the reference trajectory\n' )
 		
 		else :
 
-			print( 'unify_start_end_in_alignment = ' + str( unify_start_end_in_alignment ) + '\n' )
+			logger.info( 'unify_start_end_in_alignment = ' + str( unify_start_end_in_alignment ) + '\n' )
 
 	t1_center_mass = t1.center_mass()
 	t1.translate( - t1_center_mass )
@@ -280,10 +305,10 @@ def align( path_target , path_reference , ch1 , ch2 , fimax1 = False , fimax2 =
 	t2_center_mass = t2.center_mass()
 	t2.translate( - t2_center_mass )
 	
-	print( "------------------DEBUG---------------------------")
-	print( "t1 cm = " + str( t1_center_mass ) + "; target_trajectory cm =" + str( target_trajectory.center_mass() ) )
-	print( "t2 cm = " + str( t2_center_mass ) + "; reference_trajectory cm =" + str( reference_trajectory.center_mass() ) )
-	print( "------------------DEBUG---------------------------")
+	logger.debug( "------------------DEBUG---------------------------")
+	logger.debug( "t1 cm = " + str( t1_center_mass ) + "; target_trajectory cm =" + str( target_trajectory.center_mass() ) )
+	logger.debug( "t2 cm = " + str( t2_center_mass ) + "; reference_trajectory cm =" + str( reference_trajectory.center_mass() ) )
+	logger.debug( "------------------DEBUG---------------------------")
 
 	l = len( ch1 )
 	
@@ -293,12 +318,17 @@ def align( path_target , path_reference , ch1 , ch2 , fimax1 = False , fimax2 =
 	#define the dictionary where the transformations will be stored
 	T = { 'angle' : [] , 'translation' : [] , 'lag' : [] }
 
-	#compute the transformations that align t1 and t2 together.
+	#the splines of each pair of trajectories are computed first, and then their rotations and 
+	#translations are all computed together by MSD_pairs.
+	pairs = []
+	lags = []
+
 	for i in range( l ) :
 
-		print( "Align " + path_target + " to " + ch1[ i ].annotations()[ 'file' ] + " and " + path_reference + " to " + ch2[ i ].annotations()[ 'file' ] ) 
+		logger.info( "Align " + path_target + " to " + ch1[ i ].annotations()[ 'file' ] + " and " + path_reference + " to " + ch2[ i ].annotations()[ 'file' ] ) 
 
 		#spline the trajectories, to reduce the noise
+		timer.stage( 'spline' )
 		if ( fimax1 ) :
 			spline_t1 , spline_ch1 = spline( t1 , ch1[ i ].fimax( fimax_filter ) )
 		else :
@@ -310,6 +340,7 @@ def align( path_target , path_reference , ch1 , ch2 , fimax1 = False , fimax2 =
 			spline_t2 , spline_ch2 = spline( t2 , ch2[ i ] )
 
 		#lag t1
+		timer.stage( 'cc' )
 		ch1_lag = cc( spline_t1 , spline_ch1 )
 		spline_ch1.input_values( 't' , spline_ch1.t() + ch1_lag )
 		
@@ -322,8 +353,22 @@ def align( path_target , path_reference , ch1 , ch2 , fimax1 = False , fimax2 =
 		unify_start_and_end( spline_t2 , spline_ch2 )
 	
 		#NOTE: the weight used in Picco et al., 2015 is slightly different. To use the same weight one should replace spline_t1.f() with spline_t1.f() / ( spline_t1.coord_err()[ 0 ] * spline_t1.coord_err()[ 1 ] )
-		align_ch1_to_t1 = MSD( spline_t1 , spline_ch1 ) 
-		align_ch2_to_t2 = MSD( spline_t2 , spline_ch2 )
+		pairs.append( ( spline_t1 , spline_ch1 ) )
+		pairs.append( ( spline_t2 , spline_ch2 ) )
+		lags.append( ( ch1_lag , ch2_lag ) )
+
+	#the pairs are grouped by their exact length (bucket = 1), so that the alignments are identical to those of MSD.
+	timer.stage( 'MSD' )
+	alignments = MSD_pairs( pairs , bucket = 1 )
+
+	timer.stage( 'reduce' )
+
+	#compute the transformations that align t1 and t2 together.
+	for i in range( l ) :
+
+		align_ch1_to_t1 = alignments[ 2 * i ]
+		align_ch2_to_t2 = alignments[ 2 * i + 1 ]
+		ch1_lag , ch2_lag = lags[ i ]
 
 		#The tranformation that aligns t1 to t2 will be the transformation that align ch2 to t2 and the 
 		#inverse of the transformation that aligns ch1 to t1.
@@ -377,22 +422,22 @@ def align( path_target , path_reference , ch1 , ch2 , fimax1 = False , fimax2 =
 		T[ 'lag' ].append( ch2_lag - ch1_lag )
 
 		#debug
-		print( "------------------DEBUG---------------------------")
+		logger.debug( "------------------DEBUG---------------------------")
 		tmp1 =  np.array( 
 				- R( T[ 'angle' ][ -1 ] ) @ align_ch1_to_t1[ 'rc' ]\
 						+ R( align_ch2_to_t2[ 'angle' ] ) @ ( align_ch1_to_t1[ 'lc' ] - align_ch2_to_t2[ 'lc' ] )\
 						+ align_ch2_to_t2[ 'rc' ] 
 				)[ 0 ] #the [ 0 ] is because otherwise it would be [[ x , y ]] instead of [ x , y ]
-		print( "T" )
-		print( T[ 'translation' ][ len(  T[ 'translation' ] ) - 1 ] )
-		print( "T tmp1" )
-		print( tmp1 )
-
-		print( "center mass t1: "+ str( t1_center_mass ) ) 
-		print( "target center mass : "+ str( target_trajectory.center_mass() ) )
-		print( "center mass t2: "+ str( t2_center_mass ) ) 
-		print( "ref center mass : "+ str( reference_trajectory.center_mass() ) )
-		print( "------------------DEBUG---------------------------")
+		logger.debug( "T" )
+		logger.debug( str( T[ 'translation' ][ len(  T[ 'translation' ] ) - 1 ] ) )
+		logger.debug( "T tmp1" )
+		logger.debug( str( tmp1 ) )
+
+		logger.debug( "center mass t1: "+ str( t1_center_mass ) ) 
+		logger.debug( "target center mass : "+ str( target_trajectory.center_mass() ) )
+		logger.debug( "center mass t2: "+ str( t2_center_mass ) ) 
+		logger.debug( "ref center mass : "+ str( reference_trajectory.center_mass() ) )
+		logger.debug( "------------------DEBUG---------------------------")
 	#compute the median and the standard error (SE) of the transformations.
 	#NOTE that if fimax2 is used, the center of mass of reference trajectory does not 
 	#correspond to the center of mass of the trajectory to which the target trajectory 
@@ -446,7 +491,23 @@ def align( path_target , path_reference , ch1 , ch2 , fimax1 = False , fimax2 =
 		target_trajectory.start( unified_start( target_trajectory ) )
 		target_trajectory.end( unified_end( target_trajectory ) )
 
+	timer.stage( 'save' )
+	target_trajectory.annotations( 'stage_timings' , timer.summary() )
 	target_trajectory.save( file_name )
 
-	print( 'The trajectory aligned to ' + path_reference + ' has been saved as ' + file_name )
+	logger.info( 'The trajectory aligned to ' + path_reference + ' has been saved as ' + file_name )
+
+	timer.stop()
+	statistics = work - start_work
+	logger.debug( 'work: ' + statistics.summary() )
+
+	if timings_file is not None :
+
+		timer.save( timings_file , statistics )
+
+	if profile :
+
+		timer.save_profiles( profile if isinstance( profile , str ) else path_target[ 0 : file_ending ] + '_aligned_profile' )
+
+	return( statistics )
 
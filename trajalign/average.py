@@ -9,21 +9,36 @@
 # Year: 2017
 
 import os 
+import json
+import time
 from trajalign.traj import Traj
+from trajalign.traj import frame_overlap
+from trajalign.cache import AlignmentCache
+from trajalign.checkpoint import Checkpoint , fingerprint
+from trajalign.shards import ShardQueue
+from trajalign.storage import save_transformations , load_transformations
+from trajalign.stack import TrajStack
+from trajalign.view import TrajView
+from trajalign.log import logger , set_verbosity , restores_verbosity , StageTimer
+from trajalign.counters import work
+from trajalign.stream import RunningStatistics , QuantileSketch
+from trajalign.pairing import candidate_pairs , pairing_report , components , guide_tree
+from trajalign.synchronization import tree_potentials , synchronize_transformations , pair_overlaps
+from trajalign.orientation import lie_down , line_fitters
 import copy as cp
 import numpy as np
 import warnings as wr
 
-from sklearn import linear_model
+from concurrent.futures import ProcessPoolExecutor , as_completed
 
 def header( version = 1.90 , year = 2020 , printit = True ) :
 
 	if printit :
 
-		print('|-----------------------------------------------------|')
-		print('| Trajalign version ' + str( version ) +' Copyright ' + str( year ) + ' Andrea Picco. |')
-		print('|   Url: www.apicco.github.io/trajectory_alignment/   |')
-		print('|-----------------------------------------------------|')
+		logger.info('|-----------------------------------------------------|')
+		logger.info('| Trajalign version ' + str( version ) +' Copyright ' + str( year ) + ' Andrea Picco. |')
+		logger.info('|   Url: www.apicco.github.io/trajectory_alignment/   |')
+		logger.info('|-----------------------------------------------------|')
 	
 	elif not printit :
 
@@ -34,10 +49,24 @@ def header( version = 1.90 , year = 2020 , printit = True ) :
 		raise AttributeError('Please, if you want to print the header (printit = True) or if you want to return the verion number only (printit = False).')
 
 
-def load_directory(path , pattern = '.txt' , sep = None , comment_char = '#' , dt = None , t_unit = '' , coord_unit = '' , intensity_normalisation = 'None' , **attrs ):
+def list_directory( path , pattern = '.txt' ) :
 
 	"""
-	load_directory(path , pattern = '.txt' , sep = None , comment_char = '#' , dt = None , t_unit = '' , coord_unit = '' , intensity_normalisation = 'None' , **attrs ):
+	list_directory( path , pattern = '.txt' ): lists all the files in 'path' that have 'pattern'. If pattern ends with '$' 
+	only the files whose name ends with pattern are listed.
+	"""
+
+	if ( pattern[ len( pattern ) - 1 ] == '$' ) : 
+		files = [ f for f in os.listdir(path) if f.endswith( pattern[ : - 1 ] ) ] #list all the files in path that have pattern
+	else : 
+		files = [ f for f in os.listdir(path) if pattern in f] #list all the files in path that have pattern
+
+	return( files )
+
+def load_directory(path , pattern = '.txt' , sep = None , comment_char = '#' , dt = None , t_unit = '' , coord_unit = '' , intensity_normalisation = 'None' , profile = False , **attrs ):
+
+	"""
+	load_directory(path , pattern = '.txt' , sep = None , comment_char = '#' , dt = None , t_unit = '' , coord_unit = '' , intensity_normalisation = 'None' , profile = False , **attrs ):
 	loads all the trajectories listed in 'path', which have the same 'pattern'.
 	columns are separated by 'sep' (default is None: a indefinite number of 
 	white spaces). Comments in the trajectory start with 'comment_char'.
@@ -50,6 +79,10 @@ def load_directory(path , pattern = '.txt' , sep = None , comment_char = '#' , d
 	If the time interval is added (and 't' is not called in the **attrs) 
 	then the time column 't' is added, and the 't_unit' can be set.
 	If 'coord' is called then the unit must be added.
+
+	profile chooses whether the stages of the loading (load, normalisation and fill) are profiled with cProfile (see 
+	StageTimer.save_profiles in trajalign.log): False (default), True (the profiles are saved in the directory 
+	load_directory_profile of the working directory) or the directory where the profiles are saved.
 	"""
 
 	if ('coord' in attrs.keys()) & (len(coord_unit) == 0): 
@@ -61,15 +94,17 @@ def load_directory(path , pattern = '.txt' , sep = None , comment_char = '#' , d
 	if (dt != None) & ('t' in attrs.keys()):
 		raise AttributeError('Time is already loaded by the trajectories, you cannot also compute it from frames. Please, either remove the dt option or do not load the \'t\' column from the trajectories')
 
+	if not isinstance( profile , ( bool , str ) ) :
+		raise AttributeError( 'load_directory: profile must be True, False or the directory where the profiles are saved' )
+
 	trajectories = [] #the list of trajectories
-	if ( pattern[ len( pattern ) - 1 ] == '$' ) : 
-		files = [ f for f in os.listdir(path) if f.endswith( pattern[ : - 1 ] ) ] #list all the files in path that have pattern
-	else : 
-		files = [ f for f in os.listdir(path) if pattern in f] #list all the files in path that have pattern
+	files = list_directory( path , pattern )
+	timer = StageTimer( profile = profile , function = 'load_directory' , path = path )
 
 	for file in files:
 
-		print( file ) 
+		logger.info( file ) 
+		timer.stage( 'load' )
 		trajectory = Traj(experiment = path, path = os.getcwd()+'/'+path, file = file)
 		trajectory.load(path+'/'+file,sep = sep, comment_char = comment_char, **attrs)
 		if (dt != None):
@@ -78,6 +113,7 @@ def load_directory(path , pattern = '.txt' , sep = None , comment_char = '#' , d
 
 			trajectory.annotations('coord_unit',coord_unit)
 
+		timer.stage( 'normalisation' )
 		if intensity_normalisation == 'Integral' :
 			
 			trajectory.scale_f()
@@ -91,10 +127,17 @@ def load_directory(path , pattern = '.txt' , sep = None , comment_char = '#' , d
 			raise AttributeError( "load_directory: Please, choose a value for the variable intensity_normalisation between 'None' (no normalisation, default), 'Integral' (normalise over the integral of the fluorescence intensity), or 'Absolute' (normalise the fluorescence intensity values between 0 and 1)" )
 
 		trajectory.annotations( 'intensity_normalisation' , intensity_normalisation )
+		timer.stage( 'fill' )
 		trajectory.fill()
 		trajectories.append(trajectory)
+
+	timer.stop()
+
+	if profile :
+
+		timer.save_profiles( profile if isinstance( profile , str ) else 'load_directory_profile' )
 	
-	print( "\n >> load_directory: The 'intensity_normalisation' applied to the trajectories is '" + intensity_normalisation + "' <<\n" )
+	logger.info( "\n >> load_directory: The 'intensity_normalisation' applied to the trajectories is '" + intensity_normalisation + "' <<\n" )
 
 	return trajectories 
 
@@ -105,61 +148,78 @@ def MSD(input_t1 , input_t2):
 	Adapted from Horn, 1987, to the 2D case with means weighted on the product of the fluorescence intensities.
 	"""
 
-	msdt1 = cp.deepcopy(input_t1)
-	msdt2 = cp.deepcopy(input_t2)
+	if (len(input_t1.f()) == 0) | (len(input_t2.f()) == 0): 
+		raise AttributeError('MSD(msdt1,msdt2) requires that trajectories msdt1 and msdt2 have values for the fluorescence intensity')
+
+	alignment = MSD_batch( [ input_t1.coord() ] , [ input_t1.f() ] , [ input_t2.coord() ] , [ input_t2.f() ] )
 
+	return({ 
+		'angle' : alignment[ 'angle' ][ 0 ],
+		'rc' : alignment[ 'rc' ][ 0 ],
+		'lc' : alignment[ 'lc' ][ 0 ],
+		'score' : alignment[ 'score' ][ 0 ]
+		})
 
-	if (len(msdt1.f()) == 0) | (len(msdt2.f()) == 0): 
-		raise AttributeError('MSD(msdt1,msdt2) requires that trajectories msdt1 and msdt2 have values for the fluorescence intensity')
+def MSD_batch( coord1 , f1 , coord2 , f2 ) :
 
-	#the following code follow Horn's (1987) nomenclature. msdt1 is what is 
+	"""
+	MSD_batch( coord1 , f1 , coord2 , f2 ): finds, for many pairs of trajectories at once, the rototranslations that minimise the
+	mean square displacement between the trajectories 1 and 2 of each pair and returns the rototranslations of the trajectories 2 (see MSD).
+	coord1 and coord2 are arrays of shape ( pairs , 2 , time points ) with the coordinates of the trajectories and f1 and f2 are arrays of
+	shape ( pairs , time points ) with their fluorescence intensities. Pairs shorter than the others are padded with nan, which are
+	ignored as in MSD. The output is a dictionary with the arrays 'angle' and 'score', of shape ( pairs ), and 'rc' and 'lc', of shape ( pairs , 2 ).
+	"""
+
+	coord1 = np.array( coord1 , dtype = 'float64' )
+	coord2 = np.array( coord2 , dtype = 'float64' )
+	f1 = np.array( f1 , dtype = 'float64' )
+	f2 = np.array( f2 , dtype = 'float64' )
+
+	#the copies of the inputs, the weights and the translated and rotated coordinates
+	work.add( 'msd_evaluations' , coord1.shape[ 0 ] )
+	work.add( 'pairwise_bytes' , 5 * coord1.nbytes + 3 * f1.nbytes )
+
+	#the following code follow Horn's (1987) nomenclature. The trajectories 1 are what is 
 	#called in the paper as 'right coordinates'. 
-	#msdt2 is what is called as 'left coordinates'
-	
+	#The trajectories 2 are what is called as 'left coordinates'
+
 	with wr.catch_warnings():
 		# if both f() are 0 or if their product is 0,  a warning about invalid true divide is output. Here we suppress such warnings.
 		wr.simplefilter("ignore", category=RuntimeWarning)
-		w = msdt1.f() * msdt2.f() / np.nansum( msdt1.f() * msdt2.f() )
+		w = f1 * f2 / np.nansum( f1 * f2 , axis = 1 , keepdims = True )
 	#computed the center of mass, weigthed on the fluorescence intensity product
-	rc = np.array([ np.nansum( w * msdt1.coord()[0] ), np.nansum( w * msdt1.coord()[1] )])
-	lc = np.array([ np.nansum( w * msdt2.coord()[0] ), np.nansum( w * msdt2.coord()[1] )])
+	rc = np.transpose([ np.nansum( w * coord1[ : , 0 ] , axis = 1 ), np.nansum( w * coord1[ : , 1 ] , axis = 1 ) ])
+	lc = np.transpose([ np.nansum( w * coord2[ : , 0 ] , axis = 1 ), np.nansum( w * coord2[ : , 1 ] , axis = 1 ) ])
 
 	#translate the trajecotries to their weigthed center of mass
-	msdt1.translate( -1 * rc )
-	msdt2.translate( -1 * lc )
+	coord1 = coord1 + ( -1 * rc )[ : , : , None ]
+	coord2 = coord2 + ( -1 * lc )[ : , : , None ]
 
-	Sxx = np.nansum( w * msdt2.coord()[0] * msdt1.coord()[0] )
-	Sxy = np.nansum( w * msdt2.coord()[0] * msdt1.coord()[1] )
-	Syx = np.nansum( w * msdt2.coord()[1] * msdt1.coord()[0] )
-	Syy = np.nansum( w * msdt2.coord()[1] * msdt1.coord()[1] )
+	Sxx = np.nansum( w * coord2[ : , 0 ] * coord1[ : , 0 ] , axis = 1 )
+	Sxy = np.nansum( w * coord2[ : , 0 ] * coord1[ : , 1 ] , axis = 1 )
+	Syx = np.nansum( w * coord2[ : , 1 ] * coord1[ : , 0 ] , axis = 1 )
+	Syy = np.nansum( w * coord2[ : , 1 ] * coord1[ : , 1 ] , axis = 1 )
 
 	A = ( Syx - Sxy )
 	B = ( Sxx + Syy )
 
-	if ( ( A == 0 ) & ( B == 0 ) ):
-		theta = np.nan
-	else : 
-		theta = np.arctan2( - A , B )
-#		M = - A / B
-#
-#		theta1 = np.arctan( M )
-#		theta2 = theta1 + np.pi
-#		
-#		if B * np.cos(theta1) >= A * np.sin(theta1) :
-#			theta = theta1
-#		else:
-#			theta = theta2
-
-	msdt2.rotate( theta )
-
-	#the 'score' is the mean square displacement weighted on the cross correlation of the fluorescence intensities
-	score = np.nansum( w * ( msdt1.coord()[0] - msdt2.coord()[0] )**2 + w * ( msdt1.coord()[1] - msdt2.coord()[1] )**2 )
+	theta = np.arctan2( - A , B )
+	theta[ ( A == 0 ) & ( B == 0 ) ] = np.nan
+
+	#rotate the trajectories 2 
+	R = np.array( [[ np.cos( theta ) , - np.sin( theta ) ] , [ np.sin( theta ) , np.cos( theta ) ]] )
+	coord2 = np.matmul( np.transpose( R , axes = ( 2 , 0 , 1 ) ) , coord2 )
+
+	with wr.catch_warnings():
+		# pairs with no overlapping data points have only nan; their score is set to infinite below.
+		wr.simplefilter("ignore", category=RuntimeWarning)
+		#the 'score' is the mean square displacement weighted on the cross correlation of the fluorescence intensities
+		score = np.nansum( w * ( coord1[ : , 0 ] - coord2[ : , 0 ] )**2 + w * ( coord1[ : , 1 ] - coord2[ : , 1 ] )**2 , axis = 1 )
 	
 	#when the min_w is small and the software is sampling the start or end of trajectories,
 	#which often have a large number of nan, then theta can become nan as M is the 
 	#fraction of 0.0/0.0. If that happens then the score is set to infinite.
-	if theta != theta: 
-		score = np.inf
+	score[ theta != theta ] = np.inf
 
 	return({ 
 		'angle' : theta,
@@ -168,6 +228,156 @@ def MSD(input_t1 , input_t2):
 		'score' : score
 		})
 
+def MSD_pairs( pairs , bucket = 16 ) :
+
+	"""
+	MSD_pairs( pairs , bucket = 16 ): aligns each pair of trajectories ( t1 , t2 ) in the list 'pairs' as MSD( t1 , t2 ), and returns 
+	the list of the rototranslations of t2. The pairs are grouped by length in buckets spanning 'bucket' time points, and the pairs 
+	of each bucket are padded with nan and aligned together with MSD_batch.
+	"""
+
+	output = [ None ] * len( pairs )
+
+	buckets = {}
+	for i in range( len( pairs ) ) :
+
+		if ( len( pairs[ i ][ 0 ].f() ) == 0 ) | ( len( pairs[ i ][ 1 ].f() ) == 0 ) :
+			raise AttributeError('MSD_pairs(pairs) requires that all the trajectories have values for the fluorescence intensity')
+		if len( pairs[ i ][ 0 ] ) != len( pairs[ i ][ 1 ] ) :
+			raise IndexError('MSD_pairs(pairs) requires that the two trajectories of each pair have the same length')
+
+		key = int( ( len( pairs[ i ][ 0 ] ) - 1 ) // bucket )
+		if key in buckets.keys() :
+			buckets[ key ].append( i )
+		else :
+			buckets[ key ] = [ i ]
+
+	for key in buckets.keys() :
+
+		l = max( [ len( pairs[ i ][ 0 ] ) for i in buckets[ key ] ] )
+
+		coord1 = np.full( ( len( buckets[ key ] ) , 2 , l ) , np.nan )
+		coord2 = np.full( ( len( buckets[ key ] ) , 2 , l ) , np.nan )
+		f1 = np.full( ( len( buckets[ key ] ) , l ) , np.nan )
+		f2 = np.full( ( len( buckets[ key ] ) , l ) , np.nan )
+		work.add( 'pairwise_bytes' , coord1.nbytes + coord2.nbytes + f1.nbytes + f2.nbytes )
+
+		for j in range( len( buckets[ key ] ) ) :
+
+			t1 , t2 = pairs[ buckets[ key ][ j ] ]
+			coord1[ j , : , : len( t1 ) ] = t1.coord()
+			coord2[ j , : , : len( t2 ) ] = t2.coord()
+			f1[ j , : len( t1 ) ] = t1.f()
+			f2[ j , : len( t2 ) ] = t2.f()
+
+		alignments = MSD_batch( coord1 , f1 , coord2 , f2 )
+
+		for j in range( len( buckets[ key ] ) ) :
+
+			output[ buckets[ key ][ j ] ] = {
+					'angle' : alignments[ 'angle' ][ j ],
+					'rc' : alignments[ 'rc' ][ j ],
+					'lc' : alignments[ 'lc' ][ j ],
+					'score' : alignments[ 'score' ][ j ]
+					}
+
+	return( output )
+
+def MSD_lags( input_t1 , input_t2 ) :
+
+	"""
+	MSD_lags( input_t1 , input_t2 ): finds, for every lag at which the shortest of the two trajectories lies entirely within
+	the longest, the rototranslation that minimises the mean square displacement between the trajectories t1 and t2 and returns
+	the rototranslations of t2. The i-th element of the output arrays corresponds to MSD( input_t1 , input_t2 ) computed when the
+	first time point of the shortest trajectory is lagged to the i-th time point of the longest.
+	All the weighted sums of Horn's solution (see MSD) are cross-correlations between the two trajectories, which are computed
+	for all the lags at once with FFTs. Time points where either the fluorescence intensity or one of the coordinates is nan are masked.
+	"""
+
+	if (len(input_t1.f()) == 0) | (len(input_t2.f()) == 0):
+		raise AttributeError('MSD_lags(input_t1,input_t2) requires that trajectories input_t1 and input_t2 have values for the fluorescence intensity')
+
+	def channels( coord , f ) :
+
+		#mask the time points with nan and center the coordinates on their mean, so that the
+		#correlations are computed on small numbers and are less affected by rounding errors.
+		mask = np.isfinite( f ) & np.isfinite( coord[ 0 ] ) & np.isfinite( coord[ 1 ] )
+		if mask.any() :
+			c = np.array( [ np.mean( coord[ 0 ][ mask ] ) , np.mean( coord[ 1 ][ mask ] ) ] )
+		else :
+			c = np.array( [ 0.0 , 0.0 ] )
+
+		a = np.where( mask , f , 0 )
+		x = np.where( mask , coord[ 0 ] - c[ 0 ] , 0 )
+		y = np.where( mask , coord[ 1 ] - c[ 1 ] , 0 )
+
+		return( np.array( [ a , a * x , a * y , a * ( x ** 2 + y ** 2 ) , mask.astype( 'float64' ) ] ) , c )
+
+	ch1 , c1 = channels( np.array( input_t1.coord() , dtype = 'float64' ) , np.array( input_t1.f() , dtype = 'float64' ) )
+	ch2 , c2 = channels( np.array( input_t2.coord() , dtype = 'float64' ) , np.array( input_t2.f() , dtype = 'float64' ) )
+
+	#the pairs of channels ( t1 , t2 ) whose cross-correlations are the sums in Horn's solution:
+	#W = sum( f1 * f2 ), the sums of f1 * f2 * x1, f1 * f2 * x2, the Sxx, Sxy, Syx, Syy and the
+	#sums of the square distances from the centers of mass, as well as the number of overlapping time points.
+	pairs = [ ( 0 , 0 ) , ( 1 , 0 ) , ( 2 , 0 ) , ( 0 , 1 ) , ( 0 , 2 ) , ( 1 , 1 ) , ( 2 , 1 ) , ( 1 , 2 ) , ( 2 , 2 ) , ( 3 , 0 ) , ( 0 , 3 ) , ( 4 , 4 ) ]
+
+	l1 = ch1.shape[ 1 ]
+	l2 = ch2.shape[ 1 ]
+	n = int( 2 ** np.ceil( np.log2( l1 + l2 - 1 ) ) )
+
+	F1 = np.fft.rfft( ch1 , n , axis = 1 )
+	F2 = np.fft.rfft( ch2 , n , axis = 1 )
+
+	#the correlation c[ i ] = sum_j long[ i + j ] * short[ j ] is the inverse transform of F_long * conj( F_short )
+	if l1 >= l2 :
+		products = np.array( [ F1[ i ] * np.conj( F2[ j ] ) for i , j in pairs ] )
+	else :
+		products = np.array( [ F2[ j ] * np.conj( F1[ i ] ) for i , j in pairs ] )
+
+	W , R_x , R_y , L_x , L_y , Sxx , Sxy , Syx , Syy , P1 , P2 , N = np.fft.irfft( products , n , axis = 1 )[ : , : abs( l1 - l2 ) + 1 ]
+
+	#one rototranslation per lag, computed from the channels, their spectra and the correlations
+	work.add( 'msd_evaluations' , abs( l1 - l2 ) + 1 )
+	work.add( 'lags_scanned' , abs( l1 - l2 ) + 1 )
+	work.add( 'pairwise_bytes' , ch1.nbytes + ch2.nbytes + F1.nbytes + F2.nbytes + products.nbytes + len( pairs ) * n * 8 )
+
+	with wr.catch_warnings():
+		# lags with no overlapping data points have W = 0. Here we suppress the warnings of the divisions.
+		wr.simplefilter("ignore", category=RuntimeWarning)
+
+		#with a single overlapping data point the rotation is not defined, as in MSD. The W threshold
+		#accounts for the rounding errors of the FFTs when intensities do not overlap.
+		valid = ( np.rint( N ) >= 2 ) & ( W > 1e-12 * np.max( np.abs( W ) ) )
+
+		#center of masses weighted on the fluorescence intensity product, in the centered coordinates
+		r_x = R_x / W
+		r_y = R_y / W
+		l_x = L_x / W
+		l_y = L_y / W
+
+		A = ( Syx / W - l_y * r_x ) - ( Sxy / W - l_x * r_y )
+		B = ( Sxx / W - l_x * r_x ) + ( Syy / W - l_y * r_y )
+
+		theta = np.arctan2( - A , B )
+
+		#after the optimal rotation the weighted mean square displacement is the sum of the
+		#weighted square distances from the center of masses minus twice the norm of ( A , B ).
+		score = ( P1 / W - r_x ** 2 - r_y ** 2 ) + ( P2 / W - l_x ** 2 - l_y ** 2 ) - 2 * np.sqrt( A ** 2 + B ** 2 )
+
+	theta[ ~ valid ] = np.nan
+	score = np.maximum( score , 0 )
+	score[ ~ valid ] = np.inf
+
+	rc = np.where( valid[ : , None ] , np.transpose( [ r_x + c1[ 0 ] , r_y + c1[ 1 ] ] ) , 0 )
+	lc = np.where( valid[ : , None ] , np.transpose( [ l_x + c2[ 0 ] , l_y + c2[ 1 ] ] ) , 0 )
+
+	return({
+		'angle' : theta,
+		'rc' : rc,
+		'lc' : lc,
+		'score' : score
+		})
+
 def nanMAD( x , axis = None , k = 1.4826):
 	MAD = np.nanmedian( np.absolute( x - np.nanmedian( x , axis ) ) , axis )
 	return( k * MAD )
@@ -180,7 +390,7 @@ def unified_start( self ) :
 		
 	except :
 		
-		print( 'Error: one or more of the annotations mean_starts, std_starts, and n_starts is/are missiong' )
+		logger.error( 'Error: one or more of the annotations mean_starts, std_starts, and n_starts is/are missiong' )
 
 def unified_end( self ) :
 
@@ -190,7 +400,7 @@ def unified_end( self ) :
 		
 	except :
 		
-		print( 'Error: one or more of the annotations mean_ends, std_ends, and n_ends is/are missiong' )
+		logger.error( 'Error: one or more of the annotations mean_ends, std_ends, and n_ends is/are missiong' )
 
 
 def compute_average_start_and_end( trajectories_time_span , aligned_trajectories , max_frame ) :
@@ -215,7 +425,7 @@ def compute_average_start_and_end( trajectories_time_span , aligned_trajectories
 		mean_starts = max(trajectories_time_span[ 'new_start' ])
 		n_starts = np.nan
 		std_starts = np.nan
-		print( 'Warning: all trajectory starts were trunkated' )
+		logger.warning( 'Warning: all trajectory starts were trunkated' )
 	
 	#same as for nan mean_starts. However, for the selected mean_ends is the smallest
 	traj_ends_to_average = [trajectories_time_span[ 'new_end' ][ j ] for j in range(l)\
@@ -228,44 +438,43 @@ def compute_average_start_and_end( trajectories_time_span , aligned_trajectories
 		mean_ends = min(trajectories_time_span[ 'new_end' ])
 		n_ends = np.nan
 		std_ends = np.nan
-		print( 'Warning: all trajectory ends were trunkated' )
+		logger.warning( 'Warning: all trajectory ends were trunkated' )
 
 	return( mean_starts , std_starts , n_starts , mean_ends , std_ends , n_ends )
 
 #-------------------------------------END-OF-DEFINITIONS-in-compute_average_start_and_end-----------------------------------
 def trajectory_average( aligned_trajectories_to_average , r , median , fimax ) :	
 
+	#the aligned trajectories are averaged from a TrajStack (see trajalign.stack). A list
+	#of trajectories is stacked first.
+	if not isinstance( aligned_trajectories_to_average , TrajStack ) :
+
+		aligned_trajectories_to_average = TrajStack( aligned_trajectories_to_average )
+
 	#define the trajectory where the average will be stored
 	t = Traj()
 
 	#inherit the annotations from the reference trajectory
-	for a in aligned_trajectories_to_average[ r ].annotations().keys():
+	for a in aligned_trajectories_to_average.annotations( r ).keys():
 
 		if a == 'file':
-			t.annotations( 'reference_file' , aligned_trajectories_to_average[ r ].annotations()[ a ])
+			t.annotations( 'reference_file' , aligned_trajectories_to_average.annotations( r )[ a ])
 		else :
-			t.annotations( a , aligned_trajectories_to_average[ r ].annotations()[ a ]) 
+			t.annotations( a , aligned_trajectories_to_average.annotations( r )[ a ]) 
 
 	if fimax :
 		t.annotations( 'fimax' , 'TRUE' )
 
 	#group all the attributes of the aligned trajectories...
-	attributes = [ a for a in aligned_trajectories_to_average[ r ].attributes() if a not in ('t','frames')] 
-	#create an empy dictionary where all the attributes that will be then averaged are stored
+	attributes = [ a for a in aligned_trajectories_to_average.attributes() if a not in ('t','frames')] 
+	#...whose values are views of the stack, with the trajectories along the first axis.
 	attributes_to_be_averaged = {}
 	for a in attributes:
-		attributes_to_be_averaged[a] = []
-
-	#merge all the trajectory attributes into the dictionary attributes_to_be_averaged.
-	for j in range( len( aligned_trajectories_to_average ) ):
-		
-		for a in attributes:
-
-			attributes_to_be_averaged[a].append(getattr(aligned_trajectories_to_average[ j ],'_'+a))
+		attributes_to_be_averaged[a] = aligned_trajectories_to_average.values( a )
 
 	#all the aligned trajectories are set to start at the same  mean_start and finish at mean_end computed from
 	#trajectories_time_span in compute_average().Hence, the time interval is the same
-	t.input_values( 't' , aligned_trajectories_to_average[ r ].t()) 
+	t.input_values( 't' , aligned_trajectories_to_average.t( r )) 
 		
 	#average the attributes of the trajectories and assign 
 	#them to the average trajectory [ r ]
@@ -286,65 +495,1436 @@ def trajectory_average( aligned_trajectories_to_average , r , median , fimax ) :
 			#no equivalent in the trajectory __slots__. If _a_err is then in the trajectory
 			#slots, then both the mean and the sem can be computed. There is no sem without mean.
 
-			if '_' + a + '_err' in t.__slots__:
-				
-				if median :
+			if '_' + a + '_err' in t.__slots__:
+				
+				if median :
+
+					t.input_values( a ,
+							np.nanmedian( attributes_to_be_averaged[ a ], axis = 0 )
+						)
+
+				else :
+
+					t.input_values( a ,
+							np.nanmean( attributes_to_be_averaged[ a ], axis = 0 )
+						)
+
+				#if there is no n defined yet, it computes it
+				if not t.n().any() : 
+					#compute the number of not-nan data points by dividing
+					#the nansum by the nanmean. The operation is performed
+					#on the last attribute in the loop that can either have 
+					#two dimensions (as 'coord') or one. In case of two dims
+					#only one is used to compute '_n'.
+					
+					x = np.nanmean( attributes_to_be_averaged[ a ] , axis = 0 )
+					y = np.nansum( attributes_to_be_averaged[a] , axis = 0 )
+			
+					if len(x) == 2:
+						t.input_values( 'n' , y[0]/x[0] )
+					else:
+						with wr.catch_warnings():
+							# if both y[i] and x[i] are 0, then a waring is outputed. Here we suppress such warnings.
+							wr.simplefilter("ignore", category=RuntimeWarning)
+							t.input_values( 'n' , y/x )
+
+				#compute the errors as standard errors of the mean/median
+				try :
+					if median :
+
+						t.input_values( a + '_err' ,
+							nanMAD( attributes_to_be_averaged[ a ], axis = 0 ) / np.sqrt( t.n() )
+							)
+
+					else :
+
+						t.input_values( a + '_err' ,
+							np.nanstd( attributes_to_be_averaged[ a ], axis = 0 ) / np.sqrt( t.n() )
+							)
+
+				except :
+
+					raise AttributeError( 'The attribute ' + a + ' cannot have its error assigned' )
+
+			else :
+
+				raise AttributeError( 'The attribute ' + a + ' is not recongnised as an attribute' )
+
+	return( t )
+#-------------------------------------END-OF-DEFINITION-of-trajectory_average-----------------------------------
+
+def trajectory_average_stream( aligned_trajectories_to_average , r = 0 , median = False , fimax = False , k = 512 ) :
+
+	"""
+	trajectory_average_stream( aligned_trajectories_to_average , r = 0 , median = False , fimax = False , k = 512 ): computes 
+	the same average trajectory of trajectory_average, reading the aligned trajectories one at a time from an iterable (e.g. 
+	a generator), so that the memory used does not grow with the number of trajectories. The annotations are inherited from 
+	the r-th trajectory. The mean and its standard error are computed with running statistics (see RunningStatistics), while 
+	the median and its nanMAD error are computed from a QuantileSketch with k values per level, whose values are exact up to k 
+	trajectories and approximate beyond. The average spans all the time points of the trajectories.
+	"""
+
+	#define the trajectory where the average will be stored
+	t = Traj()
+
+	statistics = {} #the running statistics of each attribute
+	attributes = []
+	n_trajectories = 0
+
+	for j , trajectory in enumerate( aligned_trajectories_to_average ) :
+
+		if j == 0 :
+
+			#group all the attributes of the aligned trajectories...
+			attributes = [ a for a in trajectory.attributes() if a not in ('t','frames')] 
+
+			for a in attributes :
+
+				if a[ len( a ) - 4 : len( a ) ] == '_err' :
+				
+					raise AttributeError('The trajectories to be averaged have already an non empty error element, suggeting that they are already the result of an average. These error currently are not propagated. Check that your trajectories are correct')
+
+				if '_' + a + '_err' not in t.__slots__:
+
+					raise AttributeError( 'The attribute ' + a + ' is not recongnised as an attribute' )
+
+			if 'delta_t' in trajectory.annotations().keys():
+				delta_t = float( trajectory.annotations()['delta_t'] )
+			else :
+				delta_t = min( trajectory.t()[1:] - trajectory.t()[:-1] )
+
+			#the time grid starts at the index i0 of the times in units of delta_t
+			i0 = int( np.rint( trajectory.start() / delta_t ) )
+			time = np.array( trajectory.t() )
+
+			for a in attributes :
+
+				shape = np.shape( getattr( trajectory , '_' + a ) )
+
+				if median :
+					statistics[ a ] = QuantileSketch( shape , k )
+				else :
+					statistics[ a ] = RunningStatistics( shape )
+
+		if j == r :
+
+			#inherit the annotations from the reference trajectory
+			for a in trajectory.annotations().keys():
+
+				if a == 'file':
+					t.annotations( 'reference_file' , trajectory.annotations()[ a ])
+				else :
+					t.annotations( a , trajectory.annotations()[ a ]) 
+
+		#extend the time grid if the trajectory starts before or ends after it
+		j0 = int( np.rint( trajectory.start() / delta_t ) ) - i0
+		j1 = j0 + len( trajectory )
+		before = max( 0 , - j0 )
+		after = max( 0 , j1 - len( time ) )
+
+		if ( before > 0 ) | ( after > 0 ) :
+
+			time = np.pad( time , ( before , after ) , constant_values = np.nan )
+			for a in attributes :
+				statistics[ a ].extend( before , after )
+			i0 -= before
+			j0 += before
+			j1 += before
+
+		#the times of the grid are those of the trajectories, and of the reference trajectory where it is defined
+		if j == r :
+			time[ j0 : j1 ] = trajectory.t()
+		else :
+			time[ j0 : j1 ] = np.where( np.isnan( time[ j0 : j1 ] ) , trajectory.t() , time[ j0 : j1 ] )
+
+		for a in attributes :
+
+			x = getattr( trajectory , '_' + a )
+			padded = np.full( x.shape[ : x.ndim - 1 ] + ( len( time ) , ) , np.nan )
+			padded[ ... , j0 : j1 ] = x
+			statistics[ a ].update( padded )
+
+		n_trajectories += 1
+
+	if n_trajectories == 0 :
+
+		raise IndexError( 'trajectory_average_stream: there are no trajectories to average' )
+
+	if fimax :
+		t.annotations( 'fimax' , 'TRUE' )
+
+	t.input_values( 't' , time )
+
+	for a in attributes :
+
+		if median :
+
+			t.input_values( a , statistics[ a ].median() )
+
+		else :
+
+			t.input_values( a , statistics[ a ].mean() )
+
+		#n is the number of not-nan data points of the first attribute
+		if not t.n().any() :
+
+			count = statistics[ a ].count()
+
+			if count.ndim == 2 :
+				count = count[ 0 ]
+
+			t.input_values( 'n' , np.where( count > 0 , count , np.nan ) )
+
+		#compute the errors as standard errors of the mean/median
+		with wr.catch_warnings():
+
+			wr.simplefilter("ignore", category=RuntimeWarning)
+
+			if median :
+
+				t.input_values( a + '_err' , statistics[ a ].mad() / np.sqrt( t.n() ) )
+
+			else :
+
+				t.input_values( a + '_err' , statistics[ a ].std() / np.sqrt( t.n() ) )
+
+	return( t )
+
+def triplicate_trajectory( t ):
+	#triplicate t adding itself at its beginning and at its end
+
+	output = cp.deepcopy( t )
+
+	#anticipate the start of trajectory by the trajectory duration and a time interval (you need one time interval
+	#between the beginning of the real trajectory and the last point of the "anticipated" bit.
+	#as len(t) is the number of frames + 1, then len(t) *dt is the duration of the trajectory + one dt interval, which is needed to
+	#separate the duplicate trajectory form the original trajectory
+	output.start( t.start() - ( len( t ) * float(t.annotations()['delta_t']) ) )
+	#delay the end of trajectory in the same way 
+	output.end( t.end() + ( len( t ) * float(t.annotations()['delta_t']) ) )
+	
+	#coord
+	output.coord()[:,0:len(t)] = t.coord()
+	output.coord()[:,( len(output) - len(t) ):len(output)] = t.coord()
+	#f	
+	output.f()[0:len(t)] = t.f()
+	output.f()[( len(output) - len(t) ):len(output)] = t.f()
+
+	work.add( 'pairwise_bytes' , sum( [ getattr( output , '_' + a ).nbytes for a in output.attributes() ] ) )
+
+	return(output)
+
+def refine_alignment( t1 , t2 , lags , WeightTrajOverlap = False ):
+
+	#the overlapping parts of t1 and t2 for all the lags are aligned together by MSD_pairs
+	pairs = []
+	refined_lags = []
+	overlaps = []
+
+	for lag in lags :
+
+		#the frames of t1 and t2 lagged by lag that overlap (see frame_overlap)
+		sel_t1 , sel_t2 = frame_overlap( t1.frames() , t2.frames() , lag )
+		overlap = len( t1.frames()[ sel_t1 ] )
+
+		if overlap > 0 :
+
+			if isinstance( sel_t1 , slice ) :
+				#the attributes of t1 and t2 are sliced, without indexing each row (see Traj.extract)
+				pairs.append( ( t1.extract( sel_t1 ) , t2.extract( sel_t2 ) ) )
+			else :
+				pairs.append( ( t1.extract( sel_t1.tolist() ) , t2.extract( sel_t2.tolist() ) ) )
+				work.add( 'pairwise_bytes' , sum( [ getattr( t , '_' + a ).nbytes for t in pairs[ -1 ] for a in t.attributes() ] ) )
+			refined_lags.append( lag )
+			overlaps.append( overlap )
+
+	work.add( 'lags_refined' , len( pairs ) )
+
+	#the pairs are grouped by their exact length (bucket = 1), so that no nan padding changes 
+	#the order of the sums in MSD_batch and the alignments are identical to those of MSD.
+	alignments = MSD_pairs( pairs , bucket = 1 )
+
+	for i in range( len( alignments ) ) :
+
+		alignments[ i ][ 'lag' ] = refined_lags[ i ]
+
+		if WeightTrajOverlap :
+			#the scores are weighted with the number of datapoints of the two trajectoreis that
+			#trajectories (for example, trajectories that overlap with two data points only).
+			
+			alignments[ i ][ 'score' ] = alignments[ i ][ 'score' ] / np.sqrt( overlaps[ i ] )
+
+	return( alignments )
+
+def scan_lags( x_coord , x_f , y_coord , y_f , starts , x_is_t1 ) :
+
+	"""
+	scan_lags( x_coord , x_f , y_coord , y_f , starts , x_is_t1 ): aligns the trajectory y to each window of the trajectory x
+	that starts at the indexes in starts and is as long as y, with MSD_batch. If x_is_t1 is True, x is the reference of the 
+	alignments (i.e. trajectory 1 in MSD_batch), otherwise y is. The windows are aligned in chunks to limit the memory used.
+	"""
+
+	x_windows_coord = np.lib.stride_tricks.sliding_window_view( x_coord , y_coord.shape[ 1 ] , axis = 1 )
+	x_windows_f = np.lib.stride_tricks.sliding_window_view( x_f , len( y_f ) )
+	chunk = max( 1 , 2 ** 16 // len( y_f ) )
+
+	work.add( 'lags_scanned' , len( starts ) )
+
+	output = { 'angle' : [] , 'rc' : [] , 'lc' : [] , 'score' : [] }
+
+	for i0 in range( 0 , len( starts ) , chunk ) :
+
+		i = starts[ i0 : i0 + chunk ]
+		window_coord = np.transpose( x_windows_coord[ : , i ] , axes = ( 1 , 0 , 2 ) )
+		window_f = x_windows_f[ i ]
+		y_chunk_coord = np.broadcast_to( y_coord , ( len( i ) , ) + y_coord.shape )
+		y_chunk_f = np.broadcast_to( y_f , ( len( i ) , len( y_f ) ) )
+
+		if x_is_t1 :
+			batch = MSD_batch( window_coord , window_f , y_chunk_coord , y_chunk_f )
+		else :
+			batch = MSD_batch( y_chunk_coord , y_chunk_f , window_coord , window_f )
+
+		for a in output.keys() :
+			output[ a ].append( batch[ a ] )
+
+	for a in output.keys() :
+		output[ a ] = np.concatenate( output[ a ] )
+
+	return( output )
+
+def decimate_trajectory( coord , f , d ) :
+
+	"""
+	decimate_trajectory( coord , f , d ): decimates a trajectory by d, averaging its coordinates over blocks of d time 
+	points weighted on the fluorescence intensity f. The intensity of each block is the mean intensity of its time points. 
+	Missing time points are ignored. Returns the decimated coordinates and intensities.
+	"""
+
+	l = int( np.ceil( coord.shape[ 1 ] / d ) )
+	pad = l * d - coord.shape[ 1 ]
+
+	w = np.where( np.isnan( f ) | np.isnan( coord[ 0 ] ) | np.isnan( coord[ 1 ] ) , 0 , f )
+	c = np.where( np.isnan( coord ) , 0 , coord )
+	w = np.pad( w , ( 0 , pad ) ).reshape( l , d )
+	c = np.pad( c , ( ( 0 , 0 ) , ( 0 , pad ) ) ).reshape( 2 , l , d )
+
+	with wr.catch_warnings():
+		# blocks without intensity output nan, with a warning that is suppressed here.
+		wr.simplefilter("ignore", category=RuntimeWarning)
+		decimated_coord = np.sum( w * c , axis = 2 ) / np.sum( w , axis = 1 )
+
+	decimated_f = np.sum( w , axis = 1 ) / d
+	decimated_f[ np.isnan( decimated_coord[ 0 ] ) ] = np.nan
+
+	return( decimated_coord , decimated_f )
+
+def multiresolution_lags( x , y , convolution_steps , survivors , x_is_t1 , factor = 4 , min_points = 16 ) :
+
+	"""
+	multiresolution_lags( x , y , convolution_steps , survivors , x_is_t1 , factor = 4 , min_points = 16 ): selects the windows of x (see scan_lags) 
+	to which y is aligned in align_pair with lag_scan = 'multiresolution'. The lags are searched from coarse to fine: x and y are 
+	decimated by factor**len( survivors ), ..., factor (see decimate_trajectory), and at each level only the survivors[ h ] lags 
+	with the best scores are kept. The lags within one decimation block from the survivors are then scanned at the next, finer, 
+	level. As x is a triplicated trajectory, lags that differ by the length of the original trajectory are equivalent: the 
+	survivors are chosen among non-equivalent lags and all their equivalent lags are kept. Levels at which y would have 
+	less than min_points decimated time points are skipped, as too coarse trajectories can rank the lags wrongly. Returns 
+	the window starts, in frames, to be scanned at full resolution. The selection is approximate, and can miss the best 
+	lag (see certified_lags).
+	"""
+
+	levels = len( survivors )
+	period = len( x ) // 3
+	candidates = None
+
+	for h in range( levels ) :
+
+		d = factor ** ( levels - h )
+
+		if len( y ) // d < min_points :
+
+			continue
+
+		if candidates is None :
+
+			candidates = np.arange( 0 , convolution_steps , d )
+
+		x_coord , x_f = decimate_trajectory( x.coord() , x.f() , d )
+		y_coord , y_f = decimate_trajectory( y.coord() , y.f() , d )
+
+		#the decimated windows must fit within the decimated x
+		candidates = candidates[ candidates // d + len( y_f ) <= len( x_f ) ]
+		scan = scan_lags( x_coord , x_f , y_coord , y_f , candidates // d , x_is_t1 )
+
+		best = []
+		for b in candidates[ np.argsort( scan[ 'score' ] , kind = 'stable' ) ] :
+
+			if len( best ) == survivors[ h ] :
+				break
+
+			if b % period not in [ c % period for c in best ] :
+				best.append( b )
+
+		#the lags to scan at the next level are those within one block of d from the best lags
+		#and from their equivalent lags
+		step = d // factor
+		candidates = np.unique( np.concatenate( [ np.arange( b % period + k * period - d , b % period + k * period + d + 1 , step ) for b in best for k in range( 3 ) ] ) )
+		candidates = candidates[ ( candidates >= 0 ) & ( candidates < convolution_steps ) ]
+
+	if candidates is None :
+
+		#the trajectories are too short to be decimated
+		candidates = np.arange( 0 , convolution_steps )
+
+	return( candidates )
+
+def score_lower_bounds( x_coord , x_f , y_coord , y_f ) :
+
+	"""
+	score_lower_bounds( x_coord , x_f , y_coord , y_f ): computes, for each window of x as long as y (see scan_lags), a lower 
+	bound of the score that MSD_batch outputs for the alignment of y to the window, together with the tolerance within which 
+	the bound is exact in floating point. The score of MSD_batch is the weighted residual of one rototranslation summed over 
+	the time points where both trajectories are defined, hence it is larger than or equal to the residual of the best 
+	rototranslation over the same time points (Horn, 1987), which is the lower bound. The weighted sums of all the windows are 
+	computed at once with one matrix product. Windows without overlapping data points have an infinite lower bound, as their 
+	score is infinite.
+	"""
+
+	x_valid = ~ ( np.isnan( x_f ) | np.isnan( x_coord[ 0 ] ) | np.isnan( x_coord[ 1 ] ) )
+	y_valid = ~ ( np.isnan( y_f ) | np.isnan( y_coord[ 0 ] ) | np.isnan( y_coord[ 1 ] ) )
+
+	if ( not x_valid.any() ) | ( not y_valid.any() ) :
+
+		infinite = np.full( len( x_f ) - len( y_f ) + 1 , np.inf )
+		return( infinite , infinite )
+
+	#the coordinates are centred, which does not change the residuals but reduces the rounding errors
+	p = np.where( x_valid , x_coord - np.mean( x_coord[ : , x_valid ] , axis = 1 , keepdims = True ) , 0 )
+	q = np.where( y_valid , y_coord - np.mean( y_coord[ : , y_valid ] , axis = 1 , keepdims = True ) , 0 )
+	a = np.where( x_valid , x_f , 0 )
+	b = np.where( y_valid , y_f , 0 )
+
+	#the sum of the weights of MSD_batch includes all the time points with intensities
+	S = np.lib.stride_tricks.sliding_window_view( np.where( np.isnan( x_f ) , 0 , x_f ) , len( y_f ) ) @ np.where( np.isnan( y_f ) , 0 , y_f )
+
+	#M[ : , u , v ] are the sums over each window of the products of the u-th x and of the v-th y channels
+	x_windows = np.lib.stride_tricks.sliding_window_view( np.array( [ a , a * p[ 0 ] , a * p[ 1 ] , a * ( p[ 0 ]**2 + p[ 1 ]**2 ) ] ) , len( y_f ) , axis = 1 )
+	y_channels = np.array( [ b , b * q[ 0 ] , b * q[ 1 ] , b * ( q[ 0 ]**2 + q[ 1 ]**2 ) ] )
+	M = np.matmul( np.transpose( x_windows , axes = ( 1 , 0 , 2 ) ) , y_channels.T )
+	work.add( 'pairwise_bytes' , 4 * x_f.nbytes + y_channels.nbytes + S.nbytes + M.nbytes )
+
+	U = M[ : , 0 , 0 ]
+
+	with wr.catch_warnings():
+		# windows without overlap have 0 weights; their bound is set to infinite below.
+		wr.simplefilter("ignore", category=RuntimeWarning)
+
+		#weighted variances and cross covariances of the centred trajectories
+		Vp = M[ : , 3 , 0 ] - ( M[ : , 1 , 0 ]**2 + M[ : , 2 , 0 ]**2 ) / U
+		Vq = M[ : , 0 , 3 ] - ( M[ : , 0 , 1 ]**2 + M[ : , 0 , 2 ]**2 ) / U
+		C = M[ : , 1 : 3 , 1 : 3 ] - M[ : , 1 : 3 , 0 ][ : , : , None ] * M[ : , 0 , 1 : 3 ][ : , None , : ] / U[ : , None , None ]
+
+		A = C[ : , 0 , 1 ] - C[ : , 1 , 0 ]
+		B = C[ : , 0 , 0 ] + C[ : , 1 , 1 ]
+
+		bounds = np.clip( ( Vp + Vq - 2 * np.sqrt( A**2 + B**2 ) ) / S , 0 , None )
+		tolerances = 1e-6 * ( np.absolute( Vp ) + np.absolute( Vq ) ) / S + 1e-12
+
+	bounds[ ~ ( U > 0 ) ] = np.inf
+	tolerances[ ~ ( U > 0 ) ] = 0
+
+	return( bounds , tolerances )
+
+def certified_lags( x_coord , x_f , y_coord , y_f , convolution_steps , x_is_t1 , starts , scan ) :
+
+	"""
+	certified_lags( x_coord , x_f , y_coord , y_f , convolution_steps , x_is_t1 , starts , scan ): certifies the lags selected by 
+	multiresolution_lags. The window starts that were not aligned (see scan_lags) but whose lower bound of the score (see 
+	score_lower_bounds) is not larger than the best score of scan could have a lower score, and are aligned too. Returns 
+	all the window starts that were aligned, in increasing order, and their alignments. As all the lags whose score can 
+	be the lowest are aligned, the best lags are identical to those of the exhaustive scan.
+	"""
+
+	bounds , tolerances = score_lower_bounds( x_coord , x_f , y_coord , y_f )
+	bounds = bounds[ : convolution_steps ] - tolerances[ : convolution_steps ]
+	missed = np.setdiff1d( np.nonzero( bounds <= np.min( scan[ 'score' ] ) )[ 0 ] , starts )
+
+	if len( missed ) == 0 :
+
+		return( starts , scan )
+
+	missed_scan = scan_lags( x_coord , x_f , y_coord , y_f , missed , x_is_t1 )
+
+	scanned = np.concatenate( [ starts , missed ] )
+	sort = np.argsort( scanned , kind = 'stable' )
+	output = {}
+	for a in scan.keys() :
+		output[ a ] = np.concatenate( [ scan[ a ] , missed_scan[ a ] ] )[ sort ]
+
+	return( scanned[ sort ] , output )
+
+def branch_and_bound_lags( x_coord , x_f , y_coord , y_f , convolution_steps , x_is_t1 , block = 32 ) :
+
+	"""
+	branch_and_bound_lags( x_coord , x_f , y_coord , y_f , convolution_steps , x_is_t1 , block = 32 ): scans the same lags 
+	of the exhaustive scan in align_pair, but skips the lags that cannot have the lowest score. The lags are aligned in blocks, 
+	in order of increasing lower bound of their score (see score_lower_bounds), until the lower bound of the next lags is larger 
+	than the best score found so far. As all the lags whose score can be the lowest are aligned, and as each lag is aligned 
+	exactly as in scan_lags, the best lags are identical to those of the exhaustive scan. Returns the window starts that were 
+	aligned, in increasing order, their alignments (see scan_lags) and the number of pruned lags.
+	"""
+
+	bounds , tolerances = score_lower_bounds( x_coord , x_f , y_coord , y_f )
+	bounds = bounds[ : convolution_steps ] - tolerances[ : convolution_steps ]
+	order = np.argsort( bounds , kind = 'stable' )
+
+	best = np.inf
+	scanned = []
+	scans = []
+
+	for i0 in range( 0 , convolution_steps , block ) :
+
+		starts = order[ i0 : i0 + block ]
+
+		starts = starts[ bounds[ starts ] <= best ]
+
+		if len( starts ) == 0 :
+			break
+
+		scan = scan_lags( x_coord , x_f , y_coord , y_f , starts , x_is_t1 )
+		best = min( best , np.min( scan[ 'score' ] ) )
+
+		scanned.append( starts )
+		scans.append( scan )
+
+	scanned = np.concatenate( scanned )
+	sort = np.argsort( scanned )
+	output = {}
+	for a in scans[ 0 ].keys() :
+		output[ a ] = np.concatenate( [ scan[ a ] for scan in scans ] )[ sort ]
+
+	return( scanned[ sort ] , output , convolution_steps - len( scanned ) )
+
+def align_pair( t1 , t2 , lag_scan = 'exhaustive' , survivors = [ 8 , 8 ] ) :
+
+	"""
+	align_pair( t1 , t2 , lag_scan = 'exhaustive' , survivors = [ 8 , 8 ] ): computes the rototranslation and the lag that align 
+	the trajectory t2 to the trajectory t1. The possible lags are first scanned on the triplicate of the longest trajectory (see 
+	lag_scan in average_trajectories) and the best lags are then refined on t1 and t2 themselves. survivors are the numbers 
+	of lags kept at each level of lag_scan = 'multiresolution' (see multiresolution_lags). The alignment also reports the 
+	number of lags that were not aligned ('pruned_lags') by lag_scan = 'multiresolution' and 'branch_and_bound'.
+	"""
+
+	alignments = []
+	pruned_lags = 0
+
+	#triplicate the longest trajectory by adding itself at its beginning and at its end
+	if ( len(t1)  >= len(t2) ) :
+		x = triplicate_trajectory(t1)
+		y = t2
+	else :
+		x = triplicate_trajectory(t2)
+		y = t1
+
+	convolution_steps = len(x) - len(y)
+
+	if lag_scan == 'fft' :
+
+		#the alignments of all the lags are computed at once by MSD_lags, whose i-th
+		#element is the alignment of y lagged by i time points along x.
+		if ( len(t1)  >= len(t2) ) :
+			scan = MSD_lags( x , y )
+		else :
+			scan = MSD_lags( y , x )
+
+		for i in range( 0 , convolution_steps ) :
+
+			lag = int( x.frames( 0 ) - y.frames( 0 ) + i )
+
+			alignments.append(
+					{
+						'angle' : scan[ 'angle' ][ i ],
+						'rc' : scan[ 'rc' ][ i ],
+						'lc' : scan[ 'lc' ][ i ],
+						'score' : scan[ 'score' ][ i ]
+						})
+
+			#which trajectory was triplicated decides the sign of the lag
+			if ( len(t1)  >= len(t2) ) :
+				alignments[ len(alignments)-1 ][ 'lag' ] = lag
+			else :
+				alignments[ len(alignments)-1 ][ 'lag' ] = - lag
+
+	else :
+
+		#by triplicating the longest trajectory we can test all possible alignments in
+		#space and time starting with the entire trajectories x and y. As the frames of
+		#x and y have no gaps (see Traj.fill), the frames of x overlapping with y lagged by
+		#i frames are the window x[ i : i + len( y ) ]. With lag_scan = 'exhaustive' all the
+		#lags are aligned, while with lag_scan = 'multiresolution' only the lags selected 
+		#by multiresolution_lags are.
+		if lag_scan == 'branch_and_bound' :
+			starts , scan , pruned_lags = branch_and_bound_lags( x.coord() , x.f() , y.coord() , y.f() , convolution_steps , len(t1) >= len(t2) )
+		else :
+			if lag_scan == 'multiresolution' :
+				starts = multiresolution_lags( x , y , convolution_steps , survivors , len(t1) >= len(t2) )
+			else :
+				starts = np.arange( 0 , convolution_steps )
+
+			scan = scan_lags( x.coord() , x.f() , y.coord() , y.f() , starts , len(t1) >= len(t2) )
+
+			if lag_scan == 'multiresolution' :
+				#the lags missed by the decimated search that could have the best score are aligned too
+				starts , scan = certified_lags( x.coord() , x.f() , y.coord() , y.f() , convolution_steps , len(t1) >= len(t2) , starts , scan )
+				pruned_lags = convolution_steps - len( starts )
+
+		for k in range( len( starts ) ) :
+
+			lag = int( x.frames( 0 ) - y.frames( 0 ) + starts[ k ] )
+
+			alignments.append(
+					{
+						'angle' : scan[ 'angle' ][ k ],
+						'rc' : scan[ 'rc' ][ k ],
+						'lc' : scan[ 'lc' ][ k ],
+						'score' : scan[ 'score' ][ k ]
+						})
+
+			#which trajectory was triplicated decides the sign of the lag
+			if ( len(t1)  >= len(t2) ) :
+				alignments[ len(alignments)-1 ][ 'lag' ] = lag
+			else :
+				alignments[ len(alignments)-1 ][ 'lag' ] = - lag
+
+	s = [ a['score'] for a in alignments ]
+	lags = [ a['lag'] for a in alignments ]
+
+	if lag_scan == 'fft' :
+
+		#the FFTs add rounding errors to the scores, so that the lags whose score is close to the 
+		#minimum are aligned again by scan_lags, and the best lags are selected among them with the
+		#exact scores, as in the other scans. The i-th alignment of the FFT scan is that of the lag i.
+		min_s = min( s )
+		candidates = np.array( [ i for i in range(len(s)) if np.isclose( s[i] , min_s , rtol = 1e-6 , atol = 1e-9 ) ] )
+		exact_s = scan_lags( x.coord() , x.f() , y.coord() , y.f() , candidates , len(t1) >= len(t2) )[ 'score' ]
+		min_s = min( exact_s )
+		sel_alignments = [ int( candidates[k] ) for k in range(len(candidates)) if exact_s[k] == min_s ]
+
+	else :
+
+		min_s = min( s )
+		sel_alignments = [ i for i in range(len(s)) if s[i] == min_s ]
+
+	#check which of the selected alignments best fit the trajectory t1 
+	#and not just its triplicate. Importantly, also recompute the alignment
+	#without repetitions of the trajectory, which alter the alignment output
+	refined_alignments_1 = refine_alignment( t1 , t2 , [ lags[ sa ] for sa in sel_alignments ] , WeightTrajOverlap = True ) 
+	
+	refined_s_1 = [  a['score'] for a in refined_alignments_1 ]
+	
+	lag = refined_alignments_1[ refined_s_1.index( min( refined_s_1 ) ) ][ 'lag' ]
+
+	#define a span, which is not too small, nor too big compared to the trajectory length
+	refine_span = int( min( len( t1 ) , len( t2 ) ) / 10 )
+	refined_alignments_2 = refine_alignment( t1 , t2 , range( lag - refine_span , lag + refine_span + 1 ) , WeightTrajOverlap = False )
+
+	refined_s_2 = [  a['score'] for a in refined_alignments_2 ]
+
+	best_alignment = refined_alignments_2[ refined_s_2.index( min( refined_s_2 ) ) ]
+	best_alignment[ 'pruned_lags' ] = pruned_lags
+
+	return( best_alignment )
+
+def lag_scan_report( trajectory_list , lag_scan = 'multiresolution' , survivors = [ 8 , 8 ] , fimax = False , fimax_filter = [ -3/35 , 12/35 , 17/35 , 12/35 , -3/35 ] ) :
+
+	"""
+	lag_scan_report( trajectory_list , lag_scan = 'multiresolution' , survivors = [ 8 , 8 ] , fimax = False , fimax_filter = [ -3/35 , 12/35 , 17/35 , 12/35 , -3/35 ] ):
+	aligns each pair of trajectories in trajectory_list with both lag_scan and the exhaustive scan, and reports how often the 
+	alignments differ and how long each scan took. Returns a dictionary with the number of 'pairs', the number of pairs whose 
+	lag ('different_lags') or rototranslation ('different_alignments') differ, and the times in seconds of the exhaustive 
+	('time_exhaustive') and of lag_scan ('time_lag_scan') alignments.
+	"""
+
+	if ( fimax ) :
+
+		trajectories = [ t.fimax( fimax_filter ) for t in trajectory_list ]
+
+	else :
+
+		trajectories = trajectory_list
+
+	report = { 'pairs' : 0 , 'different_lags' : 0 , 'different_alignments' : 0 , 'time_exhaustive' : 0 , 'time_lag_scan' : 0 }
+
+	for i in range( len( trajectories ) ) :
+
+		for j in range( i ) :
+
+			t0 = time.perf_counter()
+			a = align_pair( trajectories[ i ] , trajectories[ j ] , 'exhaustive' )
+			t1 = time.perf_counter()
+			b = align_pair( trajectories[ i ] , trajectories[ j ] , lag_scan , survivors )
+			t2 = time.perf_counter()
+
+			report[ 'pairs' ] += 1
+			report[ 'time_exhaustive' ] += t1 - t0
+			report[ 'time_lag_scan' ] += t2 - t1
+
+			if a[ 'lag' ] != b[ 'lag' ] :
+
+				report[ 'different_lags' ] += 1
+				logger.info( 'lag_scan_report: ' + trajectories[ j ].annotations()[ 'file' ] + ' aligned to ' + trajectories[ i ].annotations()[ 'file' ] + ' with lag ' + str( b[ 'lag' ] ) + ' instead of ' + str( a[ 'lag' ] ) )
+
+			if not ( np.isclose( a[ 'angle' ] , b[ 'angle' ] ) & np.allclose( a[ 'rc' ] , b[ 'rc' ] ) & np.allclose( a[ 'lc' ] , b[ 'lc' ] ) ) :
+
+				report[ 'different_alignments' ] += 1
+
+	logger.info( '________________' )
+	logger.info( 'lag_scan = ' + lag_scan + ': ' + str( report[ 'different_lags' ] ) + ' lags and ' + str( report[ 'different_alignments' ] ) + ' alignments out of ' + str( report[ 'pairs' ] ) + ' pairs differ from the exhaustive scan' )
+	logger.info( 'time: ' + str( round( report[ 'time_lag_scan' ] , 2 ) ) + ' s (exhaustive: ' + str( round( report[ 'time_exhaustive' ] , 2 ) ) + ' s)' )
+
+	return( report )
+
+#the trajectories aligned by the workers of the process pool in compute_transformations
+pool_trajectories = []
+
+def init_pool( trajectories ) :
+
+	global pool_trajectories
+	pool_trajectories = trajectories
+
+def compute_transformations_chunk( chunk , lag_scan , survivors ) :
+
+	#align the pairs of trajectories ( i , j ) of a chunk within a worker of the process pool, and return the
+	#work done together with the alignments, as the counters of the worker are not those of the main process
+	output = []
+	work.reset()
+
+	for i , j in chunk :
+
+		output.append( ( ( i , j ) , align_pair( pool_trajectories[ i ] , pool_trajectories[ j ] , lag_scan , survivors ) ) )
+
+	return( output , work.as_dict() )
+
+def align_pairs( trajectories , pairs , lag_scan = 'exhaustive' , workers = 1 , cache = None , options = {} , survivors = [ 8 , 8 ] , progress = None ) :
+
+	"""
+	align_pairs( trajectories , pairs , lag_scan = 'exhaustive' , workers = 1 , cache = None , options = {} , survivors = [ 8 , 8 ] , progress = None ): 
+	aligns the trajectory j to the trajectory i with align_pair for each pair of indexes ( i , j ) in pairs, and returns a dictionary of the alignments whose 
+	keys are the pairs. If workers > 1 the pairs are distributed over a pool of 'workers' processes. The results are identical to 
+	those computed by a single process.
+	cache is an AlignmentCache (see trajalign.cache), or None to not use any cache. The alignments of the pairs found in the cache 
+	are not recomputed, and the new alignments are added to the cache. The keys of the cache are computed from the content of the 
+	trajectories, lag_scan (and survivors, for lag_scan = 'multiresolution') and the other alignment options in the dictionary 'options' 
+	(see transformation_options), except pairing, neighbours and reference_selection, which do not change how a pair is aligned.
+	progress is a function, or None, that is called with the dictionary of the alignments computed so far after each pair is aligned 
+	(or, if workers > 1, after each chunk of pairs is aligned by a worker), e.g. to checkpoint them (see compute_transformations).
+	"""
+
+	alignments = {}
+
+	if cache is not None :
+
+		keys = {}
+		#the pairing and the reference selection choose which pairs are aligned, and not how
+		cached_options = { k : options[ k ] for k in options.keys() if k not in ( 'lag_scan' , 'survivors' , 'pairing' , 'neighbours' , 'reference_selection' ) }
+		#lag_scan = 'branch_and_bound' aligns the pairs exactly as 'exhaustive'
+		if lag_scan == 'branch_and_bound' :
+			cached_options[ 'lag_scan' ] = 'exhaustive'
+		else :
+			cached_options[ 'lag_scan' ] = lag_scan
+
+		if lag_scan == 'multiresolution' :
+			cached_options[ 'survivors' ] = [ int( n ) for n in survivors ]
+
+		for i , j in pairs :
+
+			keys[ ( i , j ) ] = cache.key( trajectories[ i ] , trajectories[ j ] , cached_options )
+			alignment = cache.get( keys[ ( i , j ) ] )
+
+			if alignment is not None :
+
+				alignments[ ( i , j ) ] = alignment
+
+		work.add( 'cache_hits' , len( alignments ) )
+		work.add( 'cache_misses' , len( pairs ) - len( alignments ) )
+
+		if len( alignments ) > 0 :
+
+			logger.info( str( len( alignments ) ) + ' alignments out of ' + str( len( pairs ) ) + ' read from the cache in ' + cache.directory )
+
+		pairs = [ p for p in pairs if p not in alignments.keys() ]
+
+	if ( workers == 1 ) | ( len( pairs ) == 0 ) :
+
+		for i , j in pairs :
+
+			logger.debug( 'ref. traj.:\t' + trajectories[ i ].annotations()['file'] )
+			logger.debug( 'aligned traj.:\t' + trajectories[ j ].annotations()['file'] )
+
+			alignments[ ( i , j ) ] = align_pair( trajectories[ i ] , trajectories[ j ] , lag_scan , survivors )
+
+			if progress is not None :
+
+				progress( alignments )
+
+	else :
+
+		#balance the chunks of pairs sent to the workers: the pairs are assigned, from the most to the least 
+		#expensive, to the chunk whose cost is the lowest. The cost of aligning two trajectories grows with
+		#the product of their lengths. The chunks are smaller if the progress is followed, so that it is reported more often.
+		n_chunks = min( len( pairs ) , ( 4 if progress is None else 32 ) * workers )
+		chunks = [ [] for c in range( n_chunks ) ]
+		costs = [ 0 ] * n_chunks
+
+		for i , j in sorted( pairs , key = lambda p : len( trajectories[ p[ 0 ] ] ) * len( trajectories[ p[ 1 ] ] ) , reverse = True ) :
+
+			c = costs.index( min( costs ) )
+			chunks[ c ].append( ( i , j ) )
+			costs[ c ] += len( trajectories[ i ] ) * len( trajectories[ j ] )
+
+		logger.info( 'Aligning ' + str( len( pairs ) ) + ' pairs of trajectories with ' + str( workers ) + ' workers' )
+
+		with ProcessPoolExecutor( max_workers = workers , initializer = init_pool , initargs = ( trajectories , ) ) as pool :
+
+			futures = [ pool.submit( compute_transformations_chunk , chunk , lag_scan , survivors ) for chunk in chunks ]
+
+			for future in as_completed( futures ) :
+
+				output , counts = future.result()
+
+				for pair , alignment in output :
+
+					alignments[ pair ] = alignment
+
+				work.update( counts )
+
+				if progress is not None :
+
+					progress( alignments )
+
+	if cache is not None :
+
+		for pair in pairs :
+
+			cache.put( keys[ pair ] , alignments[ pair ] )
+
+	return( alignments )
+
+def trajectory_identity( t ) :
+
+	"""
+	trajectory_identity( t ): returns the string that identifies the trajectory t in the transformations computed by 
+	compute_transformations, which is the trajectory file preceded by its path, if known (see load_directory).
+	"""
+
+	if 'file' not in t.annotations().keys() :
+
+		raise AttributeError( "trajectory_identity: the trajectory has no 'file' annotation that can identify it" )
+
+	if 'path' in t.annotations().keys() :
+
+		return( os.path.join( t.annotations()[ 'path' ] , t.annotations()[ 'file' ] ) )
+
+	else :
+
+		return( t.annotations()[ 'file' ] )
+
+def transformation_options( fimax , fimax_filter , lag_scan , survivors , pairing , neighbours ) :
+
+	#the options used to compute the transformations, which are stored with them (see compute_transformations). survivors 
+	#and neighbours are used only with lag_scan = 'multiresolution' and pairing = 'knn'
+	return({
+		'fimax' : bool( fimax ),
+		'fimax_filter' : [ float( f ) for f in fimax_filter ],
+		'lag_scan' : lag_scan,
+		'survivors' : [ int( n ) for n in survivors ] if lag_scan == 'multiresolution' else None,
+		'pairing' : pairing,
+		'neighbours' : int( neighbours ) if pairing == 'knn' else None
+		})
+
+def alignment_fingerprint( trajectory_list , options ) :
+
+	#the fingerprint (see trajalign.checkpoint) of the trajectories and of the options of transformation_options, which 
+	#are all the options that change their alignments. lag_scan = 'branch_and_bound' aligns the pairs exactly as 
+	#'exhaustive' (see align_pairs)
+	return( fingerprint( trajectory_list , dict( options , 
+		lag_scan = 'exhaustive' if options[ 'lag_scan' ] == 'branch_and_bound' else options[ 'lag_scan' ]
+		) ) )
+
+def compute_transformations( trajectory_list , fimax , fimax_filter , lag_scan = 'exhaustive' , workers = 1 , cache = None , survivors = [ 8 , 8 ] , pairing = 'all' , neighbours = 10 , checkpoint = None , resume = None ) :
+
+	"""
+	compute_transformations( trajectory_list , fimax , fimax_filter , lag_scan = 'exhaustive' , workers = 1 , cache = None , survivors = [ 8 , 8 ] , pairing = 'all' , neighbours = 10 , checkpoint = None , resume = None ): 
+	aligns together each pair of trajectories in trajectory_list with align_pair and returns the matrices of the transformations. As a convention the 
+	element i,j in the matrices contains the rototranslation and temporal shift to align the trajectory j to i, i being the reference. 
+	As the transformation matrices are symmetric, transformations are computed only for j < i and the other elements are 0.
+	If pairing = 'knn', only the pairs of trajectories that are among the 'neighbours' most similar trajectories of each other are aligned 
+	(see candidate_pairs in trajalign.pairing). The boolean matrix 'pairs' is True for the pairs i , j that were aligned, in both i , j and j , i, and the matrix 'scores' 
+	has their scores (see MSD).
+	The transformations also store the identities of the trajectories ('files', see trajectory_identity) and the options 
+	used to align them ('options': fimax, fimax_filter, lag_scan, survivors, pairing and neighbours), so that they can be 
+	saved and updated with the same options (see save_transformations and update_transformations).
+	If workers > 1 the pairs are distributed over a pool of 'workers' processes, and the alignments already in the 
+	AlignmentCache cache are not recomputed (see align_pairs).
+	checkpoint is a Checkpoint (see trajalign.checkpoint), or None. The partially filled transformations are saved in the 
+	checkpoint whenever it is due while the pairs are aligned, and once more when all the pairs are aligned. resume is the 
+	Checkpoint of an interrupted run, or None: the pairs that it contains are not aligned again. A checkpoint is resumed only 
+	if it was saved for the same trajectories, in the same order, and with the same fimax, fimax_filter, lag_scan, survivors, 
+	pairing and neighbours.
+	"""
+
+	l = len( trajectory_list )
+
+	if ( fimax ) :
+
+		trajectories = [ t.fimax( fimax_filter ) for t in trajectory_list ]
+
+	else :
+
+		trajectories = trajectory_list
+
+	options = transformation_options( fimax , fimax_filter , lag_scan , survivors , pairing , neighbours )
+
+	if pairing == 'knn' :
+
+		pairs = candidate_pairs( trajectories , neighbours )
+
+	else :
+
+		pairs = [ ( i , j ) for i in range( l ) for j in range( i ) ]
+
+	#Create a matrix with all the transformations: angle, lag and center of masses. 
+	transformations = {
+			'angles' : np.zeros( ( l , l ) ),
+			'rcs' : np.zeros( ( l , l , 2 ) ),#note that the matric rcs is the transpose of the lcs
+			'lcs' : np.zeros( ( l , l , 2 ) ),
+			'lags' : np.zeros( ( l , l ) , dtype = 'int64' ),
+			'pairs' : np.zeros( ( l , l ) , dtype = 'bool' ),
+			'scores' : np.zeros( ( l , l ) ),
+			'files' : [ trajectory_identity( t ) for t in trajectory_list ],
+			'options' : options
+			}
+
+	progress = None
+
+	if ( checkpoint is not None ) or ( resume is not None ) :
+
+		key = alignment_fingerprint( trajectory_list , options )
+
+	if resume is not None :
+
+		resumed = resume.load( key )
+
+		if resumed is None :
+
+			logger.warning( 'compute_transformations: there is no checkpoint to resume in ' + resume.file_name + '; all the pairs are aligned' )
+
+		else :
+
+			for a in [ 'angles' , 'rcs' , 'lcs' , 'lags' , 'pairs' , 'scores' ] :
+
+				transformations[ a ] = resumed[ a ]
+
+			pairs = [ ( i , j ) for i , j in pairs if not transformations[ 'pairs' ][ i , j ] ]
+			logger.info( 'Resume the transformations in ' + resume.file_name + ': ' + str( int( np.sum( np.tril( transformations[ 'pairs' ] , -1 ) ) ) ) + ' pairs were already aligned' )
+
+	if checkpoint is not None :
+
+		def progress( alignments ) :
+
+			if checkpoint.due() :
+
+				fill_transformations( transformations , alignments )
+				checkpoint.save( transformations , key )
+
+	work.add( 'pairs_skipped' , l * ( l - 1 ) // 2 - len( pairs ) )
+
+	alignments = align_pairs( trajectories , pairs , lag_scan , workers , cache , options , survivors , progress )
+
+	pruned_lags = sum( [ a.get( 'pruned_lags' , 0 ) for a in alignments.values() ] )
+	if pruned_lags > 0 :
+
+		logger.info( '\nlag_scan = ' + lag_scan + ': ' + str( pruned_lags ) + ' lags were pruned from the scans.' )
+
+	if ( fimax ) :
+
+		logger.info('\nfimax = True; Transformations were computed using only the trajectory information up to the max in fluorescence intensity.')
+
+	logger.info('________________')
+
+	fill_transformations( transformations , alignments )
+
+	if checkpoint is not None :
+
+		checkpoint.save( transformations , key )
+
+	if pairing == 'knn' :
+
+		pairing_report( transformations[ 'pairs' ] )
+
+	return( transformations )
+
+def run_shards( directory , stale_after = 600 , wait = 60 ) :
+
+	"""
+	run_shards( directory , stale_after = 600 , wait = 60 ): works on the queue of shards of pairs of trajectories in directory 
+	(see sharded_transformations and ShardQueue in trajalign.shards): claims the shards that are neither completed nor locked 
+	(or whose lock is older than stale_after seconds), one at the time, aligns their pairs with align_pair and writes their 
+	alignments, until no shard can be claimed. Any number of run_shards, on any host that shares the directory, can work on 
+	the same queue, e.g. python -c "from trajalign.average import run_shards; run_shards( 'shards' )". If the queue has not 
+	been created yet, run_shards waits for it up to wait seconds. Returns the number of shards completed.
+	"""
+
+	queue = ShardQueue( directory , stale_after )
+	start = time.time()
+
+	while not queue.exists() :
+
+		if time.time() - start > wait :
+
+			raise FileNotFoundError( 'run_shards: there is no queue of shards in ' + directory )
+
+		time.sleep( 1 )
+
+	manifest = queue.manifest()
+	trajectories = queue.trajectories()
+	completed = 0
+
+	claimed = queue.claim()
+
+	while claimed is not None :
+
+		shard , pairs = claimed
+		logger.info( 'Align the ' + str( len( pairs ) ) + ' pairs of trajectories of the shard ' + shard + ' in ' + directory )
+
+		#the work of the shard is written with its alignments and is counted by the process that reduces the shards
+		start_work = work.copy()
+		alignments = {}
+
+		#the lock of the shard is refreshed by a thread while its pairs are aligned
+		with queue.heartbeats( shard ) :
+
+			for i , j in pairs :
+
+				logger.debug( 'ref. traj.:\t' + trajectories[ i ].annotations()['file'] )
+				logger.debug( 'aligned traj.:\t' + trajectories[ j ].annotations()['file'] )
+
+				alignments[ ( i , j ) ] = align_pair( trajectories[ i ] , trajectories[ j ] , manifest[ 'lag_scan' ] , manifest[ 'survivors' ] )
+
+		queue.complete( shard , alignments , work - start_work )
+		work.reset()
+		work.update( start_work )
+		completed += 1
+
+		claimed = queue.claim()
+
+	return( completed )
+
+def sharded_transformations( trajectory_list , directory , fimax , fimax_filter , lag_scan = 'exhaustive' , workers = 1 , survivors = [ 8 , 8 ] , pairing = 'all' , neighbours = 10 , shard_size = 64 , stale_after = 600 , poll = 10 ) :
+
+	"""
+	sharded_transformations( trajectory_list , directory , fimax , fimax_filter , lag_scan = 'exhaustive' , workers = 1 , survivors = [ 8 , 8 ] , pairing = 'all' , neighbours = 10 , shard_size = 64 , stale_after = 600 , poll = 10 ): 
+	computes the same transformations as compute_transformations, through a queue of shards of shard_size pairs of 
+	trajectories written in directory (see ShardQueue in trajalign.shards), which can be shared by many hosts. The 
+	pairs are aligned by run_shards: by 'workers' processes started here, and by any other run_shards that works on the 
+	same directory, e.g. on the other nodes of a cluster with a shared filesystem. When all the shards are completed, 
+	their alignments are reduced into the matrices of the transformations, and the work done by all the workers is added 
+	to the counters of this process. If directory already contains the queue of the same trajectories and options (see 
+	alignment_fingerprint), e.g. of an interrupted run, only the shards that are not completed are aligned; a queue of 
+	other trajectories or options is refused. The directory is not removed.
+	"""
+
+	l = len( trajectory_list )
+
+	if ( fimax ) :
+
+		trajectories = [ t.fimax( fimax_filter ) for t in trajectory_list ]
+
+	else :
+
+		trajectories = trajectory_list
+
+	options = transformation_options( fimax , fimax_filter , lag_scan , survivors , pairing , neighbours )
+	key = alignment_fingerprint( trajectory_list , options )
+	queue = ShardQueue( directory , stale_after )
+
+	if queue.exists() :
+
+		if queue.manifest()[ 'fingerprint' ] != key :
+
+			raise AttributeError( 'sharded_transformations: the shards in ' + directory + ' were created for other trajectories or alignment options. Please, use the same trajectories and options or choose another directory' )
+
+		logger.info( 'Join the queue of shards in ' + directory + ': ' + str( len( queue.pending() ) ) + ' shards out of ' + str( len( queue.shards() ) ) + ' are not completed' )
+
+	else :
+
+		if pairing == 'knn' :
+
+			pairs = candidate_pairs( trajectories , neighbours )
+
+		else :
+
+			pairs = [ ( i , j ) for i in range( l ) for j in range( i ) ]
+
+		#the most expensive pairs come first, so that the last shards to be claimed are the fastest to align. The cost of 
+		#aligning two trajectories grows with the product of their lengths.
+		pairs = sorted( pairs , key = lambda p : len( trajectories[ p[ 0 ] ] ) * len( trajectories[ p[ 1 ] ] ) , reverse = True )
+
+		queue.create( trajectories , pairs , { 'fingerprint' : key , 'lag_scan' : lag_scan , 'survivors' : [ int( n ) for n in survivors ] , 'pairs' : len( pairs ) } , shard_size )
+		logger.info( str( len( pairs ) ) + ' pairs of trajectories split in ' + str( len( queue.shards() ) ) + ' shards in ' + directory )
+
+	work.add( 'pairs_skipped' , l * ( l - 1 ) // 2 - queue.manifest()[ 'pairs' ] )
+
+	#the shards are aligned here and by any other run_shards on the same directory; the shards claimed by others are 
+	#waited for, and claimed again if their lock becomes stale.
+	while len( queue.pending() ) > 0 :
+
+		if workers == 1 :
+
+			completed = run_shards( directory , stale_after , wait = 0 )
+
+		else :
+
+			with ProcessPoolExecutor( max_workers = workers ) as pool :
+
+				completed = sum( pool.map( run_shards , [ directory ] * workers , [ stale_after ] * workers , [ 0 ] * workers ) )
+
+		pending = len( queue.pending() )
+
+		if ( completed == 0 ) and ( pending > 0 ) :
+
+			logger.info( 'Wait for ' + str( pending ) + ' shards claimed by other workers' )
+			time.sleep( poll )
+
+	alignments , counts = queue.results()
+	work.update( counts )
+
+	pruned_lags = sum( [ a.get( 'pruned_lags' , 0 ) for a in alignments.values() ] )
+	if pruned_lags > 0 :
+
+		logger.info( '\nlag_scan = ' + lag_scan + ': ' + str( pruned_lags ) + ' lags were pruned from the scans.' )
+
+	logger.info('________________')
+
+	transformations = {
+			'angles' : np.zeros( ( l , l ) ),
+			'rcs' : np.zeros( ( l , l , 2 ) ),
+			'lcs' : np.zeros( ( l , l , 2 ) ),
+			'lags' : np.zeros( ( l , l ) , dtype = 'int64' ),
+			'pairs' : np.zeros( ( l , l ) , dtype = 'bool' ),
+			'scores' : np.zeros( ( l , l ) ),
+			'files' : [ trajectory_identity( t ) for t in trajectory_list ],
+			'options' : options
+			}
+
+	fill_transformations( transformations , alignments )
+
+	if pairing == 'knn' :
+
+		pairing_report( transformations[ 'pairs' ] )
+
+	return( transformations )
+
+def fill_transformations( transformations , alignments ) :
+
+	#input the alignments of the pairs ( i , j ) in the matrices of the transformations
+	for i , j in alignments.keys() :
+
+		transformations[ 'angles' ][ i , j ] = alignments[ ( i , j ) ][ 'angle' ]
+		transformations[ 'rcs' ][ i , j ] = alignments[ ( i , j ) ][ 'rc' ]
+		transformations[ 'lcs' ][ i , j ] = alignments[ ( i , j ) ][ 'lc' ]
+		transformations[ 'lags' ][ i , j ] = alignments[ ( i , j ) ][ 'lag' ]
+		transformations[ 'pairs' ][ i , j ] = True
+		transformations[ 'pairs' ][ j , i ] = True
+		transformations[ 'scores' ][ i , j ] = alignments[ ( i , j ) ][ 'score' ]
+		transformations[ 'scores' ][ j , i ] = alignments[ ( i , j ) ][ 'score' ]
+
+def complete_transformations( transformations ) :
+
+	"""
+	complete_transformations( transformations ): fills the angles and lags of the pairs of trajectories that were not aligned 
+	(see pairing in compute_transformations) by chaining the transformations of the aligned pairs. transformations are the 
+	antisymmetric transformations used in average_trajectories, where the element i , j aligns j to i and the element j , i 
+	is its opposite. The trajectories are visited breadth first along the aligned pairs and each is given the angle and 
+	lag that align it to the first trajectory; the angle (or lag) of a missing pair i , j is the difference between those 
+	of i and j. The angles and lags of the aligned pairs do not change. The pairs must connect all the trajectories.
+	"""
+
+	pairs = transformations[ 'pairs' ]
+	l = len( pairs )
+
+	i , j = np.nonzero( np.tril( pairs , -1 ) )
+	if components( list( zip( i , j ) ) , l )[ 0 ] > 1 :
+
+		raise AttributeError( 'complete_transformations: the aligned pairs do not connect all the trajectories (see pairing_report)' )
+
+	angles = tree_potentials( pairs , transformations[ 'angles' ] )
+	lags = tree_potentials( pairs , transformations[ 'lags' ] )
+
+	missing = ~ pairs
+	np.fill_diagonal( missing , False )
+
+	transformations[ 'angles' ][ missing ] = ( angles[ : , None ] - angles[ None , : ] )[ missing ]
+	transformations[ 'lags' ][ missing ] = ( lags[ : , None ] - lags[ None , : ] )[ missing ]
+
+def update_transformations( transformations , trajectory_list , lag_scan = 'exhaustive' , workers = 1 , cache = None , survivors = [ 8 , 8 ] , pairing = 'all' , neighbours = 10 ) :
+
+	"""
+	update_transformations( transformations , trajectory_list , lag_scan = 'exhaustive' , workers = 1 , cache = None , survivors = [ 8 , 8 ] , pairing = 'all' , neighbours = 10 ): 
+	updates the transformations computed by compute_transformations for a new list of trajectories. The rows and columns of the 
+	trajectories that are not in trajectory_list anymore are removed, and only the pairs that were not aligned yet are aligned 
+	(with pairing = 'all', the pairs with the trajectories that are new; with pairing = 'knn', the candidate pairs of 
+	candidate_pairs), with the same options used for the transformations. Trajectories are matched by their identity 
+	(see trajectory_identity). Returns the trajectories, ordered as in the updated transformations (the trajectories 
+	that were already aligned come first, followed by the new ones), and the updated transformations.
+	lag_scan, survivors, pairing and neighbours must be those used to compute the transformations (see 'options' in 
+	compute_transformations), otherwise the new pairs would not be aligned as the others.
+	"""
+
+	options = transformation_options( transformations[ 'options' ][ 'fimax' ] , transformations[ 'options' ][ 'fimax_filter' ] , lag_scan , survivors , pairing , neighbours )
+
+	for o in options.keys() :
+
+		if transformations[ 'options' ].get( o ) != options[ o ] :
+
+			raise AttributeError( 'update_transformations: the transformations were computed with ' + o + ' = ' + str( transformations[ 'options' ].get( o ) ) + ' instead of ' + str( options[ o ] ) )
+
+	ids = [ trajectory_identity( t ) for t in trajectory_list ]
+
+	if len( set( ids ) ) != len( ids ) :
+
+		raise AttributeError( 'update_transformations: two or more trajectories in the list have the same identity (see trajectory_identity)' )
+
+	old_ids = list( transformations[ 'files' ] )
+	position = { ids[ j ] : j for j in range( len( ids ) ) }
+
+	kept = [ i for i in range( len( old_ids ) ) if old_ids[ i ] in position.keys() ]
+	new = [ j for j in range( len( ids ) ) if ids[ j ] not in old_ids ]
+
+	trajectories = [ trajectory_list[ position[ old_ids[ i ] ] ] for i in kept ] + [ trajectory_list[ j ] for j in new ]
+
+	l = len( trajectories )
+	k = len( kept )
+	idx = np.array( kept , dtype = 'int64' )
+
+	output = {
+			'angles' : np.zeros( ( l , l ) ),
+			'rcs' : np.zeros( ( l , l , 2 ) ),
+			'lcs' : np.zeros( ( l , l , 2 ) ),
+			'lags' : np.zeros( ( l , l ) , dtype = 'int64' ),
+			'pairs' : np.zeros( ( l , l ) , dtype = 'bool' ),
+			'scores' : np.zeros( ( l , l ) ),
+			'files' : [ trajectory_identity( t ) for t in trajectories ],
+			'options' : cp.deepcopy( transformations[ 'options' ] )
+			}
+
+	#the trajectories that are kept do not change their relative order, hence their transformations are 
+	#still computed for j < i.
+	for a in [ 'angles' , 'rcs' , 'lcs' , 'lags' , 'pairs' , 'scores' ] :
+
+		output[ a ][ : k , : k ] = transformations[ a ][ np.ix_( idx , idx ) ]
+
+	if output[ 'options' ][ 'fimax' ] :
+
+		aligned_trajectories = [ t.fimax( output[ 'options' ][ 'fimax_filter' ] ) for t in trajectories ]
+
+	else :
+
+		aligned_trajectories = trajectories
+
+	if pairing == 'knn' :
+
+		pairs = [ ( i , j ) for i , j in candidate_pairs( aligned_trajectories , neighbours ) if not output[ 'pairs' ][ i , j ] ]
+
+	else :
+
+		pairs = [ ( i , j ) for i in range( l ) for j in range( i ) if not output[ 'pairs' ][ i , j ] ]
+
+	work.add( 'pairs_skipped' , l * ( l - 1 ) // 2 - len( pairs ) )
+
+	fill_transformations( output , align_pairs( aligned_trajectories , pairs , lag_scan , workers , cache , output[ 'options' ] , survivors ) )
+
+	logger.info( 'update_transformations: ' + str( len( old_ids ) - k ) + ' trajectories removed, ' + str( l - k ) + ' trajectories added and ' + str( len( pairs ) ) + ' new pairs aligned.' )
+
+	if pairing == 'knn' :
+
+		pairing_report( output[ 'pairs' ] )
+
+	return( trajectories , output )
+
+def partial_average( t ) :
+
+	"""
+	partial_average( t ): the partial average of the trajectory t alone, i.e. a trajectory with the frames, time, coordinates
+	and fluorescence intensity of t and the number 'n' of trajectories (1 or 0 if the coordinates are nan) averaged in each
+	time point (see progressive_transformations).
+	"""
+
+	output = Traj( file = t.annotations()[ 'file' ] , delta_t = t.annotations()[ 'delta_t' ] )
+	output.input_values( 'frames' , t.frames() )
+	output.input_values( 't' , t.t() )
+	output.input_values( 'coord' , t.coord() )
+	output.input_values( 'f' , t.f() )
+	output.input_values( 'n' , ( ~ np.isnan( t.coord()[ 0 ] ) & ~ np.isnan( t.coord()[ 1 ] ) ).astype( 'float64' ) )
+
+	return( output )
+
+def merge_partial_averages( a , b ) :
+
+	"""
+	merge_partial_averages( a , b ): merges the partial averages a and b, already aligned together, into the partial average of
+	all their trajectories. Coordinates and fluorescence intensities are averaged in each frame with the weights of the numbers 
+	'n' of trajectories averaged in a and b, so that the merged average is the mean of all the trajectories.
+	"""
+
+	delta_t = float( a.annotations()[ 'delta_t' ] )
+	f0 = min( a.frames()[ 0 ] , b.frames()[ 0 ] )
+	frames = np.arange( f0 , max( a.frames()[ -1 ] , b.frames()[ -1 ] ) + 1 )
+
+	n = np.zeros( ( 2 , len( frames ) ) )
+	coord = np.zeros( ( 2 , 2 , len( frames ) ) )
+	f = np.zeros( ( 2 , len( frames ) ) )
+	n_f = np.zeros( ( 2 , len( frames ) ) )
+
+	for k , t in zip( range( 2 ) , [ a , b ] ) :
+
+		i = t.frames() - f0
+		n[ k , i ] = t.n()
+		coord[ k ][ : , i ] = np.nan_to_num( t.coord() ) * t.n()
+		n_f[ k , i ] = t.n() * ~ np.isnan( t.f() )
+		f[ k , i ] = np.nan_to_num( t.f() ) * n_f[ k , i ]
+
+	with wr.catch_warnings():
+		# frames where no trajectory is defined are 0 / 0, and are nan.
+		wr.simplefilter("ignore", category=RuntimeWarning)
+		merged_coord = np.sum( coord , axis = 0 ) / np.sum( n , axis = 0 )
+		merged_f = np.sum( f , axis = 0 ) / np.sum( n_f , axis = 0 )
+
+	output = Traj( file = a.annotations()[ 'file' ] , delta_t = a.annotations()[ 'delta_t' ] )
+	output.input_values( 'frames' , frames )
+	output.input_values( 't' , a.t()[ 0 ] + ( frames - a.frames()[ 0 ] ) * delta_t )
+	output.input_values( 'coord' , merged_coord )
+	output.input_values( 'f' , merged_f )
+	output.input_values( 'n' , np.sum( n , axis = 0 ) )
+
+	return( output )
+
+def progressive_transformations( trajectory_list , fimax , fimax_filter , lag_scan = 'exhaustive' , survivors = [ 8 , 8 ] ) :
+
+	"""
+	progressive_transformations( trajectory_list , fimax , fimax_filter , lag_scan = 'exhaustive' , survivors = [ 8 , 8 ] ): aligns 
+	the trajectories progressively, as in progressive multiple sequence alignments. The trajectories are merged pairwise along 
+	a guide tree built from their features (see guide_tree in trajalign.pairing): at each node of the tree the partial average 
+	of one branch is aligned to the partial average of the other branch, with the most trajectories, by align_pair and the two 
+	are merged (see merge_partial_averages). Each trajectory thus follows the alignments of its branches up to the root of the 
+	tree, whose partial average is the average of all the trajectories. Only len( trajectory_list ) - 1 pairs are aligned.
+	Returns the angle, lag and centre of each trajectory, in the same format as synchronize_transformations (see 
+	trajalign.synchronization), and the number of 'alignments'.
+	"""
+
+	l = len( trajectory_list )
+
+	nodes = [ partial_average( t ) for t in trajectory_list ]
+	leaves = [ [ j ] for j in range( l ) ]
+
+	#each trajectory j is aligned to the partial average of its node by rotating it by alpha[ j ],
+	#translating it by tau[ j ] and lagging it by kappa[ j ]
+	alpha = np.zeros( l )
+	tau = np.zeros( ( l , 2 ) )
+	kappa = np.zeros( l , dtype = 'int64' )
+
+	for a , b , distance , size in guide_tree( trajectory_list ) :
+
+		a , b = int( a ) , int( b )
+
+		#the partial average with less trajectories is aligned to the other
+		if len( leaves[ b ] ) > len( leaves[ a ] ) :
+			a , b = b , a
+
+		if fimax :
+			alignment = align_pair( nodes[ a ].fimax( fimax_filter ) , nodes[ b ].fimax( fimax_filter ) , lag_scan , survivors )
+		else :
+			alignment = align_pair( nodes[ a ] , nodes[ b ] , lag_scan , survivors )
+
+		theta , lc , rc , lag = alignment[ 'angle' ] , alignment[ 'lc' ] , alignment[ 'rc' ] , int( alignment[ 'lag' ] )
+
+		aligned = cp.deepcopy( nodes[ b ] )
+		aligned.translate( - lc )
+		aligned.rotate( theta )
+		aligned.translate( rc )
+		aligned.lag( lag )
+		aligned.input_values( 'frames' , aligned.frames() + lag )
+
+		rotation = np.array( [[ np.cos( theta ) , - np.sin( theta ) ] , [ np.sin( theta ) , np.cos( theta ) ]] )
+
+		for j in leaves[ b ] :
+
+			alpha[ j ] = alpha[ j ] + theta
+			tau[ j ] = rotation @ ( tau[ j ] - lc ) + rc
+			kappa[ j ] = kappa[ j ] + lag
 
-					t.input_values( a ,
-							np.nanmedian( attributes_to_be_averaged[ a ], axis = 0 )
-						)
+		nodes.append( merge_partial_averages( nodes[ a ] , aligned ) )
+		leaves.append( leaves[ a ] + leaves[ b ] )
 
-				else :
+	output = common_frame_transformations( alpha , tau , kappa )
+	output[ 'alignments' ] = max( l - 1 , 0 )
 
-					t.input_values( a ,
-							np.nanmean( attributes_to_be_averaged[ a ], axis = 0 )
-						)
+	return( output )
 
-				#if there is no n defined yet, it computes it
-				if not t.n().any() : 
-					#compute the number of not-nan data points by dividing
-					#the nansum by the nanmean. The operation is performed
-					#on the last attribute in the loop that can either have 
-					#two dimensions (as 'coord') or one. In case of two dims
-					#only one is used to compute '_n'.
-					
-					x = np.nanmean( attributes_to_be_averaged[ a ] , axis = 0 )
-					y = np.nansum( attributes_to_be_averaged[a] , axis = 0 )
-			
-					if len(x) == 2:
-						t.input_values( 'n' , y[0]/x[0] )
-					else:
-						with wr.catch_warnings():
-							# if both y[i] and x[i] are 0, then a waring is outputed. Here we suppress such warnings.
-							wr.simplefilter("ignore", category=RuntimeWarning)
-							t.input_values( 'n' , y/x )
+def common_frame_transformations( alpha , tau , kappa ) :
 
-				#compute the errors as standard errors of the mean/median
-				try :
-					if median :
+	"""
+	common_frame_transformations( alpha , tau , kappa ): converts the rototranslations that bring each trajectory j in a common 
+	frame, x -> R( alpha[ j ] ) x + tau[ j ] with its frames lagged by kappa[ j ], in the angles, lags and centres used by 
+	compute_average (see synchronize_transformations in trajalign.synchronization): angles = - alpha, lags = - kappa and 
+	centres = - R( - alpha[ j ] ) tau[ j ]. The trajectories aligned to any reference then differ from those in the common 
+	frame by a rototranslation that is the same for all the trajectories.
+	"""
 
-						t.input_values( a + '_err' ,
-							nanMAD( attributes_to_be_averaged[ a ], axis = 0 ) / np.sqrt( t.n() )
-							)
+	centres = - np.stack( [ np.cos( alpha ) * tau[ : , 0 ] + np.sin( alpha ) * tau[ : , 1 ] , - np.sin( alpha ) * tau[ : , 0 ] + np.cos( alpha ) * tau[ : , 1 ] ] , axis = 1 )
 
-					else :
+	return( { 'angles' : - alpha , 'lags' : - kappa , 'centres' : centres } )
 
-						t.input_values( a + '_err' ,
-							np.nanstd( attributes_to_be_averaged[ a ], axis = 0 ) / np.sqrt( t.n() )
-							)
+def align_to_average( average , trajectory_list , fimax , fimax_filter , lag_scan = 'exhaustive' , workers = 1 , survivors = [ 8 , 8 ] ) :
 
-				except :
+	"""
+	align_to_average( average , trajectory_list , fimax , fimax_filter , lag_scan = 'exhaustive' , workers = 1 , survivors = [ 8 , 8 ] ): 
+	aligns each trajectory in trajectory_list to the average trajectory 'average' with align_pair, distributing the alignments 
+	over 'workers' processes (see align_pairs), and returns the angles, lags and centres that align the trajectories together 
+	in the frame of the average (see common_frame_transformations). The alignments are not cached, as the average changes at 
+	each iteration of strategy = 'iterative' in average_trajectories.
+	"""
 
-					raise AttributeError( 'The attribute ' + a + ' cannot have its error assigned' )
+	l = len( trajectory_list )
+	delta_t = float( average.annotations()[ 'delta_t' ] )
 
-			else :
+	#the average is aligned as a trajectory with frames, coordinates and fluorescence intensities
+	reference = Traj( file = 'average' , delta_t = average.annotations()[ 'delta_t' ] )
+	reference.input_values( 'frames' , np.rint( average.t() / delta_t ).astype( 'int64' ) )
+	reference.input_values( 't' , average.t() )
+	reference.input_values( 'coord' , average.coord() )
+	reference.input_values( 'f' , average.f() )
 
-				raise AttributeError( 'The attribute ' + a + ' is not recongnised as an attribute' )
+	trajectories = [ reference ] + list( trajectory_list )
 
-	return( t )
-#-------------------------------------END-OF-DEFINITION-of-trajectory_average-----------------------------------
+	if fimax :
+
+		trajectories = [ t.fimax( fimax_filter ) for t in trajectories ]
+
+	alignments = align_pairs( trajectories , [ ( 0 , j + 1 ) for j in range( l ) ] , lag_scan , workers , None , {} , survivors )
+
+	#the trajectory j is aligned to the average by R( angle ) ( x - lc ) + rc, i.e. R( angle ) x + rc - R( angle ) lc
+	alpha = np.array( [ alignments[ ( 0 , j + 1 ) ][ 'angle' ] for j in range( l ) ] )
+	lc = np.array( [ alignments[ ( 0 , j + 1 ) ][ 'lc' ] for j in range( l ) ] ).reshape( l , 2 )
+	rc = np.array( [ alignments[ ( 0 , j + 1 ) ][ 'rc' ] for j in range( l ) ] ).reshape( l , 2 )
+	kappa = np.array( [ alignments[ ( 0 , j + 1 ) ][ 'lag' ] for j in range( l ) ] , dtype = 'int64' )
 
-def average_trajectories( trajectory_list , output_file = 'average' , median = False , unify_start_end = False , max_frame=[] , fimax = False , fimax_filter = [ -3/35 , 12/35 , 17/35 , 12/35 , -3/35 ] ):
+	tau = rc - np.stack( [ np.cos( alpha ) * lc[ : , 0 ] - np.sin( alpha ) * lc[ : , 1 ] , np.sin( alpha ) * lc[ : , 0 ] + np.cos( alpha ) * lc[ : , 1 ] ] , axis = 1 )
+
+	return( common_frame_transformations( alpha , tau , kappa ) )
+
+@restores_verbosity
+def average_trajectories( trajectory_list , output_file = 'average' , median = False , unify_start_end = False , max_frame=[] , fimax = False , fimax_filter = [ -3/35 , 12/35 , 17/35 , 12/35 , -3/35 ] , lag_scan = 'exhaustive' , workers = 1 , transformations_file = None , cache = False , reference_selection = 'full' , survivors = [ 8 , 8 ] , pairing = 'all' , neighbours = 10 , solver = 'mean' , strategy = 'all_pairs' , max_iterations = 10 , tolerance = 1e-3 , line_fitter = 'ransac' , keep = 'best_and_worst' , verbose = 1 , timings_file = None , profile = False , checkpoint = None , checkpoint_interval = 600 , resume = None , shards = None , shard_size = 64 ):
 
 	"""
 	average_trajectories( trajectory_list , max_frame = 500 , output_file = 'average' , median = False ): align all the 
@@ -354,6 +1934,100 @@ def average_trajectories( trajectory_list , output_file = 'average' , median = F
 	a directory with all the raw trajectories that have been used to compute the average aligned together in space and time.
 	median is an option to compute the median instead of the average of the aligned trajectories. It is useful in case 
 	of noisy datasets.
+	lag_scan chooses how the alignments of each pair of trajectories are scanned over all lags: 'exhaustive' (default) computes
+	MSD lag by lag, while 'fft' computes all the lags at once with the cross-correlations in MSD_lags, which is equivalent up 
+	to rounding errors. 'fft' pays off only for long trajectories: it is slower than 'exhaustive' for trajectories shorter 
+	than about 300 time points (e.g. those of the examples), and about 1.2 to 1.4 times faster for trajectories of 400 to 
+	1600 time points (see lag_scan_report to measure it on a dataset). 'multiresolution' first scans the lags on decimated 
+	trajectories and aligns at full resolution only the lags around the best coarse lags: the number of lags kept at each 
+	level of decimation is given by survivors (default is [ 8 , 8 ]: two levels, decimated by 16 and 4). The decimated search 
+	is approximate and can miss the best lag, hence the lags that it did not align and whose lower bound of the score (see 
+	score_lower_bounds) is not larger than the best score found are aligned too (see certified_lags), so that the alignments 
+	are identical to those of 'exhaustive'. The levels at which the shortest trajectory of a pair would have less than 16 
+	decimated time points are skipped; if all are, all the lags are aligned. 
+	'branch_and_bound' skips the lags whose lower bound of the score (see score_lower_bounds) is larger than the best score 
+	already found, and gives results identical to 'exhaustive'.
+	workers is the number of processes among which the alignments of the pairs of trajectories are distributed (default is 1). 
+	The results do not depend on the number of workers. Note that on systems that spawn new processes (e.g. Windows and macOS), 
+	the scripts calling average_trajectories with workers > 1 must be protected by if __name__ == '__main__'.
+	transformations_file is the name of a file where the transformations between all the pairs of trajectories are 
+	saved (see save_transformations). If the file already exists, the transformations it contains are updated 
+	(see update_transformations): only the pairs with the trajectories that were not aligned yet are aligned, 
+	and the trajectories that are not in trajectory_list anymore are removed. The file is then saved again, so that 
+	it can be updated by the next call of average_trajectories. Note that the trajectories are matched by 
+	their files (see trajectory_identity) and that fimax, fimax_filter, lag_scan, survivors (with lag_scan = 'multiresolution'), 
+	pairing, neighbours (with pairing = 'knn') and reference_selection must be the same used to compute the transformations 
+	in the file, which stores them.
+	cache chooses whether the alignments of the pairs of trajectories are read from and stored in the on-disk cache of 
+	trajalign.cache, so that the same pairs are not aligned again in later runs (e.g. with different median, unify_start_end 
+	or max_frame). It can be False (default, no cache), the name of the directory of the cache, an AlignmentCache, whose 
+	max_size bounds the size of the cache, or True, for the cache in default_cache_directory() ($XDG_CACHE_HOME/trajalign 
+	or, if XDG_CACHE_HOME is not set, ~/.cache/trajalign), which can grow up to 100 MB.
+	reference_selection chooses how the reference trajectory of the average is selected: 'full' (default) computes the 
+	average with each trajectory as reference and selects the one with the best alignment precision, while 'fast' 
+	estimates the alignment precision of each reference directly from the transformations and builds only the averages 
+	of the best and worst references. 'fast' needs much less memory and time for large numbers of trajectories. The 
+	estimated alignment precisions can differ from those of 'full' in the last digits.
+	pairing chooses which pairs of trajectories are aligned together: 'all' (default) aligns every pair, while 'knn' aligns 
+	each trajectory only with its 'neighbours' (default is 10) most similar trajectories, found from cheap features of the 
+	trajectories in a nearest-neighbour index (see candidate_pairs in trajalign.pairing). The transformations between the 
+	pairs that are not aligned are chained from those of the aligned pairs (see complete_transformations), and the 
+	centres of mass of each trajectory are averaged over its aligned pairs only. 'knn' aligns O( N * neighbours ) pairs 
+	instead of O( N^2 ), and the connectivity of the aligned pairs is reported (see pairing_report). Note that the accuracy 
+	of the average depends on neighbours, as the errors of the chained transformations add up: few neighbours can make 
+	the average noticeably less precise than that of all the pairs, and a warning is output when the trajectories are 
+	aligned, on average, to fewer than 8 others.
+	solver chooses how the angle, lag and centre that align each trajectory to the reference are computed from the 
+	transformations of the pairs: 'mean' (default) averages the estimates from all the other trajectories, while 
+	'synchronization' estimates the angle, lag and centre of each trajectory at once from the aligned pairs (see 
+	synchronize_transformations in trajalign.synchronization). 'weighted_synchronization' also weights each pair with 
+	the number of time points over which its trajectories overlap divided by its score plus the median score (see 
+	pair_weights in trajalign.synchronization). The synchronizations do not need the transformations of the pairs that were not aligned 
+	(e.g. with pairing = 'knn') to be chained.
+	strategy chooses how the trajectories are aligned together: 'all_pairs' (default) aligns the pairs of trajectories chosen 
+	by pairing and computes the average with each trajectory as reference (see reference_selection), while 'progressive' 
+	merges the trajectories pairwise along a guide tree built from their features, aligning the partial averages of the 
+	branches at each node (see progressive_transformations). 'iterative' starts from the progressive average, aligns each 
+	trajectory to the current average (see align_to_average) and recomputes the average, until the relative change of 
+	the alignment precision is smaller than tolerance (default is 1e-3) or max_iterations (default is 10) are done. 
+	'progressive' aligns only N - 1 pairs of partial averages, and 'iterative' N more alignments per iteration; with 
+	both, pairing, solver, reference_selection and transformations_file are not used.
+	'line_fitter' is the robust estimator of the line along which the average is lied down (see lie_down in 
+	trajalign.orientation): 'ransac' (default), 'theil_sen' or 'weighted_pca'.
+	keep chooses which outputs are kept in memory and returned: 'best_and_worst' (default) returns the averages with the 
+	best and worst alignment precision and the dictionary of their aligned trajectories { 'best_score' , 'worst_score' }; 
+	'best' returns only the best average and aligned trajectories (the worst are None), and 'all' also returns the averages 
+	of all the references ( 'all_averages' ) and a generator of the trajectories aligned to each reference ( 'all_scores' ), 
+	which are built only when the generator reaches them. With 'best' and 'best_and_worst', the averages and the aligned 
+	trajectories of the other references are released as soon as their alignment precision is known, and with 'best' and 
+	reference_selection = 'fast' the average of the worst reference is not computed.
+	verbose chooses which messages are output (see set_verbosity in trajalign.log) during this call: 0 only the warnings, 1 
+	(default) the progress and the alignment precisions, and 2 also the debug messages, such as each pair of trajectories 
+	that is aligned. The wall time and CPU time of each stage of the run (load, pairwise, reduce, average, lie_down and save), 
+	and the peak memory of the process, are measured (see StageTimer in trajalign.log), summarised in the annotation 
+	'stage_timings' of the average trajectory and, if timings_file is given, written in it as JSON lines (default is None, 
+	no file is written).
+	The work done by the run (MSD evaluations, lags scanned and refined, deep copies of trajectories, extract calls, bytes 
+	allocated by the pairwise alignments, cache hits and misses and pairs skipped, see trajalign.counters) is returned as the 
+	WorkCounters 'statistics' of the dictionary of the aligned trajectories, written in timings_file and logged with verbose = 2.
+	profile chooses whether each stage is also profiled with cProfile (see StageTimer.save_profiles in trajalign.log): False 
+	(default), True (the profiles are saved in the directory profile of the output directory) or the directory where the 
+	profiles are saved. The profile of each stage is saved as <stage>.prof, and the functions that took the longest time 
+	are summarised in profile_summary.txt. With workers > 1, the profile of the pairwise stage is that of the main process.
+	checkpoint is the name of a file where the partially computed transformations are saved every checkpoint_interval 
+	seconds (default is 600) while the pairs of trajectories are aligned (see Checkpoint in trajalign.checkpoint), or None 
+	(default). resume is the checkpoint file of an interrupted run, or None (default): the pairs already aligned in it are not 
+	aligned again, and the checkpoints of this run are saved in it if checkpoint is None. If resume does not exist, all the 
+	pairs are aligned. A checkpoint saved for other trajectories (or the same trajectories in another order) or with other 
+	fimax, fimax_filter, lag_scan, survivors, pairing or neighbours is refused. Checkpoints are only used with 
+	strategy = 'all_pairs' and when the transformations are not updated from an existing transformations_file.
+	shards is the name of a directory, or None (default). If it is given, the pairs of trajectories are split in shards of 
+	shard_size pairs (default is 64) written in the directory, which are aligned by 'workers' processes and by any other 
+	run_shards working on the same directory, e.g. on other nodes of a cluster that share the filesystem (see 
+	sharded_transformations). Their alignments are then reduced into the transformations, and the average is computed 
+	as usual. A run interrupted with shards is restarted with the same directory, and only the shards that were not 
+	completed are aligned. shards is used with strategy = 'all_pairs' when the transformations are not updated from an 
+	existing transformations_file, and it does not use the cache, checkpoint and resume.
 	"""
 
 	if len(trajectory_list) == 0 : 
@@ -364,6 +2038,94 @@ def average_trajectories( trajectory_list , output_file = 'average' , median = F
 
 		raise TypeError('You need to specify the max_frame, which is the frame number in your movies')
 
+	if lag_scan not in ( 'exhaustive' , 'fft' , 'multiresolution' , 'branch_and_bound' ) :
+
+		raise AttributeError( "average_trajectories: Please, choose a value for the variable lag_scan between 'exhaustive' (default), 'fft', 'multiresolution' and 'branch_and_bound'" )
+
+	if ( len( survivors ) == 0 ) or any( [ ( not isinstance( n , int ) ) or ( n < 1 ) for n in survivors ] ) :
+
+		raise AttributeError( 'average_trajectories: survivors must be a list of integers larger than or equal to 1' )
+
+	if ( not isinstance( workers , int ) ) or ( workers < 1 ) :
+
+		raise AttributeError( 'average_trajectories: workers must be an integer larger than or equal to 1' )
+
+	if reference_selection not in ( 'full' , 'fast' ) :
+
+		raise AttributeError( "average_trajectories: Please, choose a value for the variable reference_selection between 'full' (default) and 'fast'" )
+
+	if pairing not in ( 'all' , 'knn' ) :
+
+		raise AttributeError( "average_trajectories: Please, choose a value for the variable pairing between 'all' (default) and 'knn'" )
+
+	if ( not isinstance( neighbours , int ) ) or ( neighbours < 1 ) :
+
+		raise AttributeError( 'average_trajectories: neighbours must be an integer larger than or equal to 1' )
+
+	if strategy not in ( 'all_pairs' , 'progressive' , 'iterative' ) :
+
+		raise AttributeError( "average_trajectories: Please, choose a value for the variable strategy between 'all_pairs' (default), 'progressive' and 'iterative'" )
+
+	if ( not isinstance( max_iterations , int ) ) or ( max_iterations < 1 ) :
+
+		raise AttributeError( 'average_trajectories: max_iterations must be an integer larger than or equal to 1' )
+
+	if ( ( checkpoint is not None ) and ( not isinstance( checkpoint , str ) ) ) or ( ( resume is not None ) and ( not isinstance( resume , str ) ) ) :
+
+		raise AttributeError( 'average_trajectories: checkpoint and resume must be the name of a checkpoint file or None' )
+
+	if ( not isinstance( checkpoint_interval , ( int , float ) ) ) or ( checkpoint_interval < 0 ) :
+
+		raise AttributeError( 'average_trajectories: checkpoint_interval must be a number of seconds larger than or equal to 0' )
+
+	if ( ( checkpoint is not None ) or ( resume is not None ) ) and ( strategy != 'all_pairs' ) :
+
+		raise AttributeError( "average_trajectories: checkpoint and resume can only be used with strategy = 'all_pairs'" )
+
+	if ( shards is not None ) and ( ( not isinstance( shards , str ) ) or ( strategy != 'all_pairs' ) or ( checkpoint is not None ) or ( resume is not None ) ) :
+
+		raise AttributeError( "average_trajectories: shards must be the name of a directory, and can only be used with strategy = 'all_pairs' and without checkpoint and resume" )
+
+	if ( not isinstance( shard_size , int ) ) or ( shard_size < 1 ) :
+
+		raise AttributeError( 'average_trajectories: shard_size must be an integer larger than or equal to 1' )
+
+	set_verbosity( verbose )
+	if not isinstance( profile , ( bool , str ) ) :
+
+		raise AttributeError( 'average_trajectories: profile must be True, False or the directory where the profiles are saved' )
+
+	timer = StageTimer( profile = profile , function = 'average_trajectories' , output_file = output_file , trajectories = len( trajectory_list ) , strategy = strategy , lag_scan = lag_scan , workers = workers )
+	start_work = work.copy()
+
+	if keep not in ( 'best' , 'best_and_worst' , 'all' ) :
+
+		raise AttributeError( "average_trajectories: Please, choose a value for the variable keep between 'best_and_worst' (default), 'best' and 'all'" )
+
+	if line_fitter not in line_fitters.keys() :
+
+		raise AttributeError( "average_trajectories: Please, choose a value for the variable line_fitter between 'ransac' (default), 'theil_sen' and 'weighted_pca'" )
+
+	if solver not in ( 'mean' , 'synchronization' , 'weighted_synchronization' ) :
+
+		raise AttributeError( "average_trajectories: Please, choose a value for the variable solver between 'mean' (default), 'synchronization' and 'weighted_synchronization'" )
+
+	if cache is True :
+
+		cache = AlignmentCache()
+
+	elif cache is False :
+
+		cache = None
+
+	elif isinstance( cache , str ) :
+
+		cache = AlignmentCache( cache )
+
+	elif not isinstance( cache , AlignmentCache ) :
+
+		raise AttributeError( 'average_trajectories: cache must be True, False, the directory of the cache or an AlignmentCache' )
+
 	def R(alpha):
 		"""
 		R(alpha): returns the rotation matrix:
@@ -389,27 +2151,6 @@ def average_trajectories( trajectory_list , output_file = 'average' , median = F
 		
 		return(s)
 
-	def triplicate_trajectory( t ):
-		#triplicate t adding itself at its beginning and at its end
-	
-		output = cp.deepcopy( t )
-	
-		#anticipate the start of trajectory by the trajectory duration and a time interval (you need one time interval
-		#between the beginning of the real trajectory and the last point of the "anticipated" bit.
-		#as len(t) is the number of frames + 1, then len(t) *dt is the duration of the trajectory + one dt interval, which is needed to
-		#separate the duplicate trajectory form the original trajectory
-		output.start( t.start() - ( len( t ) * float(t.annotations()['delta_t']) ) )
-		#delay the end of trajectory in the same way 
-		output.end( t.end() + ( len( t ) * float(t.annotations()['delta_t']) ) )
-		
-		#coord
-		output.coord()[:,0:len(t)] = t.coord()
-		output.coord()[:,( len(output) - len(t) ):len(output)] = t.coord()
-		#f	
-		output.f()[0:len(t)] = t.f()
-		output.f()[( len(output) - len(t) ):len(output)] = t.f()
-
-		return(output)
 	def meanangle(angle_estimates):
 		
 		#angles can be identical +- n * pi. Hence, averaging 
@@ -429,208 +2170,136 @@ def average_trajectories( trajectory_list , output_file = 'average' , median = F
 		
 		return( mean_angle )
 
-	def refine_alignment( t1 , t2 , lag , alignments , WeightTrajOverlap = False ):
+	#-------------------------------------END-OF-DEFINITIONS-in-average_trajectories-----------------------------------
 
-		t1_frames = t1.frames()
-		t2_frames = t2.frames() + lag
+	def estimate_alignment_precision( trajectory_list , transformations , median , max_frame ) :
 
-		sel_t1 = [ i for i in range( len(t1_frames) ) if t1_frames[i] in t2_frames ]
-		sel_t2 = [ i for i in range( len(t2_frames) ) if t2_frames[i] in t1_frames ]
-	
-		if ( len(sel_t1) > 0 ) & ( len(sel_t2) > 0 ) :
+		#estimate the alignment precision that compute_average would output for each reference 
+		#trajectory without building the averages. The trajectories aligned to each reference
+		#are stored in a dense array, whose rows are the trajectories and whose columns are the
+		#frames, and the errors of the average are computed directly along the rows.
+		#The translation r_cm is the same for all the trajectories aligned to a reference and
+		#does not change the errors, hence it is not applied.
 
-			alignments.append(
-					MSD( t1.extract( sel_t1 ) , t2.extract( sel_t2 ) )
-					)
-			alignments[ len( alignments ) - 1][ 'lag' ] = lag
-	
-			if WeightTrajOverlap :
-				#the scores are weighted with the number of datapoints of the two trajectoreis that
-				#trajectories (for example, trajectories that overlap with two data points only).
-				
-				alignments[ len( alignments ) - 1 ][ 'score' ] =\
-						alignments[ len( alignments ) - 1 ][ 'score' ] / np.sqrt( len( sel_t1 ) )
-		return()
+		if synchronized is None :
+			rcs = transformations['rcs'] + np.transpose(transformations['lcs'],axes=(1,0,2))
 
-	def lie_down( t ):
-		translation_vector = ( - np.nanmedian( t.coord()[0] ) ,- np.nanmedian( t.coord()[1] ) )
-		t.translate( translation_vector )
-		
-		I_xx = np.nansum( t.f() * t.coord()[1] ** 2 )
-		I_yy = np.nansum( t.f() * t.coord()[0] ** 2 )
-		I_xy = np.nansum( t.f() * t.coord()[0] * t.coord()[1] )
-		
-		theta = np.arctan2( 2 * I_xy , I_xx - I_yy ) / 2
+		l = len( trajectory_list )
+		delta_t = float( trajectory_list[ 0 ].annotations()[ 'delta_t' ] )
 
-		I_x = I_xx + I_xy * np.tan( theta ) 
-		I_y = I_yy - I_xy * np.tan( theta )
-	
-		if I_x > I_y : theta = theta - np.pi/2
-		t.rotate( theta )
+		#the points of all the trajectories are concatenated, and each point knows its trajectory
+		points = np.concatenate( [ np.full( len( t ) , j , dtype = 'int64' ) for j , t in zip( range( l ) , trajectory_list ) ] )
+		frames = np.concatenate( [ np.rint( t.t() / delta_t ).astype( 'int64' ) for t in trajectory_list ] )
+		if synchronized is None :
+			centres = [ np.mean( rcs[ j ][ transformations['pairs'][ j ] ] , axis = 0 ) for j in range( l ) ]
+		else :
+			centres = synchronized[ 'centres' ]
+		coord = np.concatenate( [ t.coord() - centres[ j ][ : , None ] for j , t in zip( range( l ) , trajectory_list ) ] , axis = 1 )
+		starts = np.array( [ t.start() for t in trajectory_list ] )
+		ends = np.array( [ t.end() for t in trajectory_list ] )
 
-		with wr.catch_warnings():
-			# if a coord has nan then a waring is outputed when nan > 0 or nan < 0 is asked. Here we suppress such warnings.
-			wr.simplefilter("ignore", category=RuntimeWarning)
-			A = np.nanmedian( t.coord()[0][ t.coord()[0] > 0 ] ** 2 )
-			B = np.nanmedian( t.coord()[0][ t.coord()[0] < 0 ] ** 2 )
+		alignment_precision = []
 
-			if B > A : 
-				t.rotate( np.pi )
-				theta = theta + np.pi #to ouptput the angle
-		
-		model = linear_model.LinearRegression()	
-		model_RANSACR = linear_model.RANSACRegressor( model , random_state = 42 )
-		
-		l = len( t )
-		
-		j = 0
-		for i in range( l ) :
-			
-			if ( not np.isnan( t.coord()[ 0 ][ i ] ) ) & ( not np.isnan( t.coord()[ 1 ][ i ] ) ) :
-				if j == 0 :
-					X = np.array( [[ t.coord()[ 0 ][ i ] ]] )
-					y = np.array( [ t.coord()[ 1 ][ i ] ] )
+		for r in range( l ) :
+
+			if synchronized is None :
+				angles_in_respect_of_r = transformations['angles'][ r , ] - transformations['angles']  
+				m_angles = meanangle(angles_in_respect_of_r)
+				lags_in_respect_of_r = transformations['lags'][ r ,] - transformations['lags']
+				m_lags = np.array( [ int(round(l)) for l in np.mean(lags_in_respect_of_r,axis=1)] , dtype = 'int64' )
+			else :
+				m_angles = synchronized[ 'angles' ][ r ] - synchronized[ 'angles' ]
+				m_lags = np.array( [ int(round(l)) for l in synchronized[ 'lags' ][ r ] - synchronized[ 'lags' ] ] , dtype = 'int64' )
+
+			trajectories_time_span = {
+					'old_start' : list( starts ) , 'new_start' : list( starts + m_lags * delta_t ) ,
+					'old_end' : list( ends ) , 'new_end' : list( ends + m_lags * delta_t )
+					}
+			mean_start , std_start , n_start , mean_end , std_end , n_end = compute_average_start_and_end( trajectories_time_span , trajectory_list , max_frame )
+
+			#the frames of the aligned trajectories, counted from the first frame of the average
+			f = frames + m_lags[ points ]
+			f0 = np.min( f )
+			aligned = np.full( ( l , 2 , np.max( f ) - f0 + 1 ) , np.nan )
+			c = np.cos( m_angles[ points ] )
+			s = np.sin( m_angles[ points ] )
+			aligned[ points , 0 , f - f0 ] = c * coord[ 0 ] - s * coord[ 1 ]
+			aligned[ points , 1 , f - f0 ] = s * coord[ 0 ] + c * coord[ 1 ]
+
+			#only the time points between the unified start and end count for the precision
+			t = ( np.arange( f0 , np.max( f ) + 1 ) ) * delta_t
+			unified_start = mean_start - 1.96 * std_start / np.sqrt( n_start )
+			unified_end = mean_end + 1.96 * std_end / np.sqrt( n_end )
+			sel = ( ( t > unified_start ) | np.isclose( t , unified_start ) ) & ( ( t < unified_end ) | np.isclose( t , unified_end ) )
+			aligned = aligned[ : , : , sel ]
+
+			with wr.catch_warnings():
+				
+				# time points made only of nan output warnings. Here we suppress such warnings.
+				wr.simplefilter("ignore", category=RuntimeWarning)
+
+				n = np.sum( ~ np.isnan( aligned[ : , 0 ] ) , axis = 0 )
+
+				if median :
+					coord_err = nanMAD( aligned , axis = 0 ) / np.sqrt( n )
 				else :
-					X = np.insert( X , 0 , t.coord()[ 0 ][ i ] , axis = 0 )
-					y = np.insert( y , 0 , t.coord()[ 1 ][ i ] , axis = 0 )
-				j += 1
+					coord_err = np.nanstd( aligned , axis = 0 ) / np.sqrt( n )
 
-		with wr.catch_warnings():
-			# also a bug warning occurs from linear models, RANSACR.
-			wr.simplefilter("ignore", category=RuntimeWarning)
-			model_RANSACR.fit( X , y )
-		
-		t.rotate( - np.arctan( model_RANSACR.estimator_.coef_[0] ) )
+				alignment_precision.append( np.sqrt( np.nanmean( coord_err[ 0 ] ** 2 + coord_err[ 1 ] ** 2 ) ) )
 
-		return( { 'translation' :  translation_vector , 'angle' : theta - np.arctan( model_RANSACR.estimator_.coef_[0] ) } )
-	
-	#-------------------------------------END-OF-DEFINITIONS-in-average_trajectories-----------------------------------
+		return( alignment_precision )
 
-	def compute_transformations( t1 , t1_index , trajectory_list , fimax , fimax_filter ) :
+	def release( aligned_trajectories , average_trajectory , alignment_precision ) :
 
-			selected_alignments = []
-			
-			if ( fimax ) :
-				
-				t1 = t1.fimax( fimax_filter )
-	
-			for traj2 in [ traj2 for traj2 in trajectory_list ]:
-				
-				if trajectory_list.index(traj2) >= t1_index :
-					
-					#list of trajectories called in the second loop; as the transformation matrices are 
-					#symmetric, transformations are computed only in the upper diagonal. 
-					selected_alignments.append(
-						{
-							'angle' : 0,
-							'rc' : np.array([0,0]),
-							'lc' : np.array([0,0]),
-							'lag' : 0,
-							'lag_unit' : 'frames',
-							'score' : np.NaN
-							})
-	
-				else :
+		#releases the aligned trajectories and the averages of the references that are not 
+		#kept (see keep), given the alignment precisions known so far.
+		if keep == 'all' :
 
-					t2 = cp.deepcopy( traj2 )
-					#t2.norm_f()
+			return
 
-					print( 'ref. traj.:\t' + t1.annotations()['file'] )
-					print( 'aligned traj.:\t' + t2.annotations()['file'] )
+		kept = [ alignment_precision.index( min( alignment_precision ) ) ]
+		if keep == 'best_and_worst' :
+			kept.append( alignment_precision.index( max( alignment_precision ) ) )
 
-					alignments = []
-	
-					if ( fimax ) : 
-	
-						t2 = t2.fimax( fimax_filter )
-	
-					#triplicate the longest trajectory by adding itself at its beginning and at its end
-					if ( len(t1)  >= len(t2) ) :
-						x = triplicate_trajectory(t1)
-						y = t2
-					else :
-						x = triplicate_trajectory(t2)
-						y = t1
-	
-					convolution_steps = len(x) - len(y) 
-					for i in range( 0 , convolution_steps ) :
-						#by triplicating the longest trajectory we can test all possible alignments in
-						#space and time starting with the entire trajectories x and y.
-						lag = int( x.frames( 0 ) - y.frames( 0 ) + i )
-						x_frames = x.frames()
-						y_frames = y.frames() + lag
-						
-						#select the frames that are overlapping 
-						sel_frames = [ i for i in range( len( x_frames) ) if x_frames[ i ] in y_frames ]
-			
-						#which trajectory was triplicated decides the sign of the lag
-						if ( len(t1)  >= len(t2) ) :
-	
-							alignments.append(
-									MSD( x.extract( sel_frames ) , y )
-									)
-							alignments[ len(alignments)-1 ][ 'lag' ] = lag
-						
-						else :
-					
-							alignments.append(
-									MSD( y , x.extract( sel_frames ) )
-									)
-							alignments[ len(alignments)-1 ][ 'lag' ] = - lag
-					
-					s = [ a['score'] for a in alignments ]
-					lags = [ a['lag'] for a in alignments ]
-					sel_alignments = [ i for i in range(len(s)) if s[i] == min(s) ]
-				
-					#check which of the selected alignments best fit the trajectory t1 
-					#and not just its triplicate. Importantly, also recompute the alignment
-					#without repetitions of the trajectory, which alter the alignment output
-					refined_alignments_1 = []
-					t1_frames = t1.frames()
-					for sa in sel_alignments: 
-	
-						refine_alignment( t1 , t2 , lags[ sa ] , refined_alignments_1 , WeightTrajOverlap = True ) 
-					
-					refined_s_1 = [  a['score'] for a in refined_alignments_1 ]
-					
-					refined_alignments_2 =[]
-					lag = refined_alignments_1[ refined_s_1.index( min( refined_s_1 ) ) ][ 'lag' ]
-	
-					#define a span, which is not too small, nor too big compared to the trajectory length
-					refine_span = int( min( len( t1 ) , len( t2 ) ) / 10 )
-					for refined_lag in range( lag - refine_span , lag + refine_span + 1 ):
-	
-						refine_alignment( t1 , t2 , refined_lag , refined_alignments_2 , WeightTrajOverlap = False )
-	
-					refined_s_2 = [  a['score'] for a in refined_alignments_2 ]
-				
-					selected_alignments.append( refined_alignments_2[ refined_s_2.index( min( refined_s_2 ) ) ] )
-	
-			if ( fimax ) :
+		for k in range( len( aligned_trajectories ) ) :
 
-				print('\nfimax = True; Transformations were computed using only the trajectory information up to the max in fluorescence intensity.')
-	
-			print('________________')
-			
-			return( selected_alignments )
+			if k not in kept :
 
-	#-------------------------------------END-OF-DEFINITIONS-in-compute_transformations-----------------------------------
+				aligned_trajectories[ k ] = None
+				average_trajectory[ k ] = None
 
-	def compute_average( trajectory_list , tranformations , median , fimax , max_frame , unify_start_end ) :
+	def compute_average( trajectory_list , tranformations , median , fimax , max_frame , unify_start_end , references = None , alignment_precision = None ) :
 		
+		#references are the indexes of the reference trajectories whose average is computed (default 
+		#is None: all the trajectories are references). The aligned trajectories and averages of the 
+		#trajectories that are not references are None. If the alignment_precision of each reference
+		#was already estimated (see estimate_alignment_precision), it is not recomputed.
+
 		aligned_trajectories = [] #contains all the alignments in respect to each trajectory
 		average_trajectory = [] #contains all averages in respect to each trajectory
-		alignment_precision = [] #contains the alignment precision, measured as a score of the alignment
+		
+		if alignment_precision is None :
+			alignment_precision = [] #contains the alignment precision, measured as a score of the alignment
+			compute_precision = True
+		else :
+			compute_precision = False
 	
 		#As each trajectory is aligned to a reference trajectory or 
 		#acts as a reference the rc and lc vectors are obtained 
 		#from rcs and its transpose (i.e. the aligning trajectory
 		#becomes the aligned trajectory).
-		rcs = transformations['rcs'] + np.transpose(transformations['lcs'],axes=(1,0,2))
+		if synchronized is None :
+			rcs = transformations['rcs'] + np.transpose(transformations['lcs'],axes=(1,0,2))
 
-		l = len(transformations['angles'])
+		l = len( trajectory_list )
 		#reference trajectories are indexed with r
 		for r in range( l ) :
+
+			if ( references is not None ) and ( r not in references ) :
+
+				aligned_trajectories.append( None )
+				average_trajectory.append( None )
+				continue
 		
 			#define a dictionary used to store the starts and ends of the aligned
 			#trajectories to compute the start of the average trajectory
@@ -639,18 +2308,26 @@ def average_trajectories( trajectory_list , output_file = 'average' , median = F
 			
 			#compute the transformation of the trajectories 
 			#in respect to the r-th trajectory
-			#--angles--
-			angles_in_respect_of_r = transformations['angles'][ r , ] - transformations['angles']  
-			m_angles = meanangle(angles_in_respect_of_r)
-			#--lags--
-			#lags_in_respect_of_r = transformations['lags'] - transformations['lags'][ r ,]
-			lags_in_respect_of_r = transformations['lags'][ r ,] - transformations['lags']
-			m_lags = [ int(round(l)) for l in np.mean(lags_in_respect_of_r,axis=1)]
-			#--translations--
-			r_cm = np.mean([rcs[ r , j ] for j in range(l) if j != r ] , axis = 0 )
-
-			#make a copy of the trajectory_list, whose trajectories need to be aligned
-			aligned_trajectories.append( cp.deepcopy( trajectory_list ) )
+			if synchronized is None :
+				#--angles--
+				angles_in_respect_of_r = transformations['angles'][ r , ] - transformations['angles']  
+				m_angles = meanangle(angles_in_respect_of_r)
+				#--lags--
+				#lags_in_respect_of_r = transformations['lags'] - transformations['lags'][ r ,]
+				lags_in_respect_of_r = transformations['lags'][ r ,] - transformations['lags']
+				m_lags = [ int(round(l)) for l in np.mean(lags_in_respect_of_r,axis=1)]
+				#--translations--
+				#(the centres of mass are averaged over the pairs that were aligned, see pairing)
+				r_cm = np.mean( rcs[ r ][ transformations['pairs'][ r ] ] , axis = 0 )
+			else :
+				#the transformations of each trajectory were synchronized (see solver)
+				m_angles = synchronized[ 'angles' ][ r ] - synchronized[ 'angles' ]
+				m_lags = [ int(round(l)) for l in synchronized[ 'lags' ][ r ] - synchronized[ 'lags' ] ]
+				r_cm = synchronized[ 'centres' ][ r ]
+
+			#the trajectories aligned to r are views of the trajectory_list, whose transformations 
+			#are applied only when they are stacked to be averaged (see TrajView)
+			aligned_trajectories.append( [ TrajView( t ) for t in trajectory_list ] )
 	
 			##################################################	
 			#align the trajectoris together in space and time
@@ -662,7 +2339,10 @@ def average_trajectories( trajectory_list , output_file = 'average' , median = F
 				
 				#compute the center of mass of the full trajectory
 	
-				l_cm = np.mean([rcs[ j , r ] for r in range(l) if r != j ] , axis=0 )
+				if synchronized is None :
+					l_cm = np.mean( rcs[ j ][ transformations['pairs'][ j ] ] , axis=0 )
+				else :
+					l_cm = synchronized[ 'centres' ][ j ]
 		
 				# the following is equivalent to
 				#
@@ -736,7 +2416,7 @@ def average_trajectories( trajectory_list , output_file = 'average' , median = F
 			#define the average trajectory and its time attribute
 			########################################################################	
 		
-			ta = trajectory_average( aligned_trajectories[ r ] , r , median , fimax ) 
+			ta = trajectory_average( TrajStack( aligned_trajectories[ r ] ) , r , median , fimax ) 
 			
 #TO DEL			if not unify_start_end :
 #TO DEL
@@ -745,14 +2425,11 @@ def average_trajectories( trajectory_list , output_file = 'average' , median = F
 			
 			average_trajectory.append( ta )
 
-			#store the transformations of the trajectories in respect of the trajectory r.
-			if r == 0:
-				all_m_angles = np.array([ m_angles ])
-				all_m_lags = np.array([ m_lags ])
-			else :
-				all_m_angles = np.vstack([ all_m_angles , m_angles ])
-				all_m_lags = np.vstack([ all_m_lags , m_lags ])
-	
+			if not compute_precision :
+
+				release( aligned_trajectories , average_trajectory , alignment_precision )
+				continue
+
 			# make a copy of the average trajectory ta, and unify its start and end 
 			# to compute a mean precision that reflects the invagination dynamice
 			# and not how well noisy and/or excessively long trajectories might
@@ -767,24 +2444,25 @@ def average_trajectories( trajectory_list , output_file = 'average' , median = F
 						)
 					)
 			alignment_precision.append(mean_precision)
+			release( aligned_trajectories , average_trajectory , alignment_precision )
 		
-		print('ALIGNMENT PRECISIONS.\nMIN is the alignment\nselected for the average\n----------------------')
+		logger.info('ALIGNMENT PRECISIONS.\nMIN is the alignment\nselected for the average\n----------------------')
 		for a in alignment_precision :
 			
 			if a == min( alignment_precision ) :
 
-				print( 'MIN>>\t' + str( a ) )
+				logger.info( 'MIN>>\t' + str( a ) )
 			
 			elif a == max( alignment_precision ) :
 		
-				print( 'MAX>>\t' + str( a ) )
+				logger.info( 'MAX>>\t' + str( a ) )
 			
 			else :
 		
-				print( '\t' + str( a ) )
+				logger.info( '\t' + str( a ) )
 
-		print('----------------------')
-		print( 'MEAN:\t' + str( np.mean( alignment_precision ) ) )
+		logger.info('----------------------')
+		logger.info( 'MEAN:\t' + str( np.mean( alignment_precision ) ) )
 
 		return( aligned_trajectories , average_trajectory , alignment_precision )
 	
@@ -792,88 +2470,159 @@ def average_trajectories( trajectory_list , output_file = 'average' , median = F
 
 	header() 
 
-	print( '\nunify_start_end = ' + str( unify_start_end ) )
+	logger.info( '\nunify_start_end = ' + str( unify_start_end ) )
 	
-	#define the list where transformations are stored
-	transformations = {
-			'angles' : np.array( [] ),
-			'rcs' : np.array( [ np.array( [] ) , np.array( [] ) ] ),#note that the matric rcs is the transpose of the lcs
-			'lcs' : np.array( [ np.array( [] ) , np.array( [] ) ] ),
-			'lags' : np.array( [] ),
-			'lag_units' : np.array( [] )
-			}
+	if strategy in ( 'progressive' , 'iterative' ) :
 
-	for traj1 in trajectory_list:
+		#the trajectories are aligned along a guide tree (see progressive_transformations) and are aligned to each
+		#other in the same way whatever the reference, hence the average is computed with the first trajectory only.
+		timer.stage( 'pairwise' )
+		synchronized = progressive_transformations( trajectory_list , fimax , fimax_filter , lag_scan = lag_scan , survivors = survivors )
+		logger.info( '\nstrategy = ' + strategy + ': ' + str( synchronized[ 'alignments' ] ) + ' pairs of partial averages aligned along the guide tree' )
 
-		#t1 is the reference trajectory to which all the other trajectories are alinged
-		#The loop goes on all trajectories as all of them are eligible to be used as reference
+		l = len( trajectory_list )
+		transformations = None
+		timer.stage( 'average' )
+		aligned_trajectories , average_trajectory , alignment_precision = compute_average( trajectory_list , transformations , median , fimax , max_frame , unify_start_end , references = [ 0 ] )
 
-		
-		#the index need to be computed now, becuase if fi_max is true, then t1 will be replaced 
-		#by the part of t1 trajectory that stops at the peak of fluorescence intensity. This 
-		#new trajectory cannot be found animore in trajectory_list. Hence, we must compute the 
-		#index before.
-		
-		t1 = cp.deepcopy( traj1 )
-		t1_index = trajectory_list.index(traj1) 	
-		#t1.norm_f()
+		if strategy == 'iterative' :
 
-		selected_alignments = compute_transformations( t1 , t1_index , trajectory_list , fimax , fimax_filter )
+			#the progressive average is the seed; each trajectory is then aligned to the current average
+			for iteration in range( 1 , max_iterations + 1 ) :
 
-		#Create a matrix with all the transformations: angle, lag and center of masses. 
-		#As a convention the element i,j in the matrix contains the elements for the
-		#rototranslation and temporal shift to align the trajectori i to j, j being the
-		#reference.
-		if t1_index == 0:
+				timer.stage( 'pairwise' )
+				synchronized = align_to_average( average_trajectory[ 0 ] , trajectory_list , fimax , fimax_filter , lag_scan = lag_scan , workers = workers , survivors = survivors )
+				previous_precision = alignment_precision[ 0 ]
+				timer.stage( 'average' )
+				aligned_trajectories , average_trajectory , alignment_precision = compute_average( trajectory_list , transformations , median , fimax , max_frame , unify_start_end , references = [ 0 ] )
 
-			transformations['angles'] = np.array(
-					[a['angle'] for a in selected_alignments]
-					)
-			transformations['rcs'] = np.array([
-					np.array([a['rc'] for a in selected_alignments])
-					])
-			transformations['lcs'] = np.array([
-					np.array([a['lc'] for a in selected_alignments])
-					])
-			transformations['lags'] = np.array(
-					[a['lag'] for a in selected_alignments]
-					)
-		else:
-
-			transformations['angles'] = np.vstack([
-				transformations['angles'],
-				np.array([
-					np.array([a['angle'] for a in selected_alignments])
-					])
-				])
-			transformations['rcs'] = np.vstack([
-				transformations['rcs'],
-					[[a['rc'] for a in selected_alignments]]
-				])
-			transformations['lcs'] = np.vstack([
-				transformations['lcs'],
-					[[a['lc'] for a in selected_alignments]]
-				])
-			transformations['lags'] = np.vstack([
-				transformations['lags'],
-				np.array(
-					[a['lag'] for a in selected_alignments]
-					)
-				])
+				change = abs( alignment_precision[ 0 ] - previous_precision ) / previous_precision
+				logger.info( '\nstrategy = iterative: iteration ' + str( iteration ) + ', alignment precision ' + str( alignment_precision[ 0 ] ) + ' (relative change ' + str( change ) + ')' )
+
+				if change < tolerance :
+
+					break
+
+	else :
+
+		if ( transformations_file is not None ) and os.path.exists( transformations_file ) :
+
+			timer.stage( 'load' )
+			transformations = load_transformations( transformations_file )
+			options = dict( transformation_options( fimax , fimax_filter , lag_scan , survivors , pairing , neighbours ) , reference_selection = reference_selection )
+			#the transformations saved by compute_transformations and save_transformations, and not by average_trajectories, 
+			#do not store the reference selection
+			stored = dict( { 'reference_selection' : reference_selection } , **transformations[ 'options' ] )
+
+			for o in options.keys() :
+
+				if stored.get( o ) != options[ o ] :
+
+					raise AttributeError( 'average_trajectories: the transformations in ' + transformations_file + ' were computed with ' + o + ' = ' + str( stored.get( o ) ) + ' instead of ' + str( options[ o ] ) + '. Please, use the same options or choose another transformations_file' )
+
+			logger.info( 'Update the transformations in ' + transformations_file )
+			timer.stage( 'pairwise' )
+			trajectory_list , transformations = update_transformations( transformations , trajectory_list , lag_scan = lag_scan , workers = workers , cache = cache , survivors = survivors , pairing = pairing , neighbours = neighbours )
+
+		else :
+
+			if resume is not None :
+
+				resume = Checkpoint( resume )
+
+				if checkpoint is None :
+
+					checkpoint = resume.file_name
+
+			if checkpoint is not None :
+
+				checkpoint = Checkpoint( checkpoint , checkpoint_interval )
 
-	transformations['angles'] = transformations['angles'] - np.transpose(transformations['angles'])
-	transformations['lags'] = transformations['lags'] - np.transpose(transformations['lags'])
+			timer.stage( 'pairwise' )
+
+			if shards is not None :
+
+				transformations = sharded_transformations( trajectory_list , shards , fimax , fimax_filter , lag_scan = lag_scan , workers = workers , survivors = survivors , pairing = pairing , neighbours = neighbours , shard_size = shard_size )
+
+			else :
+
+				transformations = compute_transformations( trajectory_list , fimax , fimax_filter , lag_scan = lag_scan , workers = workers , cache = cache , survivors = survivors , pairing = pairing , neighbours = neighbours , checkpoint = checkpoint , resume = resume )
+
+		if transformations_file is not None :
+
+			timer.stage( 'save' )
+			#the reference selection must also be the same when the file is updated
+			transformations[ 'options' ][ 'reference_selection' ] = reference_selection
+			save_transformations( transformations , transformations_file )
+
+		timer.stage( 'reduce' )
+
+		#the antisymmetric transformations are computed on a copy, so that the transformations that are saved are not changed
+		transformations = cp.deepcopy( transformations )
+
+		transformations['angles'] = transformations['angles'] - np.transpose(transformations['angles'])
+		transformations['lags'] = transformations['lags'] - np.transpose(transformations['lags'])
 	
-	l = len(transformations['angles'])
-	for i in range( l ):
-		transformations['lcs'][ i , i ] = [ 0 , 0 ]
+		l = len(transformations['angles'])
+		for i in range( l ):
+			transformations['lcs'][ i , i ] = [ 0 , 0 ]
+
+		if solver != 'mean' :
+
+			#the angle, lag and centre of each trajectory (see synchronize_transformations)
+			if solver == 'weighted_synchronization' :
+
+				#the overlaps of the trajectories that were aligned
+				if fimax :
+					overlaps = pair_overlaps( [ t.fimax( fimax_filter ) for t in trajectory_list ] , transformations )
+				else :
+					overlaps = pair_overlaps( trajectory_list , transformations )
+
+				synchronized = synchronize_transformations( transformations , weighted = True , overlaps = overlaps )
+
+			else :
+
+				synchronized = synchronize_transformations( transformations , weighted = False )
+
+			logger.info( '\nsolver = ' + solver + ': the angles were synchronized in ' + str( synchronized[ 'iterations' ] ) + ' iterations' )
+
+		else :
+
+			synchronized = None
+
+			#chain the angles and lags of the pairs that were not aligned (see pairing)
+			if np.sum( transformations['pairs'] ) < l * ( l - 1 ) :
+
+				complete_transformations( transformations )
 	
-	#compute the average transformation using each trajectory as possible reference
-	aligned_trajectories , average_trajectory , alignment_precision = compute_average( trajectory_list , transformations , median , fimax , max_frame , unify_start_end )
+		#compute the average transformation using each trajectory as possible reference
+		if reference_selection == 'fast' :
+
+			alignment_precision = estimate_alignment_precision( trajectory_list , transformations , median , max_frame )
+			references = [ alignment_precision.index( min( alignment_precision ) ) , alignment_precision.index( max( alignment_precision ) ) ]
+			if keep == 'best' :
+				references = references[ : 1 ]
+			timer.stage( 'average' )
+			aligned_trajectories , average_trajectory , alignment_precision = compute_average( trajectory_list , transformations , median , fimax , max_frame , unify_start_end , references , alignment_precision )
+
+		else :
+
+			timer.stage( 'average' )
+			aligned_trajectories , average_trajectory , alignment_precision = compute_average( trajectory_list , transformations , median , fimax , max_frame , unify_start_end )
 
 	best_average = alignment_precision.index( min( alignment_precision ) ) 
 	worst_average = alignment_precision.index( max( alignment_precision ) ) 
 
+	if keep == 'best' :
+		worst_average = None
+
+	#the trajectories aligned to the best and worst references are output, hence they are materialised (see TrajView)
+	for r in set( [ best_average , worst_average ] ) - set( [ None ] ) :
+
+		aligned_trajectories[ r ] = [ t.traj( copy = True ) for t in aligned_trajectories[ r ] ]
+
+	timer.stage( 'lie_down' )
+
 	if not unify_start_end :
 
 		# compute the lie_down only on the part of the trajectory that represents
@@ -885,17 +2634,20 @@ def average_trajectories( trajectory_list , output_file = 'average' , median = F
 		average_trajectory_tmp.end( unified_end( average_trajectory_tmp ) )
 #TO DEL		average_trajectory_tmp.start( float( average_trajectory_tmp.annotations()[ 'unified_start' ] ) )
 #TO DEL		average_trajectory_tmp.end( float( average_trajectory_tmp.annotations()[ 'unified_end' ] ) )
-		lie_down_transform = lie_down( average_trajectory_tmp )
+		lie_down_transform = lie_down( average_trajectory_tmp , line_fitter )
 
 	else :
 	
-		lie_down_transform = lie_down( average_trajectory[ best_average ] )
+		lie_down_transform = lie_down( average_trajectory[ best_average ] , line_fitter )
 
 	# lie_down transformations applied to average_trajectory[ best_average ]
 	average_trajectory[ best_average ].translate( lie_down_transform[ 'translation' ] )
 	average_trajectory[ best_average ].rotate( lie_down_transform[ 'angle' ] )
 
+	timer.stage( 'save' )
+
 	average_trajectory[ best_average ].annotations()[ 'trajalign_version' ] = header( printit = False )
+	average_trajectory[ best_average ].annotations()[ 'stage_timings' ] = timer.summary()
 	average_trajectory[ best_average ].save( output_file )
 
 	#save the trajectories use to compute the average, lied down as the average trajectory
@@ -921,5 +2673,78 @@ def average_trajectories( trajectory_list , output_file = 'average' , median = F
 	
 	f.close()
 
-	return( average_trajectory[ best_average ] , average_trajectory[ worst_average ] , { 'best_score' : aligned_trajectories[ best_average ] , 'worst_score' : aligned_trajectories[ worst_average ] } )
+	timer.stop()
+	statistics = work - start_work
+	logger.debug( 'work: ' + statistics.summary() )
+
+	if timings_file is not None :
+
+		timer.save( timings_file , statistics )
+
+	if profile :
+
+		timer.save_profiles( profile if isinstance( profile , str ) else "./" + output_file + "/profile" )
+
+	if keep == 'best' :
+
+		return( average_trajectory[ best_average ] , None , { 'best_score' : aligned_trajectories[ best_average ] , 'worst_score' : None , 'statistics' : statistics } )
+
+	output = { 'best_score' : aligned_trajectories[ best_average ] , 'worst_score' : aligned_trajectories[ worst_average ] , 'statistics' : statistics }
+
+	if keep == 'all' :
+
+		def all_scores() :
+
+			#the trajectories aligned to each reference are materialised one reference at a time
+			for r in range( l ) :
+
+				if ( aligned_trajectories[ r ] is None ) or ( r in ( best_average , worst_average ) ) :
+					yield aligned_trajectories[ r ]
+				else :
+					yield [ t.traj( copy = True ) for t in aligned_trajectories[ r ] ]
+
+		output[ 'all_averages' ] = average_trajectory
+		output[ 'all_scores' ] = all_scores()
+
+	return( average_trajectory[ best_average ] , average_trajectory[ worst_average ] , output )
+
+def watch_directory( path , max_frame , output_file = 'average' , transformations_file = None , interval = 60 , max_updates = None , average_options = {} , pattern = '.txt' , **load_options ) :
+
+	"""
+	watch_directory( path , max_frame , output_file = 'average' , transformations_file = None , interval = 60 , max_updates = None , average_options = {} , pattern = '.txt' , **load_options ):
+	keeps the average of the trajectories in 'path' up to date while new trajectories are tracked. Every 'interval' seconds
+	the files in path that have 'pattern' are listed, and, if they changed, the trajectories are loaded with load_directory
+	(load_options are passed to load_directory) and averaged with average_trajectories (average_options are passed to 
+	average_trajectories). The transformations are saved in transformations_file (default is output_file + '_transformations.npz') 
+	so that only the pairs with the new trajectories are aligned at each update (see update_transformations).
+	watch_directory stops after max_updates averages (default is None: it never stops) and returns the output of the 
+	last average_trajectories.
+	"""
+
+	if transformations_file is None :
+
+		transformations_file = output_file + '_transformations.npz'
+
+	files = []
+	updates = 0
+	output = None
+
+	while ( max_updates is None ) or ( updates < max_updates ) :
+
+		new_files = sorted( list_directory( path , pattern ) )
+
+		if ( new_files != files ) & ( len( new_files ) > 1 ) :
+
+			files = new_files
+			logger.info( 'watch_directory: ' + str( len( files ) ) + ' trajectories in ' + path )
+
+			trajectory_list = load_directory( path , pattern = pattern , **load_options )
+			output = average_trajectories( trajectory_list , output_file = output_file , max_frame = max_frame , transformations_file = transformations_file , **average_options )
+			updates += 1
+
+		else :
+
+			time.sleep( interval )
+
+	return( output )
 
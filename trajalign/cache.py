@@ -0,0 +1,178 @@
+# All the software here is distributed under the terms of the GNU General Public License Version 3, June 2007.
+# Trajalign is a free software and comes with ABSOLUTELY NO WARRANTY.
+#
+# You are welcome to redistribute the software. However, we appreciate is use of such software would result in citations of
+# Picco, A., Kaksonen, M., _Precise tracking of the dynamics of multiple proteins in endocytic events_,  Methods in Cell Biology, Vol. 139, pages 51-68 (2017)
+# http://www.sciencedirect.com/science/article/pii/S0091679X16301546
+#
+# Author: Andrea Picco (https://github.com/apicco)
+# Year: 2017
+
+import os
+import json
+import hashlib
+import numpy as np
+
+def traj_hash( t ) :
+
+	"""
+	traj_hash( t ): returns the sha1 hash of the content of all the arrays of the trajectory t (the annotations are not
+	included), so that two trajectories with the same data have the same hash wherever they are loaded from.
+	"""
+
+	h = hashlib.sha1()
+
+	for s in t.__slots__[ 1 : ] :
+
+		x = np.ascontiguousarray( getattr( t , s ) )
+		h.update( ( s + ':' + str( x.dtype ) + ':' + str( x.shape ) + ';' ).encode() )
+		h.update( x.tobytes() )
+
+	return( h.hexdigest() )
+
+class AlignmentCache :
+
+	"""
+	AlignmentCache( directory = default_cache_directory() , max_size = 100 * 2**20 ): cache of the alignments of pairs of
+	trajectories computed by align_pair (see trajalign.average). Each alignment is saved in a file in 'directory' whose name
+	is the hash of the content of the two trajectories and of the options used to align them, so that the alignment is
+	reused whenever the same pair is aligned with the same options, in any run. The cache stores the lag, angle, rc, lc and
+	score of each pair. When the size of the files in the cache exceeds max_size (in bytes), the least recently used
+	alignments are deleted.
+	"""
+
+	def __init__( self , directory = None , max_size = 100 * 2**20 ) :
+
+		if directory is None :
+
+			directory = default_cache_directory()
+
+		if max_size <= 0 :
+
+			raise AttributeError( 'AlignmentCache: max_size must be larger than 0' )
+
+		self.directory = directory
+		self.max_size = max_size
+		self.hits = 0
+		self.misses = 0
+
+		if not os.path.exists( directory ) :
+
+			os.makedirs( directory )
+
+		self.size = sum( [ os.path.getsize( os.path.join( directory , f ) ) for f in os.listdir( directory ) if f.endswith( '.json' ) ] )
+
+	def key( self , t1 , t2 , options ) :
+
+		"""
+		key( t1 , t2 , options ): the key of the alignment of t2 to t1 computed with the options in the dictionary 'options'.
+		"""
+
+		h = hashlib.sha1()
+		h.update( traj_hash( t1 ).encode() )
+		h.update( traj_hash( t2 ).encode() )
+		h.update( json.dumps( options , sort_keys = True ).encode() )
+
+		return( h.hexdigest() )
+
+	def get( self , key ) :
+
+		"""
+		get( key ): returns the alignment with key, or None if the alignment is not in the cache.
+		"""
+
+		file_name = os.path.join( self.directory , key + '.json' )
+
+		try :
+
+			with open( file_name , 'r' ) as f :
+
+				a = json.load( f )
+
+		except ( OSError , ValueError ) :
+
+			self.misses += 1
+			return( None )
+
+		#mark the alignment as recently used
+		os.utime( file_name )
+		self.hits += 1
+
+		return({
+			'lag' : int( a[ 'lag' ] ),
+			'angle' : np.float64( a[ 'angle' ] ),
+			'rc' : np.array( a[ 'rc' ] , dtype = 'float64' ),
+			'lc' : np.array( a[ 'lc' ] , dtype = 'float64' ),
+			'score' : np.float64( a[ 'score' ] )
+			})
+
+	def put( self , key , alignment ) :
+
+		"""
+		put( key , alignment ): stores the alignment with key, and deletes the least recently used alignments if the
+		cache is larger than max_size.
+		"""
+
+		file_name = os.path.join( self.directory , key + '.json' )
+
+		#floats are saved with their repr, hence they are read back identical
+		with open( file_name + '.tmp' , 'w' ) as f :
+
+			json.dump( {
+				'lag' : int( alignment[ 'lag' ] ),
+				'angle' : float( alignment[ 'angle' ] ),
+				'rc' : [ float( x ) for x in alignment[ 'rc' ] ],
+				'lc' : [ float( x ) for x in alignment[ 'lc' ] ],
+				'score' : float( alignment[ 'score' ] )
+				} , f )
+
+		if os.path.exists( file_name ) :
+
+			self.size -= os.path.getsize( file_name )
+
+		os.replace( file_name + '.tmp' , file_name )
+		self.size += os.path.getsize( file_name )
+
+		if self.size > self.max_size :
+
+			self.evict()
+
+	def evict( self ) :
+
+		"""
+		evict(): deletes the least recently used alignments until the cache is smaller than max_size.
+		"""
+
+		files = [ os.path.join( self.directory , f ) for f in os.listdir( self.directory ) if f.endswith( '.json' ) ]
+		files = sorted( files , key = os.path.getmtime )
+
+		self.size = sum( [ os.path.getsize( f ) for f in files ] )
+
+		while ( self.size > self.max_size ) & ( len( files ) > 0 ) :
+
+			f = files.pop( 0 )
+			self.size -= os.path.getsize( f )
+			os.remove( f )
+
+	def clear( self ) :
+
+		"""
+		clear(): deletes all the alignments in the cache.
+		"""
+
+		for f in os.listdir( self.directory ) :
+
+			if f.endswith( '.json' ) :
+
+				os.remove( os.path.join( self.directory , f ) )
+
+		self.size = 0
+
+def default_cache_directory() :
+
+	"""
+	default_cache_directory(): the directory of the cache of the alignments, which is $XDG_CACHE_HOME/trajalign or, if
+	XDG_CACHE_HOME is not set, ~/.cache/trajalign.
+	"""
+
+	return( os.path.join( os.environ.get( 'XDG_CACHE_HOME' , os.path.join( os.path.expanduser( '~' ) , '.cache' ) ) , 'trajalign' ) )
@@ -0,0 +1,104 @@
+# All the software here is distributed under the terms of the GNU General Public License Version 3, June 2007.
+# Trajalign is a free software and comes with ABSOLUTELY NO WARRANTY.
+#
+# You are welcome to redistribute the software. However, we appreciate is use of such software would result in citations of
+# Picco, A., Kaksonen, M., _Precise tracking of the dynamics of multiple proteins in endocytic events_,  Methods in Cell Biology, Vol. 139, pages 51-68 (2017)
+# http://www.sciencedirect.com/science/article/pii/S0091679X16301546
+#
+# Author: Andrea Picco (https://github.com/apicco)
+# Year: 2017
+
+import os
+import json
+import time
+import hashlib
+import numpy as np
+from trajalign.cache import traj_hash
+from trajalign.log import logger
+from trajalign.storage import save_transformations , load_transformations
+
+def fingerprint( trajectories , options ) :
+
+	"""
+	fingerprint( trajectories , options ): returns the sha1 hash of the content of the trajectories, in their order (see
+	traj_hash in trajalign.cache), and of the options in the dictionary 'options' used to align them. A checkpoint can
+	be resumed only by a run with the same fingerprint.
+	"""
+
+	h = hashlib.sha1()
+
+	for t in trajectories :
+
+		h.update( traj_hash( t ).encode() )
+
+	h.update( json.dumps( options , sort_keys = True ).encode() )
+
+	return( h.hexdigest() )
+
+class Checkpoint :
+
+	"""
+	Checkpoint( file_name , interval = 600 ): checkpoint of the transformations of compute_transformations (see
+	trajalign.average) while their pairs of trajectories are aligned. save( transformations , fingerprint ) writes the
+	partially filled transformations, whose matrix 'pairs' marks the pairs already aligned, together with the fingerprint
+	of the trajectories and options (see fingerprint) in the file file_name, which has the layout of save_transformations
+	(see trajalign.storage) with the extra key 'fingerprint'. due() is True when the last save is older than interval
+	seconds. As any file of save_transformations, a crash during a save never corrupts the previous checkpoint.
+	load( fingerprint ) reads the transformations back, and refuses a checkpoint whose fingerprint differs.
+	"""
+
+	def __init__( self , file_name , interval = 600 ) :
+
+		if interval < 0 :
+
+			raise AttributeError( 'Checkpoint: interval must be larger than or equal to 0' )
+
+		self.file_name = file_name
+		self.interval = interval
+		self.saves = 0
+		self.last = time.perf_counter()
+
+	def due( self ) :
+
+		return( time.perf_counter() - self.last >= self.interval )
+
+	def save( self , transformations , fingerprint ) :
+
+		"""
+		save( transformations , fingerprint ): writes the transformations and their fingerprint in file_name (see
+		save_transformations in trajalign.storage).
+		"""
+
+		directory = os.path.dirname( self.file_name )
+
+		if ( len( directory ) > 0 ) and ( not os.path.exists( directory ) ) :
+
+			os.makedirs( directory )
+
+		save_transformations( transformations , self.file_name , fingerprint = fingerprint )
+
+		self.saves += 1
+		self.last = time.perf_counter()
+
+		logger.debug( 'Checkpoint: ' + str( int( np.sum( np.tril( transformations[ 'pairs' ] , -1 ) ) ) ) + ' aligned pairs saved in ' + self.file_name )
+
+	def load( self , fingerprint ) :
+
+		"""
+		load( fingerprint ): returns the transformations saved in file_name, or None if there is no checkpoint. Raises
+		an AttributeError if the checkpoint was saved with another fingerprint, i.e. for other trajectories or options.
+		"""
+
+		if not os.path.exists( self.file_name ) :
+
+			return( None )
+
+		with np.load( self.file_name , allow_pickle = False ) as data :
+
+			saved = str( data[ 'fingerprint' ] ) if 'fingerprint' in data.files else None
+
+		if saved != fingerprint :
+
+			raise AttributeError( 'Checkpoint.load: the checkpoint in ' + self.file_name + ' was saved for other trajectories or alignment options and cannot be resumed. Please, use the same trajectories and options or choose another checkpoint' )
+
+		return( load_transformations( self.file_name ) )
@@ -0,0 +1,101 @@
+# All the software here is distributed under the terms of the GNU General Public License Version 3, June 2007.
+# Trajalign is a free software and comes with ABSOLUTELY NO WARRANTY.
+#
+# You are welcome to redistribute the software. However, we appreciate is use of such software would result in citations of
+# Picco, A., Kaksonen, M., _Precise tracking of the dynamics of multiple proteins in endocytic events_,  Methods in Cell Biology, Vol. 139, pages 51-68 (2017)
+# http://www.sciencedirect.com/science/article/pii/S0091679X16301546
+#
+# Author: Andrea Picco (https://github.com/apicco)
+# Year: 2017
+
+#the counters of the work done by trajalign, in the order in which they are reported:
+#msd_evaluations: rototranslations computed (one per pair of MSD_batch and one per lag of MSD_lags);
+#lags_scanned: lags aligned by the lag scans of align_pair, at any resolution;
+#lags_refined: lags aligned again on the trajectories themselves by refine_alignment;
+#traj_deepcopies: deep copies of Traj objects;
+#extract_calls: calls of Traj.extract;
+#pairwise_bytes: bytes of the arrays allocated by the alignment of pairs of trajectories (the copies, windows, spectra and
+#triplicated and extracted trajectories of MSD_batch, MSD_pairs, MSD_lags, score_lower_bounds, triplicate_trajectory and
+#refine_alignment), without the temporary arrays of numpy;
+#cache_hits and cache_misses: pairs whose alignment was, or was not, found in the AlignmentCache;
+#pairs_skipped: pairs of trajectories that were not aligned because pairing = 'knn' did not select them or because
+#they were already aligned in the transformations that are updated or in the checkpoint that is resumed.
+counter_names = [ 'msd_evaluations' , 'lags_scanned' , 'lags_refined' , 'traj_deepcopies' , 'extract_calls' , 'pairwise_bytes' , 'cache_hits' , 'cache_misses' , 'pairs_skipped' ]
+
+class WorkCounters :
+
+	"""
+	WorkCounters( **counts ): counters of the work done by trajalign (see counter_names). add( name , n ) increases a counter,
+	and the counters of a run are the difference between the counters at its end and a copy taken at its start
+	(e.g. work - start, where work is the WorkCounters of the process). The counters are read as a dictionary by as_dict()
+	and summarised by summary().
+	"""
+
+	__slots__ = [ '_counts' ]
+
+	def __init__( self , **counts ) :
+
+		self._counts = dict.fromkeys( counter_names , 0 )
+
+		for name in counts.keys() :
+
+			self.add( name , counts[ name ] )
+
+	def add( self , name , n = 1 ) :
+
+		if name not in self._counts.keys() :
+
+			raise AttributeError( 'WorkCounters: ' + str( name ) + ' is not a counter; the counters are ' + ', '.join( counter_names ) )
+
+		self._counts[ name ] += int( n )
+
+	def update( self , counts ) :
+
+		"""
+		update( counts ): adds to the counters those in counts, a WorkCounters or a dictionary (e.g. the counters of the
+		workers of a process pool).
+		"""
+
+		if isinstance( counts , WorkCounters ) :
+
+			counts = counts.as_dict()
+
+		for name in counts.keys() :
+
+			self.add( name , counts[ name ] )
+
+	def reset( self ) :
+
+		self._counts = dict.fromkeys( counter_names , 0 )
+
+	def copy( self ) :
+
+		return WorkCounters( **self._counts )
+
+	def as_dict( self ) :
+
+		return dict( self._counts )
+
+	def __getitem__( self , name ) :
+
+		return self._counts[ name ]
+
+	def __sub__( self , other ) :
+
+		return WorkCounters( **{ name : self._counts[ name ] - other[ name ] for name in counter_names } )
+
+	def __repr__( self ) :
+
+		return 'WorkCounters(' + self.summary() + ')'
+
+	def summary( self ) :
+
+		"""
+		summary(): the counters as a string (e.g. 'msd_evaluations 1234, lags_scanned 567, ...').
+		"""
+
+		return ', '.join( [ name + ' ' + str( self._counts[ name ] ) for name in counter_names ] )
+
+#the counters of the process. The workers of the process pool of align_pairs count on their own copy, which they
+#return to the main process with their alignments.
+work = WorkCounters()
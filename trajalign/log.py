@@ -0,0 +1,268 @@
+# All the software here is distributed under the terms of the GNU General Public License Version 3, June 2007.
+# Trajalign is a free software and comes with ABSOLUTELY NO WARRANTY.
+#
+# You are welcome to redistribute the software. However, we appreciate is use of such software would result in citations of
+# Picco, A., Kaksonen, M., _Precise tracking of the dynamics of multiple proteins in endocytic events_,  Methods in Cell Biology, Vol. 139, pages 51-68 (2017)
+# http://www.sciencedirect.com/science/article/pii/S0091679X16301546
+#
+# Author: Andrea Picco (https://github.com/apicco)
+# Year: 2017
+
+import os
+import sys
+import json
+import time
+import pstats
+import functools
+import cProfile
+import logging
+
+try :
+	import resource
+except ImportError :
+	#the peak memory is not measured where the resource module is not available (e.g. Windows)
+	resource = None
+
+#the messages of trajalign are written to the standard output, as plain lines, through the 'trajalign' logger.
+#Its level is set by the verbose option of average_trajectories and align (see set_verbosity).
+logger = logging.getLogger( 'trajalign' )
+
+class StdoutHandler( logging.StreamHandler ) :
+
+	#a handler that writes to the standard output of the time of each message, rather than to that of the import of
+	#trajalign, so that the messages follow sys.stdout when it is replaced (e.g. by redirect_stdout or by pytest)
+	@property
+	def stream( self ) :
+
+		return( sys.stdout )
+
+	@stream.setter
+	def stream( self , stream ) :
+
+		pass
+
+if not logger.handlers :
+
+	handler = StdoutHandler()
+	handler.setFormatter( logging.Formatter( '%(message)s' ) )
+	logger.addHandler( handler )
+	logger.setLevel( logging.INFO )
+	logger.propagate = False
+
+verbosity_levels = { 0 : logging.WARNING , 1 : logging.INFO , 2 : logging.DEBUG }
+
+def set_verbosity( verbose ) :
+
+	"""
+	set_verbosity( verbose ): sets which messages of trajalign are output: 0 only the warnings, 1 (default) also the
+	progress and results of each step, and 2 also the debug messages, such as each pair of trajectories that is aligned.
+	"""
+
+	if verbose not in verbosity_levels.keys() :
+
+		raise AttributeError( 'set_verbosity: verbose must be 0 (warnings), 1 (progress, default) or 2 (debug)' )
+
+	logger.setLevel( verbosity_levels[ verbose ] )
+
+def restores_verbosity( function ) :
+
+	#decorator of the functions that call set_verbosity with their verbose option (e.g. average_trajectories and align):
+	#the level of the logger is restored when they return or raise, so that verbose applies to that call only
+	@functools.wraps( function )
+	def wrapper( *args , **kwargs ) :
+
+		level = logger.level
+
+		try :
+
+			return( function( *args , **kwargs ) )
+
+		finally :
+
+			logger.setLevel( level )
+
+	return( wrapper )
+
+def cpu_time() :
+
+	#the CPU time of the process and of its child processes that terminated (e.g. the workers of align_pairs)
+	t = os.times()
+
+	return( t.user + t.system + t.children_user + t.children_system )
+
+def peak_memory() :
+
+	"""
+	peak_memory(): returns the peak resident memory, in MB, of the process and of the largest of its child processes
+	that terminated. Both are None where they cannot be measured.
+	"""
+
+	if resource is None :
+
+		return( None , None )
+
+	#ru_maxrss is in kilobytes on Linux and in bytes on macOS
+	unit = 2 ** 20 if sys.platform == 'darwin' else 2 ** 10
+
+	return( resource.getrusage( resource.RUSAGE_SELF ).ru_maxrss / unit , resource.getrusage( resource.RUSAGE_CHILDREN ).ru_maxrss / unit )
+
+class StageTimer :
+
+	"""
+	StageTimer( profile = False , **metadata ): measures the wall time and the CPU time (see cpu_time) of the stages of a
+	run, and the peak memory of the process (see peak_memory). stage( name ) starts a stage and ends the previous one, and
+	stop() ends the current stage. The peak memory is a high-water mark over the lifetime of the process, not of a stage:
+	process_peak_memory_mb and process_peak_memory_children_mb are its value when the stage ended, and
+	peak_memory_increase_mb is how much the stage raised it. A stage that allocates less than an earlier stage has an
+	increase of 0, whatever memory it uses. A stage can be run more than once (e.g. the iterations of strategy = 'iterative' in average_trajectories):
+	its times are summed. The stages are written as JSON lines, together with the metadata of the run, by save( file_name ),
+	and summarised by summary(). If profile is True, each stage is also profiled with its own cProfile.Profile, and the
+	profiles are written by save_profiles( directory ). Profiling slows the stages down; when it is off, the stages are
+	only timed.
+	"""
+
+	__slots__ = [ '_metadata' , '_stages' , '_current' , '_wall' , '_cpu' , '_peak' , '_profiles' ]
+
+	def __init__( self , profile = False , **metadata ) :
+
+		self._metadata = metadata
+		self._stages = {}
+		self._current = None
+		self._profiles = {} if profile else None
+
+	def stage( self , name ) :
+
+		"""
+		stage( name ): ends the current stage, if any, and starts the stage name.
+		"""
+
+		self.stop()
+
+		self._current = name
+		self._wall = time.perf_counter()
+		self._cpu = cpu_time()
+		self._peak = peak_memory()[ 0 ]
+
+		if self._profiles is not None :
+
+			if name not in self._profiles.keys() :
+				self._profiles[ name ] = cProfile.Profile()
+
+			self._profiles[ name ].enable()
+
+	def stop( self ) :
+
+		"""
+		stop(): ends the current stage, if any, and logs its times at the debug level.
+		"""
+
+		if self._current is None :
+
+			return
+
+		if self._profiles is not None :
+
+			self._profiles[ self._current ].disable()
+
+		wall = time.perf_counter() - self._wall
+		cpu = cpu_time() - self._cpu
+		peak , peak_children = peak_memory()
+
+		if self._current not in self._stages.keys() :
+
+			self._stages[ self._current ] = { 'stage' : self._current , 'calls' : 0 , 'wall_s' : 0.0 , 'cpu_s' : 0.0 , 'peak_memory_increase_mb' : None if peak is None else 0.0 }
+
+		s = self._stages[ self._current ]
+		s[ 'calls' ] += 1
+		s[ 'wall_s' ] += wall
+		s[ 'cpu_s' ] += cpu
+		s[ 'process_peak_memory_mb' ] = peak
+		s[ 'process_peak_memory_children_mb' ] = peak_children
+
+		if peak is not None :
+
+			s[ 'peak_memory_increase_mb' ] += peak - self._peak
+
+		logger.debug( 'stage ' + self._current + ': ' + str( round( wall , 3 ) ) + ' s wall, ' + str( round( cpu , 3 ) ) + ' s CPU, process peak memory ' + str( peak ) + ' MB' )
+
+		self._current = None
+
+	def stages( self ) :
+
+		"""
+		stages(): the list of the dictionaries of the stages that ended, in the order in which they were first run.
+		"""
+
+		return( list( self._stages.values() ) )
+
+	def summary( self ) :
+
+		"""
+		summary(): the wall and CPU times of the stages that ended, as a string (e.g. 'pairwise 1.23/4.56 s, average
+		0.12/0.12 s', where the times are wall/CPU).
+		"""
+
+		return( ', '.join( [ s[ 'stage' ] + ' ' + str( round( s[ 'wall_s' ] , 2 ) ) + '/' + str( round( s[ 'cpu_s' ] , 2 ) ) + ' s' for s in self.stages() ] ) )
+
+	def save( self , file_name , statistics = None ) :
+
+		"""
+		save( file_name , statistics = None ): writes one JSON line per stage, with the metadata of the run, in the file
+		file_name. If the WorkCounters statistics of the run are given (see trajalign.counters), they are written in
+		a last line, as the stage 'work'.
+		"""
+
+		with open( file_name , 'w' ) as f :
+
+			for s in self.stages() :
+
+				line = dict( self._metadata )
+				line.update( s )
+				f.write( json.dumps( line ) + '\n' )
+
+			if statistics is not None :
+
+				line = dict( self._metadata )
+				line[ 'stage' ] = 'work'
+				line.update( statistics.as_dict() )
+				f.write( json.dumps( line ) + '\n' )
+
+	def save_profiles( self , directory , top = 20 ) :
+
+		"""
+		save_profiles( directory , top = 20 ): writes, in directory, the profile of each stage (the pstats file
+		<stage>.prof, which can be read with pstats or snakeviz) and profile_summary.txt, with the top functions
+		that took the longest time, excluding the functions they call, over all the stages together and within
+		each stage. Returns the file name of the summary.
+		"""
+
+		if not self._profiles :
+
+			raise AttributeError( 'StageTimer.save_profiles: the stages were not profiled; create the StageTimer with profile = True' )
+
+		if not os.path.exists( directory ) :
+
+			os.makedirs( directory )
+
+		files = []
+
+		for name in self._profiles.keys() :
+
+			files.append( os.path.join( directory , name + '.prof' ) )
+			self._profiles[ name ].dump_stats( files[ -1 ] )
+
+		summary = os.path.join( directory , 'profile_summary.txt' )
+
+		with open( summary , 'w' ) as f :
+
+			f.write( 'Top ' + str( top ) + ' functions of all the stages (' + ', '.join( self._profiles.keys() ) + ')\n' )
+			pstats.Stats( *files , stream = f ).sort_stats( 'tottime' ).print_stats( top )
+
+			for name , file_name in zip( self._profiles.keys() , files ) :
+
+				f.write( '\nTop ' + str( top ) + ' functions of the stage ' + name + '\n' )
+				pstats.Stats( file_name , stream = f ).sort_stats( 'tottime' ).print_stats( top )
+
+		logger.info( 'The profiles of the stages have been saved in ' + directory )
+
+		return( summary )
@@ -0,0 +1,202 @@
+# All the software here is distributed under the terms of the GNU General Public License Version 3, June 2007.
+# Trajalign is a free software and comes with ABSOLUTELY NO WARRANTY.
+#
+# You are welcome to redistribute the software. However, we appreciate is use of such software would result in citations of
+# Picco, A., Kaksonen, M., _Precise tracking of the dynamics of multiple proteins in endocytic events_,  Methods in Cell Biology, Vol. 139, pages 51-68 (2017)
+# http://www.sciencedirect.com/science/article/pii/S0091679X16301546
+#
+# Author: Andrea Picco (https://github.com/apicco)
+# Year: 2017
+
+import numpy as np
+import warnings as wr
+
+from sklearn import linear_model
+
+def stack_trajectories( trajectories ) :
+
+	"""
+	stack_trajectories( trajectories ): returns the arrays x, y and f, with one row per trajectory, of the coordinates and
+	fluorescence intensities of the trajectories. The rows of the trajectories shorter than the longest one are padded
+	with NaN.
+	"""
+
+	n = len( trajectories )
+	L = max( [ len( t ) for t in trajectories ] + [ 0 ] )
+
+	x = np.full( ( n , L ) , np.nan )
+	y = np.full( ( n , L ) , np.nan )
+	f = np.full( ( n , L ) , np.nan )
+
+	for k , t in zip( range( n ) , trajectories ) :
+
+		x[ k , : len( t ) ] = t.coord()[ 0 ]
+		y[ k , : len( t ) ] = t.coord()[ 1 ]
+
+		if len( t.f() ) == len( t ) :
+
+			f[ k , : len( t ) ] = t.f()
+
+	return( x , y , f )
+
+def rotate( x , y , angle ) :
+
+	#rotates the rows of x and y by their angle, as Traj.rotate does
+	c = np.cos( angle )[ : , None ]
+	s = np.sin( angle )[ : , None ]
+
+	return( c * x - s * y , s * x + c * y )
+
+def principal_orientation( x , y , f ) :
+
+	"""
+	principal_orientation( x , y , f ): estimates, for each row of the arrays x , y and f (see stack_trajectories), the
+	translation that centres the trajectory on the median of its coordinates and the angle that rotates its principal
+	axis of inertia, weighted by the fluorescence intensity, on the x axis, with the direction of the larger displacements
+	(median square displacement from the centre) along the positive x. Returns the translations, the angles and the coordinates
+	of the trajectories once translated and rotated.
+	"""
+
+	with wr.catch_warnings() :
+
+		#all-NaN rows (padding) output warnings, which are suppressed
+		wr.simplefilter( "ignore" , category = RuntimeWarning )
+
+		translation = - np.stack( [ np.nanmedian( x , axis = 1 ) , np.nanmedian( y , axis = 1 ) ] , axis = 1 )
+		x = x + translation[ : , 0 : 1 ]
+		y = y + translation[ : , 1 : 2 ]
+
+		I_xx = np.nansum( f * y ** 2 , axis = 1 )
+		I_yy = np.nansum( f * x ** 2 , axis = 1 )
+		I_xy = np.nansum( f * x * y , axis = 1 )
+
+		theta = np.arctan2( 2 * I_xy , I_xx - I_yy ) / 2
+
+		I_x = I_xx + I_xy * np.tan( theta )
+		I_y = I_yy - I_xy * np.tan( theta )
+
+		theta = np.where( I_x > I_y , theta - np.pi / 2 , theta )
+		x , y = rotate( x , y , theta )
+
+		A = np.nanmedian( np.where( x > 0 , x ** 2 , np.nan ) , axis = 1 )
+		B = np.nanmedian( np.where( x < 0 , x ** 2 , np.nan ) , axis = 1 )
+
+	flip = B > A
+	theta = np.where( flip , theta + np.pi , theta )
+	x = np.where( flip[ : , None ] , - x , x )
+	y = np.where( flip[ : , None ] , - y , y )
+
+	return( translation , theta , x , y )
+
+def ransac_line( x , y , f , seed = 42 ) :
+
+	"""
+	ransac_line( x , y , f , seed = 42 ): returns the angle of the line fitted through the points x , y by RANSAC, with
+	a linear regression as model and random_state = seed. f is not used.
+	"""
+
+	model_RANSACR = linear_model.RANSACRegressor( linear_model.LinearRegression() , random_state = seed )
+
+	with wr.catch_warnings() :
+
+		# also a bug warning occurs from linear models, RANSACR.
+		wr.simplefilter( "ignore" , category = RuntimeWarning )
+		#the points are given from the last to the first, the order in which RANSAC has always got them in
+		#lie_down, so that the random subsets drawn with the seed, and the averages lied down, do not change.
+		model_RANSACR.fit( x[ : : -1 , None ] , y[ : : -1 ] )
+
+	return( np.arctan( model_RANSACR.estimator_.coef_[ 0 ] ) )
+
+def theil_sen_line( x , y , f , seed = 42 , max_pairs = 100000 ) :
+
+	"""
+	theil_sen_line( x , y , f , seed = 42 , max_pairs = 100000 ): returns the angle of the line fitted through the points
+	x , y by the Theil-Sen estimator, i.e. the median of the slopes of the lines through each pair of points. If the pairs
+	are more than max_pairs, the median is computed on max_pairs pairs drawn at random with the given seed. f is not used.
+	"""
+
+	n = len( x )
+	i , j = np.triu_indices( n , 1 )
+
+	if len( i ) > max_pairs :
+
+		selection = np.random.default_rng( seed ).choice( len( i ) , max_pairs , replace = False )
+		i = i[ selection ]
+		j = j[ selection ]
+
+	dx = x[ j ] - x[ i ]
+	valid = dx != 0
+
+	if np.sum( valid ) == 0 :
+
+		return( 0.0 )
+
+	return( np.arctan( np.median( ( y[ j ] - y[ i ] )[ valid ] / dx[ valid ] ) ) )
+
+def weighted_pca_line( x , y , f , seed = 42 ) :
+
+	"""
+	weighted_pca_line( x , y , f , seed = 42 ): returns the angle, between - pi / 2 and pi / 2, of the principal axis
+	of the points x , y weighted by their fluorescence intensity f (negative or NaN intensities weight 0). seed is not
+	used, as the estimate is deterministic.
+	"""
+
+	w = np.nan_to_num( np.clip( f , 0 , None ) )
+
+	if np.sum( w ) == 0 :
+
+		w = np.ones( len( x ) )
+
+	w = w / np.sum( w )
+	dx = x - np.sum( w * x )
+	dy = y - np.sum( w * y )
+
+	angle = np.arctan2( 2 * np.sum( w * dx * dy ) , np.sum( w * dx ** 2 ) - np.sum( w * dy ** 2 ) ) / 2
+
+	return( angle )
+
+line_fitters = { 'ransac' : ransac_line , 'theil_sen' : theil_sen_line , 'weighted_pca' : weighted_pca_line }
+
+def lie_down_ensemble( trajectories , fitter = 'ransac' , seed = 42 ) :
+
+	"""
+	lie_down_ensemble( trajectories , fitter = 'ransac' , seed = 42 ): computes, for each trajectory in the list, the
+	translation and the angle that lie it down: the trajectory translated by 'translation' and rotated by 'angle' is centred
+	on the median of its coordinates and the line that best fits its points is along the x axis, with the trajectory
+	moving towards the positive x. The principal axes of inertia of all the trajectories are computed together (see
+	principal_orientation), and the line that best fits each trajectory, once oriented, is then fitted with the robust
+	estimator 'fitter': 'ransac' (default), 'theil_sen' or 'weighted_pca' (see ransac_line, theil_sen_line and
+	weighted_pca_line), with the given seed. The trajectories are not modified. Returns the list of the dictionaries
+	{ 'translation' , 'angle' } of the trajectories.
+	"""
+
+	if fitter not in line_fitters.keys() :
+
+		raise AttributeError( "lie_down_ensemble: Please, choose a value for the variable fitter between 'ransac' (default), 'theil_sen' and 'weighted_pca'" )
+
+	if len( trajectories ) == 0 :
+
+		return( [] )
+
+	x , y , f = stack_trajectories( trajectories )
+	translation , theta , x , y = principal_orientation( x , y , f )
+
+	output = []
+
+	for k in range( len( trajectories ) ) :
+
+		valid = ~ ( np.isnan( x[ k ] ) | np.isnan( y[ k ] ) )
+		angle = line_fitters[ fitter ]( x[ k , valid ] , y[ k , valid ] , f[ k , valid ] , seed )
+
+		output.append( { 'translation' : tuple( translation[ k ] ) , 'angle' : theta[ k ] - angle } )
+
+	return( output )
+
+def lie_down( t , fitter = 'ransac' , seed = 42 ) :
+
+	"""
+	lie_down( t , fitter = 'ransac' , seed = 42 ): returns the dictionary { 'translation' , 'angle' } that lies down
+	the trajectory t, which is not modified (see lie_down_ensemble).
+	"""
+
+	return( lie_down_ensemble( [ t ] , fitter , seed )[ 0 ] )
@@ -0,0 +1,211 @@
+# All the software here is distributed under the terms of the GNU General Public License Version 3, June 2007.
+# Trajalign is a free software and comes with ABSOLUTELY NO WARRANTY.
+#
+# You are welcome to redistribute the software. However, we appreciate is use of such software would result in citations of
+# Picco, A., Kaksonen, M., _Precise tracking of the dynamics of multiple proteins in endocytic events_,  Methods in Cell Biology, Vol. 139, pages 51-68 (2017)
+# http://www.sciencedirect.com/science/article/pii/S0091679X16301546
+#
+# Author: Andrea Picco (https://github.com/apicco)
+# Year: 2017
+
+import numpy as np
+
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+from scipy.cluster.hierarchy import linkage
+from sklearn.neighbors import NearestNeighbors
+from trajalign.log import logger
+
+def trajectory_features( t , bins = 8 ) :
+
+	"""
+	trajectory_features( t , bins = 8 ): returns the feature vector of the trajectory t used to find its most similar
+	trajectories (see candidate_pairs). The features are the lifetime, the distance between the first and the last
+	position, the spreads of the positions along and across their principal axis, and the shape of the fluorescence
+	intensity profile: the intensity normalised to its max and sampled at 'bins' equally spaced points of the lifetime.
+	All the features are invariant to rotations and translations, as the alignments are.
+	"""
+
+	coord = t.coord()
+	valid = ~ ( np.isnan( coord[ 0 ] ) | np.isnan( coord[ 1 ] ) )
+
+	if np.sum( valid ) > 0 :
+
+		first = np.argmax( valid )
+		last = len( valid ) - 1 - np.argmax( valid[ : : -1 ] )
+		displacement = np.sqrt( np.sum( ( coord[ : , last ] - coord[ : , first ] ) ** 2 ) )
+
+	else :
+
+		displacement = 0
+
+	if np.sum( valid ) > 1 :
+
+		spreads = np.sqrt( np.clip( np.linalg.eigvalsh( np.cov( coord[ : , valid ] ) ) , 0 , None ) )
+
+	else :
+
+		spreads = np.zeros( 2 )
+
+	#the shape of the fluorescence intensity profile
+	f = t.f()
+	valid_f = ~ np.isnan( f )
+
+	if ( np.sum( valid_f ) > 0 ) and ( np.nanmax( np.abs( f ) ) > 0 ) :
+
+		x = np.linspace( 0 , 1 , len( f ) )
+		profile = np.interp( np.linspace( 0 , 1 , bins ) , x[ valid_f ] , f[ valid_f ] / np.nanmax( np.abs( f ) ) )
+
+	else :
+
+		profile = np.zeros( bins )
+
+	return( np.concatenate( [ [ t.lifetime() , displacement , spreads[ 1 ] , spreads[ 0 ] ] , profile ] ) )
+
+def feature_matrix( trajectories , bins = 8 ) :
+
+	"""
+	feature_matrix( trajectories , bins = 8 ): returns the matrix whose rows are the features of the trajectories (see
+	trajectory_features), standardised to zero mean and unit variance. The columns of the intensity profile are weighted
+	so that the profile counts as much as each of the other features in the distances between trajectories.
+	"""
+
+	features = np.array( [ trajectory_features( t , bins ) for t in trajectories ] , dtype = 'float64' )
+
+	std = np.std( features , axis = 0 )
+	std[ std == 0 ] = 1
+	features = ( features - np.mean( features , axis = 0 ) ) / std
+	features[ : , 4 : ] = features[ : , 4 : ] / np.sqrt( bins )
+
+	return( features )
+
+def components( pairs , l ) :
+
+	"""
+	components( pairs , l ): returns the number of connected components of the graph whose l nodes are the trajectories
+	and whose edges are the pairs ( i , j ), and the component of each trajectory.
+	"""
+
+	if len( pairs ) == 0 :
+
+		return( l , np.arange( l ) )
+
+	i , j = np.array( pairs , dtype = 'int64' ).T
+	graph = coo_matrix( ( np.ones( len( pairs ) ) , ( i , j ) ) , shape = ( l , l ) )
+
+	return( connected_components( graph , directed = False ) )
+
+def candidate_pairs( trajectories , neighbours = 10 , bins = 8 ) :
+
+	"""
+	candidate_pairs( trajectories , neighbours = 10 , bins = 8 ): returns the pairs of indexes ( i , j ), with j < i, of the
+	trajectories that are among the 'neighbours' most similar trajectories of each other, as measured by the distances
+	between their features (see feature_matrix) in a nearest-neighbour index. If the graph of the pairs is not connected,
+	each component is joined to the rest of the trajectories by the pair of its closest trajectories, so that all the
+	trajectories can be aligned together. The pairs are O( N * neighbours ) instead of the O( N^2 ) of all the pairs.
+	Note that the transformations between the trajectories that are not paired are chained along the pairs (see
+	complete_transformations in trajalign.average), and that their errors add up along the chains, which are longer
+	the fewer the neighbours: the accuracy of the average depends on neighbours (see pairing_report).
+	"""
+
+	l = len( trajectories )
+
+	if ( not isinstance( neighbours , int ) ) or ( neighbours < 1 ) :
+
+		raise AttributeError( 'candidate_pairs: neighbours must be an integer larger than or equal to 1' )
+
+	if l < 2 :
+
+		return( [] )
+
+	features = feature_matrix( trajectories , bins )
+
+	index = NearestNeighbors( n_neighbors = min( neighbours + 1 , l ) ).fit( features )
+	distances , nearest = index.kneighbors( features )
+
+	pairs = set()
+
+	for i in range( l ) :
+
+		#the trajectory itself is among its nearest neighbours
+		for j in [ n for n in nearest[ i ] if n != i ][ : neighbours ] :
+
+			pairs.add( ( max( i , j ) , min( i , j ) ) )
+
+	n_components , component = components( list( pairs ) , l )
+
+	while n_components > 1 :
+
+		#join the smallest component to its closest trajectory outside the component
+		c = np.argmin( np.bincount( component ) )
+		inside = np.flatnonzero( component == c )
+		outside = np.flatnonzero( component != c )
+
+		distances , nearest = NearestNeighbors( n_neighbors = 1 ).fit( features[ outside ] ).kneighbors( features[ inside ] )
+		closest = np.argmin( distances[ : , 0 ] )
+
+		i = int( inside[ closest ] )
+		j = int( outside[ nearest[ closest , 0 ] ] )
+		pairs.add( ( max( i , j ) , min( i , j ) ) )
+
+		n_components , component = components( list( pairs ) , l )
+
+	return( sorted( pairs ) )
+
+def pairing_report( pairs , printit = True , sparse_degree = 8 ) :
+
+	"""
+	pairing_report( pairs , printit = True , sparse_degree = 8 ): reports how connected the graph of the aligned pairs of 
+	trajectories is. pairs is the symmetric boolean matrix whose element i , j is True if the trajectories i and j were 
+	aligned together (see transformations[ 'pairs' ] in compute_transformations). Returns the number of trajectories, of 
+	aligned pairs and of all the possible pairs, the min, mean and max number of trajectories aligned to each trajectory 
+	(degree), the number of connected components of the graph and the size of the largest one. If printit is True and the
+	trajectories are aligned, on average, to fewer than sparse_degree other trajectories, while not all the pairs are
+	aligned, a warning is output: the transformations chained along such a sparse graph can make the average noticeably
+	less precise than that of all the pairs (e.g. for 12 trajectories of the example of trajalign, the alignment precision
+	is about 20% worse with 5 neighbours and about 50% worse with 3, while 7 neighbours are as precise as all the pairs).
+	"""
+
+	l = len( pairs )
+	degrees = np.sum( pairs , axis = 1 )
+	i , j = np.nonzero( np.tril( pairs , -1 ) )
+	n_components , component = components( list( zip( i , j ) ) , l )
+
+	report = {
+			'trajectories' : l ,
+			'pairs' : len( i ) ,
+			'all_pairs' : l * ( l - 1 ) // 2 ,
+			'min_degree' : int( np.min( degrees ) ) ,
+			'mean_degree' : float( np.mean( degrees ) ) ,
+			'max_degree' : int( np.max( degrees ) ) ,
+			'components' : int( n_components ) ,
+			'largest_component' : int( np.max( np.bincount( component ) ) )
+			}
+
+	if printit :
+
+		logger.info( '________________' )
+		logger.info( 'pairing: ' + str( report[ 'pairs' ] ) + ' pairs aligned out of ' + str( report[ 'all_pairs' ] ) )
+		logger.info( 'trajectories aligned to each trajectory: min ' + str( report[ 'min_degree' ] ) + ', mean ' + str( round( report[ 'mean_degree' ] , 2 ) ) + ', max ' + str( report[ 'max_degree' ] ) )
+		logger.info( 'connected components: ' + str( report[ 'components' ] ) + ' (the largest has ' + str( report[ 'largest_component' ] ) + ' trajectories)' )
+
+		if ( report[ 'pairs' ] < report[ 'all_pairs' ] ) and ( report[ 'mean_degree' ] < sparse_degree ) :
+
+			logger.warning( 'Warning: the trajectories are aligned on average to ' + str( round( report[ 'mean_degree' ] , 2 ) ) + ' other trajectories only, and the average can be less precise than that of all the pairs. Consider increasing neighbours.' )
+
+	return( report )
+
+def guide_tree( trajectories , bins = 8 ) :
+
+	"""
+	guide_tree( trajectories , bins = 8 ): returns the guide tree along which the trajectories are progressively merged (see
+	progressive_transformations in trajalign.average). The tree is the average linkage hierarchical clustering of the features
+	of the trajectories (see feature_matrix), in the format of scipy.cluster.hierarchy.linkage: the k-th row merges the nodes
+	in its first two columns into the node len( trajectories ) + k. The nodes smaller than len( trajectories ) are the trajectories.
+	"""
+
+	if len( trajectories ) < 2 :
+
+		return( np.zeros( ( 0 , 4 ) ) )
+
+	return( linkage( feature_matrix( trajectories , bins ) , method = 'average' ) )
@@ -0,0 +1,406 @@
+# All the software here is distributed under the terms of the GNU General Public License Version 3, June 2007.
+# Trajalign is a free software and comes with ABSOLUTELY NO WARRANTY.
+#
+# You are welcome to redistribute the software. However, we appreciate is use of such software would result in citations of
+# Picco, A., Kaksonen, M., _Precise tracking of the dynamics of multiple proteins in endocytic events_,  Methods in Cell Biology, Vol. 139, pages 51-68 (2017)
+# http://www.sciencedirect.com/science/article/pii/S0091679X16301546
+#
+# Author: Andrea Picco (https://github.com/apicco)
+# Year: 2017
+
+import os
+import json
+import time
+import socket
+import uuid
+import threading
+import contextlib
+import numpy as np
+from trajalign.traj import Traj
+from trajalign.counters import WorkCounters
+from trajalign.storage import replace_file , save_alignments , load_alignments
+
+#the files of a queue in its directory:
+#manifest.json: the options of the alignments and the number of shards; it is written last, so that a queue
+#whose manifest exists is complete;
+#trajectories.npz: the trajectories to align;
+#shards/<shard>.json: the pairs of trajectories ( i , j ) of each shard;
+#locks/<shard>.lock: the lock of a shard claimed by a worker, which contains the token of the ShardQueue of the worker: its
+#host, its process and a random string, so that two queues of the same process do not take each other's locks;
+#results/<shard>.npz: the alignments of the pairs of a shard (see save_alignments in trajalign.storage), and the work
+#done to compute them.
+#All the files are written with replace_file (see trajalign.storage), so that a worker never reads a partial file.
+
+def owner() :
+
+	#the identity of the worker: its host and process
+	return( socket.gethostname() + ':' + str( os.getpid() ) )
+
+def lock_owner( text ) :
+
+	#the host and process of the worker that wrote the lock text (see ShardQueue.token)
+	host , pid = text.split( ':' )[ : 2 ]
+
+	return( host , pid )
+
+class ShardQueue :
+
+	"""
+	ShardQueue( directory , stale_after = 600 ): a queue of shards of pairs of trajectories to align, in a directory that
+	can be shared by processes on different hosts (e.g. the nodes of a cluster with a shared filesystem), without any
+	scheduler or service. create( trajectories , pairs , manifest , shard_size ) writes the trajectories and splits the pairs
+	in shards of shard_size pairs. Each worker claims a shard with claim(), which creates its lock file exclusively, aligns
+	its pairs (see run_shards in trajalign.average), refreshes the lock with heartbeat( shard ), or with a thread within
+	heartbeats( shard ), and writes the alignments with complete( shard , alignments , counts ). The lock of a shard whose
+	worker died (on the same host) or did not refresh it for stale_after seconds is stale, and the shard can be claimed by
+	another worker (see reclaim). The lock contains the token of the queue that claimed it, and only that queue refreshes
+	and releases it. results() reads the alignments of all the shards, once pending() is empty.
+	"""
+
+	def __init__( self , directory , stale_after = 600 ) :
+
+		if stale_after <= 0 :
+
+			raise AttributeError( 'ShardQueue: stale_after must be larger than 0' )
+
+		self.directory = directory
+		self.stale_after = stale_after
+		self.token = owner() + ':' + uuid.uuid4().hex
+
+	def path( self , *names ) :
+
+		return( os.path.join( self.directory , *names ) )
+
+	def exists( self ) :
+
+		return( os.path.exists( self.path( 'manifest.json' ) ) )
+
+	def create( self , trajectories , pairs , manifest , shard_size = 64 ) :
+
+		"""
+		create( trajectories , pairs , manifest , shard_size = 64 ): writes the trajectories, the pairs ( i , j ) of
+		trajectories to align, split in consecutive shards of shard_size pairs, and the dictionary manifest of the
+		options of the alignments, to which the number of shards is added.
+		"""
+
+		if ( not isinstance( shard_size , int ) ) or ( shard_size < 1 ) :
+
+			raise AttributeError( 'ShardQueue.create: shard_size must be an integer larger than or equal to 1' )
+
+		for d in [ 'shards' , 'locks' , 'results' ] :
+
+			if not os.path.exists( self.path( d ) ) :
+
+				os.makedirs( self.path( d ) )
+
+		#the arrays of the trajectories are saved as they are, so that the workers align exactly the same trajectories
+		arrays = { str( k ) + '/' + s : getattr( trajectories[ k ] , s ) for k in range( len( trajectories ) ) for s in Traj.__slots__[ 1 : ] }
+		annotations = json.dumps( [ t.annotations() for t in trajectories ] , default = str )
+		replace_file( self.path( 'trajectories.npz' ) , lambda f : np.savez( f , annotations = annotations , **arrays ) , 'wb' )
+
+		shards = [ [ [ int( i ) , int( j ) ] for i , j in pairs[ k : k + shard_size ] ] for k in range( 0 , len( pairs ) , shard_size ) ]
+
+		for k in range( len( shards ) ) :
+
+			replace_file( self.path( 'shards' , str( k ).zfill( 5 ) + '.json' ) , lambda f : json.dump( shards[ k ] , f ) )
+
+		manifest = dict( manifest , shards = len( shards ) , trajectories = len( trajectories ) )
+		replace_file( self.path( 'manifest.json' ) , lambda f : json.dump( manifest , f ) )
+
+	def manifest( self ) :
+
+		with open( self.path( 'manifest.json' ) , 'r' ) as f :
+
+			return( json.load( f ) )
+
+	def trajectories( self ) :
+
+		"""
+		trajectories(): the trajectories written by create.
+		"""
+
+		trajectories = []
+
+		with np.load( self.path( 'trajectories.npz' ) , allow_pickle = False ) as data :
+
+			annotations = json.loads( str( data[ 'annotations' ] ) )
+
+			for k in range( len( annotations ) ) :
+
+				t = Traj( **annotations[ k ] )
+
+				for s in Traj.__slots__[ 1 : ] :
+
+					setattr( t , s , data[ str( k ) + '/' + s ] )
+
+				trajectories.append( t )
+
+		return( trajectories )
+
+	def shards( self ) :
+
+		return( [ str( k ).zfill( 5 ) for k in range( self.manifest()[ 'shards' ] ) ] )
+
+	def pending( self ) :
+
+		"""
+		pending(): the shards whose alignments have not been written yet, whether they are claimed or not.
+		"""
+
+		return( [ s for s in self.shards() if not os.path.exists( self.path( 'results' , s + '.npz' ) ) ] )
+
+	def lock_state( self , lock ) :
+
+		#the owner of a lock and the time it was last refreshed, or None if there is no lock
+		try :
+
+			mtime = os.path.getmtime( lock )
+
+			with open( lock , 'r' ) as f :
+
+				return( ( f.read() , mtime ) )
+
+		except OSError :
+
+			return( None )
+
+	def stale( self , state ) :
+
+		#a lock, whose state is given by lock_state, is stale if it was not refreshed for stale_after seconds, or if its
+		#worker runs on this host and has died
+		if state is None :
+
+			return( False )
+
+		owner_text , mtime = state
+
+		if time.time() - mtime > self.stale_after :
+
+			return( True )
+
+		try :
+
+			host , pid = lock_owner( owner_text )
+
+		except ValueError :
+
+			#the lock is being written
+			return( False )
+
+		if host != socket.gethostname() :
+
+			return( False )
+
+		try :
+
+			os.kill( int( pid ) , 0 )
+
+		except ProcessLookupError :
+
+			return( True )
+
+		except ( PermissionError , ValueError ) :
+
+			return( False )
+
+		return( False )
+
+	def remove_lock( self , lock , check ) :
+
+		"""
+		remove_lock( lock , check ): removes the lock and returns True if check( file_name ) is True, where file_name is
+		the lock renamed to a name unique to this queue, or returns False. As the rename is atomic, only one worker can take
+		the lock, and check reads the lock that was taken: another worker could have reclaimed the lock and claimed the
+		shard, or the worker of the lock could have refreshed it, since the lock was last read. If check is False, the lock
+		is put back.
+		"""
+
+		taken = lock + '.' + self.token.replace( ':' , '.' ) + '.taken'
+
+		try :
+
+			os.rename( lock , taken )
+
+		except OSError :
+
+			#another worker renamed the lock first
+			return( False )
+
+		if check( taken ) :
+
+			os.remove( taken )
+			return( True )
+
+		#the lock is put back only if no other worker has locked the shard since, as os.link never replaces a file
+		try :
+
+			os.link( taken , lock )
+
+		except FileExistsError :
+
+			pass
+
+		except OSError :
+
+			#the filesystem does not support hard links
+			os.rename( taken , lock )
+			return( False )
+
+		os.remove( taken )
+
+		return( False )
+
+	def reclaim( self , lock , state ) :
+
+		"""
+		reclaim( lock , state ): removes the lock, found stale in the state given by lock_state, and returns True, or
+		returns False if the lock changed since (see remove_lock).
+		"""
+
+		return( self.remove_lock( lock , lambda taken : self.lock_state( taken ) == state ) )
+
+	def owns( self , lock ) :
+
+		#whether the lock was written by this queue
+		state = self.lock_state( lock )
+
+		return( ( state is not None ) and ( state[ 0 ] == self.token ) )
+
+	def claim( self ) :
+
+		"""
+		claim(): claims the first pending shard that is not locked, or whose lock is stale, and returns its name and its
+		list of pairs ( i , j ), or None if no shard can be claimed.
+		"""
+
+		for s in self.pending() :
+
+			lock = self.path( 'locks' , s + '.lock' )
+
+			state = self.lock_state( lock )
+
+			if self.stale( state ) and ( not self.reclaim( lock , state ) ) :
+
+				continue
+
+			try :
+
+				fd = os.open( lock , os.O_CREAT | os.O_EXCL | os.O_WRONLY )
+
+			except FileExistsError :
+
+				continue
+
+			with os.fdopen( fd , 'w' ) as f :
+
+				f.write( self.token )
+
+			#the shard could have been completed by another worker since it was listed as pending
+			if os.path.exists( self.path( 'results' , s + '.npz' ) ) :
+
+				self.release( s )
+				continue
+
+			with open( self.path( 'shards' , s + '.json' ) , 'r' ) as f :
+
+				return( s , [ ( i , j ) for i , j in json.load( f ) ] )
+
+		return( None )
+
+	def heartbeat( self , shard ) :
+
+		"""
+		heartbeat( shard ): refreshes the lock of the shard, so that it does not become stale, and returns True, or returns
+		False if the lock is not that of this queue anymore (e.g. it became stale and was reclaimed by another worker).
+		"""
+
+		lock = self.path( 'locks' , shard + '.lock' )
+
+		if not self.owns( lock ) :
+
+			return( False )
+
+		try :
+
+			os.utime( lock )
+
+		except OSError :
+
+			return( False )
+
+		return( True )
+
+	@contextlib.contextmanager
+	def heartbeats( self , shard , interval = None ) :
+
+		"""
+		heartbeats( shard , interval = None ): a context within which a thread refreshes the lock of the shard with heartbeat
+		every interval seconds (default is stale_after / 4), so that the lock does not become stale however long the
+		alignment of a pair of the shard takes.
+		"""
+
+		if interval is None :
+
+			interval = self.stale_after / 4
+
+		stop = threading.Event()
+
+		def beat() :
+
+			while not stop.wait( interval ) :
+
+				self.heartbeat( shard )
+
+		thread = threading.Thread( target = beat , daemon = True )
+		thread.start()
+
+		try :
+
+			yield
+
+		finally :
+
+			stop.set()
+			thread.join()
+
+	def release( self , shard ) :
+
+		"""
+		release( shard ): removes the lock of the shard, only if it is that of this queue.
+		"""
+
+		lock = self.path( 'locks' , shard + '.lock' )
+
+		if self.owns( lock ) :
+
+			self.remove_lock( lock , self.owns )
+
+	def complete( self , shard , alignments , counts ) :
+
+		"""
+		complete( shard , alignments , counts ): writes the alignments of the pairs of the shard (the dictionary of align_pairs
+		in trajalign.average) and the WorkCounters counts of the work done to compute them, and releases the shard.
+		"""
+
+		save_alignments( alignments , self.path( 'results' , shard + '.npz' ) , work = json.dumps( counts.as_dict() ) )
+
+		self.release( shard )
+
+	def results( self ) :
+
+		"""
+		results(): returns the dictionary of the alignments of the pairs of all the completed shards, as align_pairs in
+		trajalign.average, and the WorkCounters of the work done by the workers to compute them.
+		"""
+
+		alignments = {}
+		counts = WorkCounters()
+
+		for s in self.shards() :
+
+			with np.load( self.path( 'results' , s + '.npz' ) , allow_pickle = False ) as data :
+
+				alignments.update( load_alignments( data ) )
+				counts.update( json.loads( str( data[ 'work' ] ) ) )
+
+		return( alignments , counts )
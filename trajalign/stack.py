@@ -0,0 +1,231 @@
+# All the software here is distributed under the terms of the GNU General Public License Version 3, June 2007.
+# Trajalign is a free software and comes with ABSOLUTELY NO WARRANTY.
+#
+# You are welcome to redistribute the software. However, we appreciate is use of such software would result in citations of
+# Picco, A., Kaksonen, M., _Precise tracking of the dynamics of multiple proteins in endocytic events_,  Methods in Cell Biology, Vol. 139, pages 51-68 (2017)
+# http://www.sciencedirect.com/science/article/pii/S0091679X16301546
+#
+# Author: Andrea Picco (https://github.com/apicco)
+# Year: 2017
+
+from trajalign.traj import Traj
+from trajalign.view import TrajView
+import copy as cp
+import numpy as np
+
+class TrajStack:
+
+	"""
+	TrajStack( trajectories ): an ensemble of trajectories stored in one float array of shape ( N , attribute , T ), where
+	N is the number of trajectories and T is the number of time points of a time grid shared by all the trajectories, with
+	time interval delta_t. The attributes are the attributes of the trajectories (see Traj.attributes()); 'coord' and
+	'coord_err' take two rows each (x and y). The time points of the grid that are outside a trajectory are nan, and the
+	validity mask ( N , T ) is True where a trajectory is defined. A TrajStack is built from a list of trajectories with
+	the same attributes and the same delta_t, and converts back to the same list of trajectories with trajs(). The
+	trajectories can also be TrajView, whose transformations are applied while they are written in the stack.
+	"""
+
+	__slots__ = [ '_annotations' , '_attributes' , '_rows' , '_data' , '_mask' , '_span' , '_t0' , '_delta_t' ]
+
+	def __init__( self , trajectories ) :
+
+		if len( trajectories ) == 0 :
+
+			raise IndexError( 'TrajStack: there are no trajectories in the list' )
+
+		self._attributes = trajectories[ 0 ].attributes()
+
+		for t in trajectories :
+
+			if t.attributes() != self._attributes :
+
+				raise AttributeError( 'TrajStack: all the trajectories must have the same attributes' )
+
+		if 't' not in self._attributes :
+
+			raise AttributeError( 'TrajStack: the trajectories need the time attribute t to be stacked' )
+
+		if 'delta_t' in trajectories[ 0 ].annotations().keys() :
+			self._delta_t = float( trajectories[ 0 ].annotations()[ 'delta_t' ] )
+		else :
+			self._delta_t = min( trajectories[ 0 ].t()[ 1 : ] - trajectories[ 0 ].t()[ : - 1 ] )
+
+		#the rows of the data array that store each attribute
+		self._rows = {}
+		n_rows = 0
+		for a in self._attributes :
+
+			if a in ( 'coord' , 'coord_err' ) :
+				self._rows[ a ] = slice( n_rows , n_rows + 2 )
+				n_rows += 2
+			else :
+				self._rows[ a ] = slice( n_rows , n_rows + 1 )
+				n_rows += 1
+
+		#the time grid starts with the earliest trajectory and ends with the latest
+		self._t0 = min( [ t.start() for t in trajectories ] )
+		self._span = np.array( [ [ self.index( t.start() ) , self.index( t.end() ) ] for t in trajectories ] , dtype = 'int64' )
+
+		l = len( trajectories )
+		T = int( np.max( self._span[ : , 1 ] ) ) + 1
+
+		self._data = np.full( ( l , n_rows , T ) , np.nan )
+		self._mask = np.zeros( ( l , T ) , dtype = 'bool' )
+		self._annotations = [ None ] * l
+
+		for j in range( l ) :
+
+			self.set( j , trajectories[ j ] )
+
+	def __len__( self ) : #the number of trajectories in the stack
+		return self._data.shape[ 0 ]
+
+	def __repr__( self ) :
+		return 'TrajStack of ' + str( len( self ) ) + ' trajectories with ' + str( self._data.shape[ 2 ] ) + ' time points and attributes ' + str( self._attributes )
+
+	def index( self , t ) :
+
+		"""
+		index( t ): the index of the time t in the time grid of the stack.
+		"""
+
+		return int( np.rint( ( t - self._t0 ) / self._delta_t ) )
+
+	def set( self , j , t ) :
+
+		"""
+		set( j , t ): writes the trajectory t, a Traj or a TrajView, in the j-th row of the stack. t must fit within the 
+		time grid of the stack. The transformations of a TrajView are applied while it is written (see TrajView.write).
+		"""
+
+		if t.attributes() != self._attributes :
+
+			raise AttributeError( 'TrajStack: the trajectory does not have the same attributes of the stack' )
+
+		if isinstance( t , TrajView ) :
+			times = t.window()[ 0 ]
+			i0 = self.index( times[ 0 ] )
+			i1 = i0 + len( times )
+		else :
+			i0 = self.index( t.start() )
+			i1 = i0 + len( t )
+
+		if ( i0 < 0 ) | ( i1 > self._data.shape[ 2 ] ) :
+
+			raise IndexError( 'TrajStack: the trajectory is outside the time grid of the stack' )
+
+		self._data[ j , : , : ] = np.nan
+
+		if isinstance( t , TrajView ) :
+			t.write( self._data[ j , : , i0 : i1 ] , self._rows )
+		else :
+			for a in self._attributes :
+
+				self._data[ j , self._rows[ a ] , i0 : i1 ] = getattr( t , '_' + a )
+
+		self._mask[ j , : ] = False
+		self._mask[ j , i0 : i1 ] = True
+		self._span[ j ] = [ i0 , i1 - 1 ]
+		self._annotations[ j ] = dict( t.annotations() ) if isinstance( t , TrajView ) else t.annotations()
+
+	def attributes( self ) :
+
+		"""
+		attributes(): the attributes of the trajectories in the stack.
+		"""
+
+		return list( self._attributes )
+
+	def annotations( self , j ) :
+
+		"""
+		annotations( j ): the annotations of the j-th trajectory.
+		"""
+
+		return self._annotations[ j ]
+
+	def delta_t( self ) :
+
+		"""
+		delta_t(): the time interval of the time grid.
+		"""
+
+		return self._delta_t
+
+	def grid( self ) :
+
+		"""
+		grid(): the time points shared by all the trajectories in the stack.
+		"""
+
+		return self._t0 + np.arange( self._data.shape[ 2 ] ) * self._delta_t
+
+	def t( self , j ) :
+
+		"""
+		t( j ): the time points of the j-th trajectory.
+		"""
+
+		return np.array( self._data[ j , self._rows[ 't' ].start , self._span[ j ][ 0 ] : self._span[ j ][ 1 ] + 1 ] )
+
+	def mask( self ) :
+
+		"""
+		mask(): the ( N , T ) boolean array that is True where the trajectories are defined.
+		"""
+
+		return self._mask
+
+	def data( self ) :
+
+		"""
+		data(): the ( N , attribute , T ) array of the stack.
+		"""
+
+		return self._data
+
+	def values( self , a ) :
+
+		"""
+		values( a ): a view of the values of the attribute a of all the trajectories, whose shape is ( N , T ),
+		or ( N , 2 , T ) for 'coord' and 'coord_err'.
+		"""
+
+		if a not in self._attributes :
+
+			raise AttributeError( 'TrajStack: the attribute ' + a + ' is not in the stack' )
+
+		if a in ( 'coord' , 'coord_err' ) :
+			return self._data[ : , self._rows[ a ] , : ]
+		else :
+			return self._data[ : , self._rows[ a ].start , : ]
+
+	def traj( self , j ) :
+
+		"""
+		traj( j ): the j-th trajectory of the stack, as a Traj.
+		"""
+
+		t = Traj( **cp.deepcopy( self._annotations[ j ] ) )
+		i0 , i1 = self._span[ j ][ 0 ] , self._span[ j ][ 1 ] + 1
+
+		for a in self._attributes :
+
+			x = self._data[ j , self._rows[ a ] , i0 : i1 ]
+
+			if a in ( 'coord' , 'coord_err' ) :
+				setattr( t , '_' + a , np.array( x ) )
+			elif a == 'frames' :
+				setattr( t , '_' + a , np.array( x[ 0 ] , dtype = 'int64' ) )
+			else :
+				setattr( t , '_' + a , np.array( x[ 0 ] ) )
+
+		return t
+
+	def trajs( self ) :
+
+		"""
+		trajs(): the list of the trajectories of the stack.
+		"""
+
+		return [ self.traj( j ) for j in range( len( self ) ) ]
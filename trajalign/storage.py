@@ -0,0 +1,118 @@
+# All the software here is distributed under the terms of the GNU General Public License Version 3, June 2007.
+# Trajalign is a free software and comes with ABSOLUTELY NO WARRANTY.
+#
+# You are welcome to redistribute the software. However, we appreciate is use of such software would result in citations of
+# Picco, A., Kaksonen, M., _Precise tracking of the dynamics of multiple proteins in endocytic events_,  Methods in Cell Biology, Vol. 139, pages 51-68 (2017)
+# http://www.sciencedirect.com/science/article/pii/S0091679X16301546
+#
+# Author: Andrea Picco (https://github.com/apicco)
+# Year: 2017
+
+import os
+import json
+import socket
+import numpy as np
+
+def replace_file( file_name , write , mode = 'w' ) :
+
+	"""
+	replace_file( file_name , write , mode = 'w' ): writes the file file_name through write( f ), where f is the file
+	opened with mode. The file is written first with a temporary name, flushed to the disk and then renamed, so that an
+	interrupted write never corrupts a previous file and other processes never read a partial file. The temporary name
+	is unique to the host and process, as more processes can write the same file (see ShardQueue in trajalign.shards).
+	"""
+
+	tmp = file_name + '.' + socket.gethostname() + '.' + str( os.getpid() ) + '.tmp'
+
+	with open( tmp , mode ) as f :
+
+		write( f )
+		f.flush()
+		os.fsync( f.fileno() )
+
+	os.replace( tmp , file_name )
+
+def save_transformations( transformations , file_name , **arrays ) :
+
+	"""
+	save_transformations( transformations , file_name , **arrays ): saves the transformations computed by
+	compute_transformations (see trajalign.average) in the numpy .npz file file_name, with replace_file. The keyword
+	arrays are saved with them (e.g. the fingerprint of a Checkpoint, see trajalign.checkpoint), and are ignored by
+	load_transformations.
+	"""
+
+	replace_file( file_name , lambda f : np.savez( f ,
+			angles = transformations[ 'angles' ] ,
+			rcs = transformations[ 'rcs' ] ,
+			lcs = transformations[ 'lcs' ] ,
+			lags = transformations[ 'lags' ] ,
+			pairs = transformations[ 'pairs' ] ,
+			scores = transformations[ 'scores' ] ,
+			files = np.array( transformations[ 'files' ] , dtype = 'str' ) ,
+			options = json.dumps( transformations[ 'options' ] ) ,
+			**arrays
+			) , 'wb' )
+
+def load_transformations( file_name ) :
+
+	"""
+	load_transformations( file_name ): loads the transformations saved by save_transformations.
+	"""
+
+	with np.load( file_name , allow_pickle = False ) as data :
+
+		return({
+			'angles' : data[ 'angles' ],
+			'rcs' : data[ 'rcs' ],
+			'lcs' : data[ 'lcs' ],
+			'lags' : data[ 'lags' ],
+			'pairs' : data[ 'pairs' ],
+			'scores' : data[ 'scores' ],
+			'files' : [ str( f ) for f in data[ 'files' ] ],
+			'options' : json.loads( str( data[ 'options' ] ) )
+			})
+
+def save_alignments( alignments , file_name , **arrays ) :
+
+	"""
+	save_alignments( alignments , file_name , **arrays ): saves the dictionary of the alignments of pairs of trajectories
+	( i , j ) returned by align_pairs (see trajalign.average) in the numpy .npz file file_name, with replace_file. Unlike
+	save_transformations, which saves the matrices of all the pairs of trajectories, only the listed pairs are saved, so
+	that a few alignments of many trajectories take little space (e.g. a shard of a ShardQueue, see trajalign.shards).
+	The keyword arrays are saved with them.
+	"""
+
+	pairs = list( alignments.keys() )
+
+	replace_file( file_name , lambda f : np.savez( f ,
+			pairs = np.array( pairs , dtype = 'int64' ).reshape( ( len( pairs ) , 2 ) ) ,
+			lags = np.array( [ alignments[ p ][ 'lag' ] for p in pairs ] , dtype = 'int64' ) ,
+			angles = np.array( [ alignments[ p ][ 'angle' ] for p in pairs ] , dtype = 'float64' ) ,
+			rcs = np.array( [ alignments[ p ][ 'rc' ] for p in pairs ] , dtype = 'float64' ).reshape( ( len( pairs ) , 2 ) ) ,
+			lcs = np.array( [ alignments[ p ][ 'lc' ] for p in pairs ] , dtype = 'float64' ).reshape( ( len( pairs ) , 2 ) ) ,
+			scores = np.array( [ alignments[ p ][ 'score' ] for p in pairs ] , dtype = 'float64' ) ,
+			pruned_lags = np.array( [ alignments[ p ].get( 'pruned_lags' , 0 ) for p in pairs ] , dtype = 'int64' ) ,
+			**arrays
+			) , 'wb' )
+
+def load_alignments( data ) :
+
+	"""
+	load_alignments( data ): returns the dictionary of the alignments saved by save_alignments in data, the file loaded
+	with numpy.load.
+	"""
+
+	alignments = {}
+
+	for k in range( len( data[ 'pairs' ] ) ) :
+
+		alignments[ ( int( data[ 'pairs' ][ k , 0 ] ) , int( data[ 'pairs' ][ k , 1 ] ) ) ] = {
+				'lag' : int( data[ 'lags' ][ k ] ),
+				'angle' : data[ 'angles' ][ k ],
+				'rc' : data[ 'rcs' ][ k ],
+				'lc' : data[ 'lcs' ][ k ],
+				'score' : data[ 'scores' ][ k ],
+				'pruned_lags' : int( data[ 'pruned_lags' ][ k ] )
+				}
+
+	return( alignments )
@@ -0,0 +1,219 @@
+# All the software here is distributed under the terms of the GNU General Public License Version 3, June 2007.
+# Trajalign is a free software and comes with ABSOLUTELY NO WARRANTY.
+#
+# You are welcome to redistribute the software. However, we appreciate is use of such software would result in citations of
+# Picco, A., Kaksonen, M., _Precise tracking of the dynamics of multiple proteins in endocytic events_,  Methods in Cell Biology, Vol. 139, pages 51-68 (2017)
+# http://www.sciencedirect.com/science/article/pii/S0091679X16301546
+#
+# Author: Andrea Picco (https://github.com/apicco)
+# Year: 2017
+
+import numpy as np
+
+class RunningStatistics:
+
+	"""
+	RunningStatistics( shape ): running count, mean and variance of arrays of values with shape 'shape', updated one
+	array at a time with the Welford algorithm. nan values are skipped, element by element. The memory used does not
+	depend on the number of arrays.
+	"""
+
+	def __init__( self , shape ) :
+
+		self._count = np.zeros( shape )
+		self._mean = np.zeros( shape )
+		self._M2 = np.zeros( shape )
+
+	def update( self , x ) :
+
+		"""
+		update( x ): adds the array x to the statistics.
+		"""
+
+		valid = ~ np.isnan( x )
+		x = np.where( valid , x , 0 )
+
+		self._count += valid
+		delta = np.where( valid , x - self._mean , 0 )
+		self._mean += np.divide( delta , self._count , out = np.zeros( x.shape ) , where = valid )
+		self._M2 += delta * np.where( valid , x - self._mean , 0 )
+
+	def extend( self , before , after ) :
+
+		"""
+		extend( before , after ): adds 'before' and 'after' empty elements at the beginning and at the end of the last axis.
+		"""
+
+		pad = [ ( 0 , 0 ) ] * ( self._count.ndim - 1 ) + [ ( before , after ) ]
+		self._count = np.pad( self._count , pad )
+		self._mean = np.pad( self._mean , pad )
+		self._M2 = np.pad( self._M2 , pad )
+
+	def count( self ) :
+
+		return self._count
+
+	def mean( self ) :
+
+		"""
+		mean(): the mean, which is nan where there are no values (as in np.nanmean).
+		"""
+
+		return np.where( self._count > 0 , self._mean , np.nan )
+
+	def std( self ) :
+
+		"""
+		std(): the standard deviation, with the normalisation of np.nanstd (i.e. divided by the count).
+		"""
+
+		with np.errstate( invalid = 'ignore' , divide = 'ignore' ) :
+
+			return np.sqrt( self._M2 / self._count )
+
+class QuantileSketch:
+
+	"""
+	QuantileSketch( shape , k = 512 ): approximate quantiles of arrays of values with shape 'shape', updated one array at a
+	time. Each element has a sketch made of levels of k values: the values are first stored in the level 0 and, when a level
+	is full, it is sorted and every other value is moved to the next level, where each value weights twice as much
+	(Munro and Paterson, 1980; Manku et al., 1998). The quantiles are exact as long as fewer than k values were added, and
+	the error in the rank of a quantile is otherwise at most about log2( count / k ) / k of the count. The memory used
+	grows with the logarithm of the number of arrays. nan values are skipped, element by element.
+	"""
+
+	def __init__( self , shape , k = 512 ) :
+
+		if ( k < 2 ) | ( k % 2 != 0 ) :
+
+			raise AttributeError( 'QuantileSketch: k must be an even number larger than or equal to 2' )
+
+		self._k = k
+		self._shape = tuple( shape )
+		self._levels = []
+		self._fill = []
+		self._parity = []
+		self.add_level()
+
+	def add_level( self ) :
+
+		self._levels.append( np.full( ( self._k , ) + self._shape , np.nan ) )
+		self._fill.append( np.zeros( self._shape , dtype = 'int64' ) )
+		self._parity.append( np.zeros( self._shape , dtype = 'int64' ) )
+
+	def update( self , x ) :
+
+		"""
+		update( x ): adds the array x to the sketch.
+		"""
+
+		valid = ~ np.isnan( x )
+		idx = np.nonzero( valid )
+
+		self._levels[ 0 ][ ( self._fill[ 0 ][ idx ] , ) + idx ] = x[ idx ]
+		self._fill[ 0 ] += valid
+
+		self.compact( 0 )
+
+	def compact( self , h ) :
+
+		#the elements whose level h is full are sorted and every other value (alternating the first
+		#value taken, to not bias the quantiles) is moved to the level h + 1.
+		full = np.nonzero( self._fill[ h ] == self._k )
+
+		if len( full[ 0 ] ) == 0 :
+
+			return
+
+		if h + 1 == len( self._levels ) :
+
+			self.add_level()
+
+		values = np.sort( self._levels[ h ][ ( slice( None ) , ) + full ] , axis = 0 )
+		offset = self._parity[ h ][ full ]
+		half = values[ np.arange( 0 , self._k , 2 )[ : , None ] + offset[ None , : ] , np.arange( len( offset ) )[ None , : ] ]
+
+		rows = self._fill[ h + 1 ][ full ][ None , : ] + np.arange( self._k // 2 )[ : , None ]
+		self._levels[ h + 1 ][ ( rows , ) + tuple( f[ None , : ] for f in full ) ] = half
+		self._fill[ h + 1 ][ full ] += self._k // 2
+
+		self._levels[ h ][ ( slice( None ) , ) + full ] = np.nan
+		self._fill[ h ][ full ] = 0
+		self._parity[ h ][ full ] = 1 - offset
+
+		self.compact( h + 1 )
+
+	def extend( self , before , after ) :
+
+		"""
+		extend( before , after ): adds 'before' and 'after' empty elements at the beginning and at the end of the last axis.
+		"""
+
+		pad = [ ( 0 , 0 ) ] * ( len( self._shape ) - 1 ) + [ ( before , after ) ]
+
+		for h in range( len( self._levels ) ) :
+
+			self._levels[ h ] = np.pad( self._levels[ h ] , [ ( 0 , 0 ) ] + pad , constant_values = np.nan )
+			self._fill[ h ] = np.pad( self._fill[ h ] , pad )
+			self._parity[ h ] = np.pad( self._parity[ h ] , pad )
+
+		self._shape = self._fill[ 0 ].shape
+
+	def samples( self ) :
+
+		"""
+		samples(): the values in the sketch, and their weights, along the first axis.
+		"""
+
+		values = np.concatenate( self._levels , axis = 0 )
+		weights = np.concatenate( [ np.where( np.isnan( self._levels[ h ] ) , 0 , 2 ** h ) for h in range( len( self._levels ) ) ] , axis = 0 )
+
+		return values , weights
+
+	def count( self ) :
+
+		"""
+		count(): the number of values added to the sketch.
+		"""
+
+		return np.sum( self.samples()[ 1 ] , axis = 0 )
+
+	def median( self ) :
+
+		"""
+		median(): the approximate median, which is nan where there are no values (as in np.nanmedian).
+		"""
+
+		values , weights = self.samples()
+
+		return weighted_median( values , weights )
+
+	def mad( self , k = 1.4826 ) :
+
+		"""
+		mad( k = 1.4826 ): the approximate median absolute deviation, scaled by k as in nanMAD.
+		"""
+
+		values , weights = self.samples()
+
+		return k * weighted_median( np.absolute( values - weighted_median( values , weights ) ) , weights )
+
+def weighted_median( values , weights ) :
+
+	"""
+	weighted_median( values , weights ): the median of the values along the first axis, each value counting as many times
+	as its weight. As for np.nanmedian, the median of an even number of values is the mean of the two central values.
+	nan values must have weight 0.
+	"""
+
+	order = np.argsort( values , axis = 0 ) #nan values are sorted last
+	values = np.take_along_axis( values , order , axis = 0 )
+	cumulative = np.cumsum( np.take_along_axis( weights , order , axis = 0 ) , axis = 0 )
+	total = cumulative[ - 1 ]
+
+	lower = np.argmax( cumulative >= total / 2 , axis = 0 )
+	upper = np.argmax( cumulative > total / 2 , axis = 0 )
+
+	median = ( np.take_along_axis( values , lower[ None ] , axis = 0 )[ 0 ] + np.take_along_axis( values , upper[ None ] , axis = 0 )[ 0 ] ) / 2
+
+	return np.where( total > 0 , median , np.nan )
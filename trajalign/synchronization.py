@@ -0,0 +1,190 @@
+# All the software here is distributed under the terms of the GNU General Public License Version 3, June 2007.
+# Trajalign is a free software and comes with ABSOLUTELY NO WARRANTY.
+#
+# You are welcome to redistribute the software. However, we appreciate is use of such software would result in citations of
+# Picco, A., Kaksonen, M., _Precise tracking of the dynamics of multiple proteins in endocytic events_,  Methods in Cell Biology, Vol. 139, pages 51-68 (2017)
+# http://www.sciencedirect.com/science/article/pii/S0091679X16301546
+#
+# Author: Andrea Picco (https://github.com/apicco)
+# Year: 2017
+
+import numpy as np
+
+from scipy.sparse import csr_matrix , diags
+from scipy.sparse.linalg import spsolve
+from trajalign.pairing import components
+from trajalign.traj import frame_overlap
+
+def tree_potentials( pairs , differences ) :
+
+	"""
+	tree_potentials( pairs , differences ): returns the potentials p of the trajectories such that p[ i ] - p[ j ] = differences[ i , j ]
+	for the pairs i , j of a breadth first tree of the graph whose edges are the True elements of the boolean matrix pairs.
+	differences is antisymmetric and the potential of the first trajectory is 0. The pairs must connect all the trajectories.
+	"""
+
+	l = len( pairs )
+
+	p = np.zeros( l , dtype = differences.dtype )
+	visited = np.zeros( l , dtype = 'bool' )
+	visited[ 0 ] = True
+	queue = [ 0 ]
+
+	#the trajectories appended to the queue are visited in turn by the for loop
+	for i in queue :
+
+		for j in np.flatnonzero( pairs[ i ] & ~ visited ) :
+
+			p[ j ] = p[ i ] - differences[ i , j ]
+			visited[ j ] = True
+			queue.append( j )
+
+	return( p )
+
+def pair_overlaps( trajectories , transformations ) :
+
+	"""
+	pair_overlaps( trajectories , transformations ): returns the symmetric matrix of the numbers of time points that the 
+	trajectories i and j have in common once aligned, for the aligned pairs (see frame_overlap in trajalign.traj). 
+	trajectories are those that were aligned and transformations are the antisymmetric transformations used in 
+	average_trajectories, where transformations[ 'lags' ][ i , j ] lags the trajectory j to i. The pairs that were not 
+	aligned overlap over 0 time points.
+	"""
+
+	pairs = transformations[ 'pairs' ]
+	overlaps = np.zeros( pairs.shape )
+
+	for i , j in zip( * np.nonzero( np.tril( pairs , -1 ) ) ) :
+
+		sel_i , sel_j = frame_overlap( trajectories[ i ].frames() , trajectories[ j ].frames() , transformations[ 'lags' ][ i , j ] )
+		overlaps[ i , j ] = overlaps[ j , i ] = len( trajectories[ i ].frames()[ sel_i ] )
+
+	return( overlaps )
+
+def pair_weights( transformations , weighted = True , overlaps = None ) :
+
+	"""
+	pair_weights( transformations , weighted = True , overlaps = None ): returns the symmetric matrix of the weights of the aligned 
+	pairs. If weighted is True the weight of each pair is the number of time points over which the two trajectories overlap 
+	(overlaps, see pair_overlaps; if None, 1 for all the pairs) divided by the score of the pair plus the median score of all 
+	the pairs (the scores are weighted mean square displacements, see MSD). The pairs that overlap over few time points can 
+	have very small scores, and the overlap and the median keep them from taking most of the weight. If weighted is False 
+	the weights are 1. The pairs that were not aligned, or whose score is infinite, have weight 0.
+	"""
+
+	scores = np.array( transformations[ 'scores' ] , dtype = 'float64' )
+	valid = transformations[ 'pairs' ] & np.isfinite( scores )
+
+	if np.sum( valid ) == 0 :
+
+		raise AttributeError( 'pair_weights: none of the aligned pairs has a finite score' )
+
+	if not weighted :
+
+		return( valid.astype( 'float64' ) )
+
+	if overlaps is None :
+
+		overlaps = np.ones( scores.shape )
+
+	median = np.median( scores[ valid ] )
+	weights = np.zeros( scores.shape )
+
+	if median > 0 :
+
+		weights[ valid ] = overlaps[ valid ] / ( scores[ valid ] + median )
+
+	else :
+
+		#at least half of the pairs align perfectly, and the pairs are weighted by their overlaps only
+		weights[ valid ] = overlaps[ valid ]
+
+	return( weights )
+
+def laplacian_solve( weights , b ) :
+
+	#solves the weighted least squares problem min sum_ij weights[ i , j ] || x[ i ] - x[ j ] - d[ i , j ] ||^2, whose
+	#normal equations are L x = b, with L the Laplacian of the weights and b[ i ] = sum_j weights[ i , j ] d[ i , j ].
+	#The solution is defined up to a constant, which is fixed by x[ 0 ] = 0.
+	W = csr_matrix( weights )
+	L = diags( np.asarray( W.sum( axis = 1 ) ).ravel() ) - W
+	L = L.tocsc()[ 1 : , 1 : ]
+
+	x = np.zeros( b.shape )
+
+	if len( b ) > 1 :
+
+		x[ 1 : ] = spsolve( L , b[ 1 : ] ).reshape( x[ 1 : ].shape )
+
+	return( x )
+
+def synchronize_transformations( transformations , weighted = True , max_iterations = 1000 , tolerance = 1e-10 , overlaps = None ) :
+
+	"""
+	synchronize_transformations( transformations , weighted = True , max_iterations = 1000 , tolerance = 1e-10 , overlaps = None ): estimates, for each trajectory,
+	the angle, lag and centre that align it to all the other trajectories, from the transformations of any subset of pairs of
+	trajectories that connects them all. transformations are the antisymmetric transformations used in average_trajectories,
+	where the element i , j aligns the trajectory j to i: transformations[ 'angles' ][ i , j ] is the angle phi[ i ] - phi[ j ]
+	and transformations[ 'lags' ][ i , j ] the lag lag[ i ] - lag[ j ] between the two trajectories. If weighted is True, each pair is 
+	weighted with its overlap (overlaps, see pair_overlaps) divided by its score plus the median score, otherwise all the pairs have the 
+	same weight (see pair_weights).
+	The angles phi are synchronized on the circle: starting from the angles of a spanning tree of the pairs, each angle is
+	iteratively replaced by the weighted circular mean of its estimates from the other trajectories and of itself (a generalised power method),
+	until the angles change less than tolerance or max_iterations are done. The lags and the translations s are the weighted
+	least squares solutions of lag[ i ] - lag[ j ] = lags[ i , j ] and s[ i ] - s[ j ] = R( - phi[ j ] ) c[ j , i ] - R( - phi[ i ] ) c[ i , j ],
+	where c[ i , j ] is the centre of mass of the trajectory i in its alignment with j, so that the centres of mass of each
+	pair coincide once the trajectories are rotated by - phi and translated by s.
+	Returns the dictionary of the arrays 'angles' ( phi ), 'lags' and 'centres', and the number of 'iterations'. The centre of the trajectory j is - R( phi[ j ] ) s[ j ]:
+	the trajectory j is aligned to the reference r by translating it by - centres[ j ], rotating it by angles[ r ] - angles[ j ] and
+	translating it by centres[ r ], as in compute_average.
+	"""
+
+	pairs = transformations[ 'pairs' ]
+	l = len( pairs )
+
+	weights = pair_weights( transformations , weighted , overlaps )
+
+	i , j = np.nonzero( np.tril( weights > 0 , -1 ) )
+	if components( list( zip( i , j ) ) , l )[ 0 ] > 1 :
+
+		raise AttributeError( 'synchronize_transformations: the aligned pairs with finite scores do not connect all the trajectories (see pairing_report)' )
+
+	#--angles--
+	angles = transformations[ 'angles' ] * ( weights > 0 )
+	phi = tree_potentials( weights > 0 , angles )
+	i , j = np.nonzero( weights )
+	H = csr_matrix( ( weights[ i , j ] * np.exp( 1j * angles[ i , j ] ) , ( i , j ) ) , shape = ( l , l ) )
+	degrees = np.sum( weights , axis = 1 )
+
+	for iteration in range( max_iterations ) :
+
+		#each angle also keeps its own estimate, with the weight of all its pairs, so 
+		#that the iterations do not oscillate (e.g. on bipartite graphs of pairs)
+		z = H @ np.exp( 1j * phi ) + degrees * np.exp( 1j * phi )
+		new_phi = np.angle( z )
+		change = np.max( np.abs( np.angle( np.exp( 1j * ( new_phi - phi ) ) ) ) )
+		phi = new_phi
+
+		if change < tolerance :
+
+			break
+
+	#the angles are defined up to a common rotation, which is fixed by phi[ 0 ] = 0
+	phi = np.angle( np.exp( 1j * ( phi - phi[ 0 ] ) ) )
+
+	#--lags--
+	lags = laplacian_solve( weights , np.sum( weights * transformations[ 'lags' ] , axis = 1 ) )
+
+	#--translations--
+	#c[ i , j ] is the centre of mass of i in its alignment with j (i reference) or in the alignment of i to j
+	c = transformations[ 'rcs' ] + np.transpose( transformations[ 'lcs' ] , axes = ( 1 , 0 , 2 ) )
+	cos = np.cos( phi )
+	sin = np.sin( phi )
+	#R( - phi[ i ] ) c[ i , j ] for all the pairs
+	rc = np.stack( [ cos[ : , None ] * c[ : , : , 0 ] + sin[ : , None ] * c[ : , : , 1 ] , - sin[ : , None ] * c[ : , : , 0 ] + cos[ : , None ] * c[ : , : , 1 ] ] , axis = 2 )
+	d = np.transpose( rc , axes = ( 1 , 0 , 2 ) ) - rc
+	s = laplacian_solve( weights , np.sum( weights[ : , : , None ] * d , axis = 1 ) )
+
+	centres = - np.stack( [ cos * s[ : , 0 ] - sin * s[ : , 1 ] , sin * s[ : , 0 ] + cos * s[ : , 1 ] ] , axis = 1 )
+
+	return( { 'angles' : phi , 'lags' : lags , 'centres' : centres , 'iterations' : iteration + 1 } )
@@ -27,8 +27,64 @@ from numpy import convolve
 from numpy import isclose
 from numpy import isnan
 from numpy import round
+from numpy import rint
+from numpy import arange
+from numpy import argmax
+from numpy import intersect1d
 import copy as cp
 
+from trajalign.counters import work
+from trajalign.log import logger
+
+def offset_overlap( l1 , l2 , offset ) :
+
+	"""
+	offset_overlap( l1 , l2 , offset ): returns the slices of two sequences of consecutive time points, of lengths l1 and l2,
+	that overlap when the first time point of the second sequence is the offset-th time point of the first sequence
+	(offset can be negative). If the sequences do not overlap the slices are empty.
+	"""
+
+	i0 = min( max( 0 , offset ) , l1 )
+	i1 = max( min( l1 , offset + l2 ) , i0 )
+
+	return( slice( i0 , i1 ) , slice( i0 - offset , i1 - offset ) )
+
+def frame_overlap( frames1 , frames2 , lag = 0 ) :
+
+	"""
+	frame_overlap( frames1 , frames2 , lag = 0 ): returns the indexes of the frames1 and of the frames2 + lag that are in
+	common, in the same order as [ i for i in range( len( frames1 ) ) if frames1[ i ] in frames2 + lag ] and vice versa.
+	As frames without gaps (see Traj.fill) are consecutive integers, their overlap is found from the offset between
+	their first frames and returned as slices (see offset_overlap). Otherwise, the common frames are searched and returned
+	as arrays of indexes.
+	"""
+
+	if ( len( frames1 ) == 0 ) | ( len( frames2 ) == 0 ) :
+
+		return( slice( 0 , 0 ) , slice( 0 , 0 ) )
+
+	if ( frames1[ - 1 ] - frames1[ 0 ] == len( frames1 ) - 1 ) & ( frames2[ - 1 ] - frames2[ 0 ] == len( frames2 ) - 1 ) :
+
+		return( offset_overlap( len( frames1 ) , len( frames2 ) , int( frames2[ 0 ] + lag - frames1[ 0 ] ) ) )
+
+	else :
+
+		common , sel1 , sel2 = intersect1d( frames1 , frames2 + lag , return_indices = True )
+		return( sel1 , sel2 )
+
+def time_overlap( t1 , t2 , delta_t ) :
+
+	"""
+	time_overlap( t1 , t2 , delta_t ): returns the slices of the times t1 and t2, both sampled every delta_t, which are
+	within delta_t / 2 from each other (see offset_overlap).
+	"""
+
+	if ( len( t1 ) == 0 ) | ( len( t2 ) == 0 ) :
+
+		return( slice( 0 , 0 ) , slice( 0 , 0 ) )
+
+	return( offset_overlap( len( t1 ) , len( t2 ) , int( rint( ( t2[ 0 ] - t1[ 0 ] ) / delta_t ) ) ) )
+
 class Traj:
 	"""Trajectory OBJECT:
 		traj(**annotations) -> creates a new empty trajectory. **annotations are
@@ -166,6 +222,19 @@ class Traj:
 	def __dict__(self):
 		return self._annotations
 
+	def __deepcopy__( self , memo ) :
+
+		#the deep copies of the trajectories are counted (see trajalign.counters)
+		work.add( 'traj_deepcopies' )
+
+		output = Traj.__new__( type( self ) )
+		memo[ id( self ) ] = output
+
+		for s in self.__slots__ :
+			setattr( output , s , cp.deepcopy( getattr( self , s ) , memo ) )
+
+		return output
+
 	def __len__(self): #the number of timepoints in the trajectory
 		if (len(self._t) > 0): return len(self._t)
 		else: return len(self._frames)
@@ -496,10 +565,28 @@ class Traj:
 		.extract(10,11,15) extracts rows 10, 11 and 15.
 		.extract([10,11,15]) extracts rows 10, 11 and 15.
 		.extract(range(10,20)) extracts all the rows from 10 to 19. 
+		.extract(slice(10,20)) extracts all the rows from 10 to 19, slicing the attributes without indexing each row, and
+		annotates the range as range(10, 20).
 		"""
 
+		work.add( 'extract_calls' )
+
 		if (len(items)==0): 
 			raise IndexError('Please, specify the values you want to extract from the trajectory')
+		elif ( len(items)==1 ) and isinstance( items[ 0 ] , slice ) :
+			#the rows are consecutive (see frame_overlap): the attributes are sliced, and the range 
+			#annotation stores only the first and last rows, as range( start , stop )
+			new_items = range( len( self ) )[ items[ 0 ] ]
+			if 'range' in self.annotations().keys():
+				output = Traj(range = self.annotations()['range']+' then '+str(new_items))
+			else:
+				output = Traj(range = str(new_items))
+			for a in self.annotations().keys():
+				if a != 'range':
+					output.annotations(a,self._annotations[a])
+			for a in self.attributes():
+				if a in ( 'frames' , 't' , 'coord' , 'f' , 'mol' , 'n' , 'm2' , 't_err' , 'coord_err' , 'f_err' , 'mol_err' , 'm2_err' ) :
+					output.input_values(a,getattr(self,'_'+a)[...,items[ 0 ]])
 		else:
 			new_items = [] #items are enters as a tuple, and should be converted as list
 			for i in items:
@@ -836,7 +923,7 @@ class Traj:
 				self._t += shift * float(self._annotations['delta_t'])
 				return self._t
 			else :
-				print("Waring: lag() estimates the delta_t from the trajectory time attribute")
+				logger.warning( "Warning: lag() estimates the delta_t from the trajectory time attribute" )
 				delta_t = min(self._t[1:]-self._t[0:(len(self._t)-1)])
 				self._t += shift * delta_t
 				return self._t
@@ -863,8 +950,8 @@ class Traj:
 					( ( t  > self._t[0] ) | isclose( t , self._t[0] ) | isclose( self._t[0] , t ) ) & 
 					( ( t < self._t[len(self)-1] ) | isclose( t , self._t[len(self)-1] ) | isclose( self._t[len(self)-1] , t ) )
 						): #check wheter t is comprised between self._t[0] and self._t[len(self)-1]. The two isclose are needed because in rare cases isclose order of argumants can lead to different results, see numpy documentation
-				new_t = array([ i for i in self._t if ( (i > t) | isclose( i , t ) | isclose( t , i ) ) ] )
-				new_start = self._t.tolist().index(new_t[0])
+				new_t = self._t[ ( self._t > t ) | isclose( self._t , t ) | isclose( t , self._t ) ]
+				new_start = int( argmax( self._t == new_t[0] ) )
 				self._t = new_t
 				for attribute in self.attributes():
 					if attribute == 'coord':
@@ -933,7 +1020,7 @@ class Traj:
 					( ( t  > self._t[0] ) | isclose( t , self._t[0] ) | isclose( self._t[0] , t ) ) & 
 					( ( t < self._t[len(self)-1] ) | isclose( t , self._t[len(self)-1] ) | isclose( self._t[len(self)-1] , t ) )
 						) : #in rare cases isclose order of argumants can lead to different results, see numpy documentation
-				self._t = array([ i for i in self._t if ( (i < t) | isclose(i,t) ) ])
+				self._t = self._t[ ( self._t < t ) | isclose( self._t , t ) ]
 				new_end = len(self._t)
 				for attribute in self.attributes():
 					if attribute == 'coord':
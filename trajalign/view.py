@@ -0,0 +1,333 @@
+# All the software here is distributed under the terms of the GNU General Public License Version 3, June 2007.
+# Trajalign is a free software and comes with ABSOLUTELY NO WARRANTY.
+#
+# You are welcome to redistribute the software. However, we appreciate is use of such software would result in citations of
+# Picco, A., Kaksonen, M., _Precise tracking of the dynamics of multiple proteins in endocytic events_,  Methods in Cell Biology, Vol. 139, pages 51-68 (2017)
+# http://www.sciencedirect.com/science/article/pii/S0091679X16301546
+#
+# Author: Andrea Picco (https://github.com/apicco)
+# Year: 2017
+
+from trajalign.traj import Traj
+from trajalign.log import logger
+import copy as cp
+import numpy as np
+
+class TrajView:
+
+	"""
+	TrajView( t ): a trajectory t with a pending rototranslation and time shift. translate, rotate and lag do not change
+	the data of t, they compose the transformation x -> R( angle ) ( x + pre ) + post and the lag, which are applied in one
+	pass only when the trajectory is materialised with traj(). The start and end of the trajectory (see Traj.start and
+	Traj.end) are read without materialising it; when they are set, they are applied to the materialised trajectory.
+	The errors of the coordinates are propagated as in Traj.rotate; translations and rotations with errors are applied
+	at once. The annotations of the view are a copy of those of t, so that t is never modified.
+	"""
+
+	__slots__ = [ '_traj' , '_annotations' , '_pre' , '_angle' , '_post' , '_variance' , '_lag' , '_window' ]
+
+	def __init__( self , t ) :
+
+		self._traj = t
+		self._annotations = dict( t.annotations() )
+		self.reset()
+
+	def reset( self ) :
+
+		#the identity transformation: no rotation is applied until rotate is called
+		self._pre = np.zeros( 2 )
+		self._angle = None
+		self._post = np.zeros( 2 )
+		self._variance = None
+		self._lag = 0
+		self._window = []
+
+	def __len__( self ) :
+
+		if self._window :
+
+			return len( self.window()[ 0 ] )
+
+		return len( self._traj )
+
+	def __repr__( self ) :
+
+		return 'TrajView of ' + repr( self.traj() )
+
+	def annotations( self , annotation = None , string = '' ) :
+
+		"""
+		annotations( annotation = None , string = '' ): the annotations of the view, as in Traj.annotations.
+		"""
+
+		if ( annotation is None ) & ( not string ) :
+			return self._annotations
+		elif annotation is None :
+			raise AttributeError( 'You annotate something to no dictionary key!' )
+		elif isinstance( annotation , dict ) & ( not string ) :
+			for key in annotation.keys() :
+				self._annotations[ key ] = annotation[ key ]
+		else :
+			self._annotations[ annotation ] = string
+
+	def attributes( self ) :
+
+		"""
+		attributes(): the non-empty attributes of the trajectory.
+		"""
+
+		return self._traj.attributes()
+
+	def delta_t( self ) :
+
+		if 'delta_t' in self._annotations.keys() :
+			return float( self._annotations[ 'delta_t' ] )
+		else :
+			logger.warning( "Warning: delta_t() estimates the delta_t from the trajectory time attribute" )
+			return min( self._traj.t()[ 1 : ] - self._traj.t()[ : - 1 ] )
+
+	def translate( self , v , v_err = ( 0 , 0 ) ) :
+
+		"""
+		translate( v , v_err = ( 0 , 0 ) ): translates the coordinates by v (see Traj.translate).
+		"""
+
+		if ( v_err[ 0 ] != 0 ) | ( v_err[ 1 ] != 0 ) :
+
+			self.apply()
+			self._traj.translate( v , v_err )
+
+		elif ( self._angle is None ) :
+
+			self._pre = self._pre + np.array( v , dtype = 'float64' ).ravel()
+
+		else :
+
+			self._post = self._post + np.array( v , dtype = 'float64' ).ravel()
+
+	def rotate( self , angle , angle_err = 0 ) :
+
+		"""
+		rotate( angle , angle_err = 0 ): rotates the coordinates by angle (see Traj.rotate).
+		"""
+
+		if angle_err > 0 :
+
+			self.apply()
+			self._traj.rotate( angle , angle_err )
+			return
+
+		R = np.array( [ [ np.cos( angle ) , - np.sin( angle ) ] , [ np.sin( angle ) , np.cos( angle ) ] ] , dtype = 'float64' )
+
+		if self._angle is None :
+			self._angle = angle
+			self._variance = np.square( R )
+		else :
+			self._angle = self._angle + angle
+			self._post = R @ self._post
+			#the variances of the coordinates are propagated rotation after rotation, as in Traj.rotate
+			self._variance = np.square( R ) @ self._variance
+
+	def lag( self , shift ) :
+
+		"""
+		lag( shift ): shifts the time of the trajectory by shift time intervals (see Traj.lag).
+		"""
+
+		if not isinstance( shift , int ) :
+			raise TypeError( 'shift in lag() must be integer' )
+
+		if len( self._traj.t() ) == 0 :
+			raise AttributeError( 'There is no time to be shifted' )
+
+		#the start and end that were set refer to the time before the shift
+		if self._window :
+			self.apply()
+
+		self._lag += shift
+
+	def start( self , t = None ) :
+
+		"""
+		start( t = None ): the start time of the trajectory. If t is specified, the trajectory is started from t
+		when it is materialised (see Traj.start).
+		"""
+
+		if t is not None :
+			self._window.append( ( 'start' , t ) )
+		elif self._window :
+			return self.window()[ 0 ][ 0 ]
+		elif self._lag == 0 :
+			return self._traj.start()
+		else :
+			return self._traj.t()[ 0 ] + self._lag * self.delta_t()
+
+	def end( self , t = None ) :
+
+		"""
+		end( t = None ): the end time of the trajectory. If t is specified, the trajectory is ended at t when it is
+		materialised (see Traj.end).
+		"""
+
+		if t is not None :
+			self._window.append( ( 'end' , t ) )
+		elif self._window :
+			return self.window()[ 0 ][ - 1 ]
+		elif self._lag == 0 :
+			return self._traj.end()
+		else :
+			return self._traj.t()[ len( self._traj ) - 1 ] + self._lag * self.delta_t()
+
+	def window( self ) :
+
+		"""
+		window(): computes, without materialising the trajectory, the time points t of the materialised trajectory (with 
+		the lag and the start and end that were set, see Traj.start and Traj.end) and where its points are in t. Returns 
+		t, the index i of the first point of the trajectory that is kept, and the indexes k0 and k1 such that t[ k0 : k1 ] 
+		are the times of the points i, i + 1, ..., i + k1 - k0 - 1 of the trajectory. The other time points of t were 
+		added by start or end, and have no values.
+		"""
+
+		t = self._traj.t()
+
+		if self._lag != 0 :
+			t = t + self._lag * self.delta_t()
+
+		i , k0 , k1 = 0 , 0 , len( t )
+
+		for w , value in self._window :
+
+			if len( t ) == 0 :
+				raise IndexError( 'The time attribute is empty' )
+
+			#the same time points as Traj.start and Traj.end
+			if 'delta_t' in self._annotations.keys() :
+				delta_t = np.float64( self._annotations[ 'delta_t' ] )
+			else :
+				delta_t = min( t[ 1 : ] - t[ : - 1 ] )
+
+			inside = ( ( value > t[ 0 ] ) | np.isclose( value , t[ 0 ] ) | np.isclose( t[ 0 ] , value ) ) & ( ( value < t[ - 1 ] ) | np.isclose( value , t[ - 1 ] ) | np.isclose( t[ - 1 ] , value ) )
+
+			if ( w == 'start' ) & inside :
+
+				new_t = t[ ( t > value ) | np.isclose( t , value ) | np.isclose( value , t ) ]
+				n = int( np.argmax( t == new_t[ 0 ] ) )
+				t = new_t
+				i += max( n - k0 , 0 )
+				k0 = max( k0 - n , 0 )
+				k1 = max( k1 - n , k0 )
+
+			elif ( w == 'end' ) & inside :
+
+				t = t[ ( t < value ) | np.isclose( t , value ) ]
+				k1 = min( k1 , len( t ) )
+				k0 = min( k0 , k1 )
+
+			elif w == 'start' :
+
+				if value > t[ - 1 ] :
+					raise AttributeError( 't is larger than the trajectory last time point' )
+
+				new_t = []
+				x = t[ 0 ] - delta_t
+				while ( ( x > value ) | np.isclose( x , value ) | np.isclose( value , x ) ) :
+					new_t.append( x )
+					x -= delta_t
+
+				t = np.insert( t , 0 , list( reversed( new_t ) ) )
+				k0 += len( new_t )
+				k1 += len( new_t )
+
+			else :
+
+				if value < t[ 0 ] :
+					raise AttributeError( 't is smaller than the trajectory first time point' )
+
+				new_t = []
+				x = t[ - 1 ] + delta_t
+				while ( ( x < value ) | np.isclose( x , value ) | np.isclose( value , x ) ) :
+					new_t.append( x )
+					x += delta_t
+
+				t = np.insert( t , len( t ) , new_t )
+
+		return t , i , k0 , k1
+
+	def write( self , data , rows ) :
+
+		"""
+		write( data , rows ): writes the materialised trajectory in data, whose columns are the time points of window() and 
+		whose rows of each attribute are the slices in the dictionary rows (see TrajStack). The pending transformations are 
+		applied while the values are written, without materialising the trajectory. The values of the time points added by 
+		start and end are not written, except for their times and frames.
+		"""
+
+		t , i , k0 , k1 = self.window()
+		n = k1 - k0
+
+		for a in self._traj.attributes() :
+
+			x = getattr( self._traj , '_' + a )
+			out = data[ rows[ a ] , k0 : k1 ]
+
+			if a == 't' :
+				data[ rows[ a ] , : ] = t
+			elif a == 'coord' :
+				if self._angle is None :
+					np.add( x[ : , i : i + n ] , self._pre[ : , None ] , out = out )
+				else :
+					R = np.array( [ [ np.cos( self._angle ) , - np.sin( self._angle ) ] , [ np.sin( self._angle ) , np.cos( self._angle ) ] ] , dtype = 'float64' )
+					np.add( R @ ( x[ : , i : i + n ] + self._pre[ : , None ] ) , self._post[ : , None ] , out = out )
+			elif ( a == 'coord_err' ) & ( self._variance is not None ) :
+				np.sqrt( self._variance @ np.square( x[ : , i : i + n ] ) , out = out )
+			elif ( a == 'frames' ) & ( n > 0 ) :
+				#the frames of the time points added by start and end follow those of the trajectory, as in Traj.start and Traj.end
+				data[ rows[ a ] , : k0 ] = x[ i ] - np.arange( k0 , 0 , - 1 )
+				out[ : ] = x[ i : i + n ]
+				data[ rows[ a ] , k1 : ] = x[ i + n - 1 ] + np.arange( 1 , len( t ) - k1 + 1 )
+			else :
+				out[ : ] = x[ ... , i : i + n ]
+
+	def traj( self , copy = False ) :
+
+		"""
+		traj( copy = False ): materialises the trajectory with the pending transformations. The attributes that are not
+		transformed are shared with the original trajectory, unless copy is True.
+		"""
+
+		t = Traj( **( cp.deepcopy( self._annotations ) if copy else dict( self._annotations ) ) )
+
+		for a in self._traj.attributes() :
+
+			x = getattr( self._traj , '_' + a )
+
+			if a == 'coord' :
+				x = x + self._pre[ : , None ]
+				if self._angle is not None :
+					R = np.matrix( [ [ np.cos( self._angle ) , - np.sin( self._angle ) ] , [ np.sin( self._angle ) , np.cos( self._angle ) ] ] , dtype = 'float64' )
+					x = np.array( R @ x ) + self._post[ : , None ]
+			elif ( a == 'coord_err' ) & ( self._variance is not None ) :
+				x = np.sqrt( self._variance @ np.square( x ) )
+			elif ( a == 't' ) & ( self._lag != 0 ) :
+				x = x + self._lag * self.delta_t()
+			elif copy :
+				x = np.array( x )
+
+			setattr( t , '_' + a , x )
+
+		for w , value in self._window :
+
+			getattr( t , w )( value )
+
+		return t
+
+	def apply( self ) :
+
+		"""
+		apply(): applies the pending transformations to a new trajectory, which the view then wraps.
+		"""
+
+		annotations = self._annotations
+		self._traj = self.traj( copy = True )
+		self._annotations = annotations
+		self.reset()